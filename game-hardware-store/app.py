@@ -1,158 +1,279 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, render_template, request
 from flask_login import LoginManager, current_user
 import os
 import logging
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 import secrets
 from flask_wtf.csrf import CSRFProtect
 
-# Cargar variables de entorno
-load_dotenv()
-
-# Crear la aplicación Flask
-app = Flask(__name__)
-
-# Configuración de la aplicación
-secret_key = os.environ.get('SECRET_KEY')
-if not secret_key or secret_key == 'dev-secret-key-change-in-production':
-    # Generar una clave secreta segura si no está configurada
-    secret_key = secrets.token_hex(32)
-    print("⚠️  SECRET_KEY no configurada. Usando clave generada (cámbiala en producción)")
-
-app.config['SECRET_KEY'] = secret_key
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///instance/gametech_store.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Configuración de seguridad para sesiones y cookies
-app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'  # Solo HTTPS en producción
-app.config['SESSION_COOKIE_HTTPONLY'] = True  # No accesible vía JavaScript
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Protección CSRF básica
-app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hora de sesión permanente
-app.config['REMEMBER_COOKIE_DURATION'] = 3600  # 1 hora para remember me
-app.config['REMEMBER_COOKIE_HTTPONLY'] = True
-app.config['REMEMBER_COOKIE_SAMESITE'] = 'Lax'
-
-# Inicializar CSRF protection
-csrf = CSRFProtect(app)
-
-# Crear directorio de uploads si no existe
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Inicializar base de datos
 from database import db
-db.init_app(app)
+from services.engine_config import engine_options
+from services.rate_limit import parse_limits, rate_limiter
+from services.replicas import replica_router
+from services.invoice_queue import invoice_queue
+from services.reservations import stock_sweeper
+from services.query_stats import query_instrumentation, query_budget
+from services.metrics import metrics
+from services.passwords import password_hasher
+from services.user_cache import user_cache
+from services.static_assets import static_assets
+from services.compression import response_compression
 
-# Configurar Flask-Login
+# Extensiones sin aplicación: create_app las inicializa
+csrf = CSRFProtect()
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor inicia sesión para acceder a esta página'
 login_manager.login_message_category = 'info'
 
+
 @login_manager.user_loader
 def load_user(user_id):
-    from models.database_models import User
-    return User.query.get(int(user_id))
-
-# Importar modelos
-from models.database_models import Game, Hardware, User
-from models.compatibility import Compatibility
-
-# Importar controladores
-from controllers.store import store_bp
-from controllers.hardware import hardware_bp
-from controllers.auth import auth_bp
-from controllers.cart import cart_bp
-from controllers.admin import admin_bp
-
-# Registrar blueprints
-app.register_blueprint(store_bp)
-app.register_blueprint(hardware_bp)
-app.register_blueprint(auth_bp)
-app.register_blueprint(cart_bp)
-app.register_blueprint(admin_bp)
-
-# Configurar logging
-if not app.debug:
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    file_handler = RotatingFileHandler('logs/gametech_store.log', maxBytes=10240, backupCount=10)
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('GameTech Store startup')
-
-@app.route('/')
-def index():
-    """Página principal de la tienda"""
-    juegos = Game.get_all_games()
-    hardware = Hardware.get_all_hardware()
-
-    # Obtener algunos productos destacados
-    juegos_destacados = juegos[:3]
-    hardware_destacado = hardware[:3]
-
-    return render_template('index.html', 
-                         juegos_destacados=juegos_destacados, 
-                         hardware_destacado=hardware_destacado)
-
-@app.route('/about')
-def about():
-    """Página acerca de"""
-    return render_template('about.html')
-
-@app.errorhandler(404)
-def page_not_found(error):
-    """Manejador de error 404"""
-    app.logger.warning(f'404 error: {request.url}')
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    """Manejador de error 500"""
-    db.session.rollback()
-    app.logger.error(f'500 error: {error}')
-    return render_template('500.html'), 500
-
-@app.errorhandler(403)
-def forbidden(error):
-    """Manejador de error 403"""
-    return render_template('403.html'), 403
-
-# Prevenir caché en páginas que requieren autenticación
-@app.after_request
-def add_header(response):
-    """Agregar headers para prevenir caché en páginas protegidas"""
-    if current_user.is_authenticated or request.endpoint in ['auth.login', 'auth.registro']:
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-    return response
-
-# Context processor para hacer variables disponibles en todos los templates
-@app.context_processor
-def inject_user():
-    """Inyectar información del usuario en todos los templates"""
-    cart_count = 0
-    if current_user.is_authenticated:
-        from models.database_models import CartItem
-        cart_count = CartItem.query.filter_by(user_id=current_user.id).count()
-    return dict(cart_count=cart_count)
+    return user_cache.load(user_id)
+
+
+def create_app(config=None):
+    """
+    Crear y configurar la aplicación Flask
+
+    Importar este módulo no tiene efectos: la configuración se lee del
+    entorno, los directorios se crean y el logging se configura al llamar
+    a esta función.
+
+    Args:
+        config: dict con valores que reemplazan a los leídos del entorno
+
+    Returns:
+        Flask: la aplicación
+    """
+    # Cargar variables de entorno
+    load_dotenv()
+
+    # Crear la aplicación Flask
+    app = Flask(__name__)
+
+    # Configuración de la aplicación
+    secret_key = os.environ.get('SECRET_KEY')
+    if (not secret_key or secret_key == 'dev-secret-key-change-in-production') and 'SECRET_KEY' not in (config or {}):
+        # Generar una clave secreta segura si no está configurada
+        secret_key = secrets.token_hex(32)
+        print("⚠️  SECRET_KEY no configurada. Usando clave generada (cámbiala en producción)")
+
+    app.config['SECRET_KEY'] = secret_key
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///instance/gametech_store.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Réplicas de solo lectura para el catálogo (URLs separadas por comas)
+    app.config['DATABASE_REPLICA_URLS'] = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    app.config['READ_YOUR_WRITES_SECONDS'] = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+    app.config['UPLOAD_FOLDER'] = 'static/uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Directorio donde se guardan las facturas PDF ya generadas
+    app.config['INVOICE_CACHE_DIR'] = os.environ.get('INVOICE_CACHE_DIR', os.path.join(app.instance_path, 'invoices'))
+    # Procesos usados para renderizar facturas en la exportación masiva
+    app.config['INVOICE_EXPORT_WORKERS'] = int(os.environ.get('INVOICE_EXPORT_WORKERS', os.cpu_count() or 2))
+    # Segundos que se mantiene reservado el stock de un producto agregado al carrito
+    app.config['STOCK_HOLD_SECONDS'] = int(os.environ.get('STOCK_HOLD_SECONDS', 900))
+    # Consultas SQL y milisegundos a partir de los cuales una petición se registra como lenta
+    app.config['QUERY_BUDGET'] = int(os.environ.get('QUERY_BUDGET', 30))
+    app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    # Algoritmo y coste del hash de contraseñas ('pbkdf2:sha256:600000', 'scrypt:32768:8:1', ...);
+    # los hashes con otra política se recalculan al iniciar sesión
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    # Hashes calculados a la vez por proceso y peticiones en espera antes de responder 503
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    # Peticiones por IP permitidas en cada blueprint ('auth:30/60' = 30 cada 60 segundos)
+    app.config['RATE_LIMITS'] = parse_limits(os.environ.get('RATE_LIMITS', 'auth:30/60'))
+    # Inicios de sesión fallidos permitidos por usuario y por IP en la ventana indicada
+    app.config['LOGIN_FAILURE_LIMITS'] = {
+        'username': tuple(int(n) for n in os.environ.get('LOGIN_FAILURES_PER_USERNAME', '5/300').split('/')),
+        'ip': tuple(int(n) for n in os.environ.get('LOGIN_FAILURES_PER_IP', '20/300').split('/')),
+    }
+    # Proxies o balanceadores delante de la aplicación: la IP del cliente (límites de
+    # frecuencia) y el esquema se toman de X-Forwarded-For y X-Forwarded-Proto.
+    # 0 ignora esas cabeceras, que un cliente podría falsificar
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    # Compresión gzip/brotli de HTML, JSON y texto (desactivar si la hace el proxy) y tamaño mínimo en bytes
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_RESPONSES', 'true').strip().lower() in (
+        '1', 'true', 'yes', 'si', 'sí', 'on')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+    # Configuración de seguridad para sesiones y cookies
+    app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'  # Solo HTTPS en producción
+    app.config['SESSION_COOKIE_HTTPONLY'] = True  # No accesible vía JavaScript
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Protección CSRF básica
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hora de sesión permanente
+    app.config['REMEMBER_COOKIE_DURATION'] = 3600  # 1 hora para remember me
+    app.config['REMEMBER_COOKIE_HTTPONLY'] = True
+    app.config['REMEMBER_COOKIE_SAMESITE'] = 'Lax'
+
+    # Valores explícitos del llamador (scripts, benchmarks)
+    app.config.from_mapping(config or {})
+    # Pool de conexiones y timeouts (PostgreSQL) o WAL (SQLite), configurables por entorno
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # Inicializar CSRF protection
+    csrf.init_app(app)
+
+    # Crear directorio de uploads si no existe
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Inicializar base de datos
+    db.init_app(app)
+
+    # Enrutar las lecturas del catálogo a las réplicas, si hay
+    replica_router.init_app(app)
+
+    # Inicializar cola de facturas en segundo plano
+    invoice_queue.init_app(app)
+
+    # Inicializar liberación periódica de reservas de stock vencidas
+    stock_sweeper.init_app(app)
+
+    # Inicializar conteo de consultas por petición (Server-Timing y log de peticiones lentas)
+    query_instrumentation.init_app(app)
+
+    # Inicializar métricas de Prometheus (expuestas en /metrics)
+    metrics.init_app(app)
+
+    # Política de hash de contraseñas y pool acotado para calcularlos
+    password_hasher.init_app(app)
+
+    # Límites de frecuencia por IP y blueprint y de inicios de sesión fallidos
+    rate_limiter.init_app(app)
+
+    # Configurar Flask-Login
+    login_manager.init_app(app)
+
+    # Copias en memoria de los usuarios autenticados, para no leer users en cada petición
+    user_cache.init_app(app)
+
+    # Compresión de las respuestas dinámicas (los estáticos ya van precomprimidos)
+    response_compression.init_app(app)
+
+    # Archivos estáticos con huella, precomprimidos y servidos por WhiteNoise (si existe static/dist/)
+    static_assets.init_app(app)
+
+    # Confiar en las cabeceras X-Forwarded-* de los proxies configurados
+    if app.config['TRUSTED_PROXY_COUNT']:
+        proxies = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    # Importar controladores
+    from controllers.store import store_bp
+    from controllers.hardware import hardware_bp
+    from controllers.auth import auth_bp
+    from controllers.cart import cart_bp
+    from controllers.admin import admin_bp
+
+    # Registrar blueprints
+    app.register_blueprint(store_bp)
+    app.register_blueprint(hardware_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(cart_bp)
+    app.register_blueprint(admin_bp)
+
+    register_views(app)
+    configure_logging(app)
+    return app
+
+
+def configure_logging(app):
+    """Configurar el log rotativo en logs/ (fuera del modo debug)"""
+    if not app.debug:
+        if not os.path.exists('logs'):
+            os.mkdir('logs')
+        file_handler = RotatingFileHandler('logs/gametech_store.log', maxBytes=10240, backupCount=10)
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+        ))
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.setLevel(logging.INFO)
+        app.logger.info('GameTech Store startup')
+
+
+def register_views(app):
+    """Registrar las páginas generales, los manejadores de error y los hooks de la aplicación"""
+    # Importar modelos
+    from models.database_models import Game, Hardware
+
+    @app.route('/')
+    @query_budget(5)
+    def index():
+        """Página principal de la tienda"""
+        juegos = Game.get_all_games()
+        hardware = Hardware.get_all_hardware()
+
+        # Obtener algunos productos destacados
+        juegos_destacados = juegos[:3]
+        hardware_destacado = hardware[:3]
+
+        return render_template('index.html',
+                             juegos_destacados=juegos_destacados,
+                             hardware_destacado=hardware_destacado)
+
+    @app.route('/about')
+    def about():
+        """Página acerca de"""
+        return render_template('about.html')
+
+    @app.errorhandler(404)
+    def page_not_found(error):
+        """Manejador de error 404"""
+        app.logger.warning(f'404 error: {request.url}')
+        return render_template('404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        """Manejador de error 500"""
+        db.session.rollback()
+        app.logger.error(f'500 error: {error}')
+        return render_template('500.html'), 500
+
+    @app.errorhandler(403)
+    def forbidden(error):
+        """Manejador de error 403"""
+        return render_template('403.html'), 403
+
+    # Prevenir caché en páginas que requieren autenticación
+    @app.after_request
+    def add_header(response):
+        """Agregar headers para prevenir caché en páginas protegidas"""
+        if current_user.is_authenticated or request.endpoint in ['auth.login', 'auth.registro']:
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '0'
+        return response
+
+    # Context processor para hacer variables disponibles en todos los templates
+    @app.context_processor
+    def inject_user():
+        """Inyectar información del usuario en todos los templates"""
+        if current_user.is_authenticated:
+            from models.database_models import CartItem
+            cart_count = CartItem.query.filter_by(user_id=current_user.id).count()
+        else:
+            from services import session_cart
+            cart_count = session_cart.count()
+        return dict(cart_count=cart_count)
+
 
 if __name__ == '__main__':
+    app = create_app()
+
     # Inicializar la base de datos
     with app.app_context():
-        from database import seed_database
+        from database import seed_database, ensure_indexes
+        from models.database_models import Game
         db.create_all()
+        ensure_indexes()
         # Poblar con datos iniciales si está vacía
         if Game.query.count() == 0:
             seed_database()
-    
+
     # Ejecutar la aplicación
     app.run(debug=True, host='0.0.0.0', port=5000)
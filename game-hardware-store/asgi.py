@@ -0,0 +1,289 @@
+"""
+Punto de entrada ASGI: endpoints JSON asíncronos delante de la aplicación Flask
+
+Los endpoints JSON que pasan casi todo el tiempo esperando a la base de
+datos se atienden con Starlette y un engine asíncrono de SQLAlchemy
+(asyncpg para PostgreSQL, aiosqlite para SQLite). Un worker mantiene
+cientos de estas peticiones en vuelo en lugar de una por hilo:
+
+- GET  /api/carrito/count
+- GET  /api/hardware/buscar
+- POST /consultar-compatibilidad
+- POST /verificar-setup-completo
+
+El resto de rutas va a la aplicación Flask de create_app a través de un
+adaptador WSGI, igual que en el despliegue con gunicorn. Los handlers
+asíncronos usan los mismos modelos, consultas y serialización que los
+controladores y leen la sesión firmada de Flask. Los casos que no
+resuelven por sí mismos también pasan a Flask, que responde exactamente
+como siempre:
+
+- sesión recuperada solo con la cookie remember_token, usuario
+  desactivado o con la contraseña cambiada (Flask-Login decide);
+- POST sin token CSRF válido en la cabecera X-CSRFToken, o por HTTPS
+  (Flask-WTF comprueba además el Referer);
+- blueprints con límite de frecuencia en RATE_LIMITS;
+- cuerpos que no son un objeto JSON.
+
+Las consultas asíncronas van siempre a la base de datos primaria
+(DATABASE_REPLICA_URLS solo se aplica a la parte Flask). El filtro de
+compatibilidad y la serialización de los juegos usan CPU y se ejecutan en el
+pool de hilos.
+
+Uso:
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 8000 --workers 4
+"""
+import hmac
+import time
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from flask_login.config import COOKIE_NAME as REMEMBER_COOKIE_NAME
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import create_app
+from controllers import store
+from controllers.hardware import resultado_busqueda
+from database import db
+from models.database_models import CartItem, Game, Hardware, User, ordered_by_ids, password_version
+from services import compression, metrics, session_cart
+from services.engine_config import async_database_url, async_engine_options
+from services.user_cache import user_cache
+
+
+class AsyncAPI:
+    """Estado compartido por los handlers asíncronos: aplicación Flask, engine y sesión firmada"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        with flask_app.app_context():
+            url = db.engine.url
+        self.engine = create_async_engine(async_database_url(url), **async_engine_options(url))
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.wsgi = WSGIMiddleware(flask_app)
+
+    def load_session(self, request):
+        """Contenido de la cookie de sesión de Flask, o {} si falta, caducó o no es válida"""
+        cookie = request.cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not cookie or self.session_serializer is None:
+            return {}
+        try:
+            return self.session_serializer.loads(
+                cookie, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    def csrf_valid(self, request, session):
+        """Misma comprobación que Flask-WTF para el token de la cabecera (sin el Referer de HTTPS)"""
+        config = self.flask_app.config
+        if not config['WTF_CSRF_ENABLED'] or not config['WTF_CSRF_CHECK_DEFAULT']:
+            return True
+        if request.url.scheme == 'https' and config['WTF_CSRF_SSL_STRICT']:
+            return False
+        token = next((request.headers[name] for name in config['WTF_CSRF_HEADERS'] if name in request.headers), None)
+        expected = session.get(config['WTF_CSRF_FIELD_NAME'])
+        if not token or not expected:
+            return False
+        serializer = URLSafeTimedSerializer(config.get('WTF_CSRF_SECRET_KEY') or config['SECRET_KEY'],
+                                            salt='wtf-csrf-token')
+        try:
+            value = serializer.loads(token, max_age=config['WTF_CSRF_TIME_LIMIT'])
+        except BadSignature:
+            return False
+        return hmac.compare_digest(expected, value)
+
+    def rate_limited(self, blueprint):
+        """True si el blueprint tiene límite de frecuencia (lo aplica Flask)"""
+        config = self.flask_app.config
+        return config['RATE_LIMIT_ENABLED'] and blueprint in config['RATE_LIMITS']
+
+    def compress(self, request, response):
+        """Comprimir la respuesta como services.compression lo hace con las de Flask"""
+        config = self.flask_app.config
+        if not config['COMPRESS_ENABLED'] or not compression.compressible(response.media_type, config):
+            return
+        response.headers.add_vary_header('Accept-Encoding')
+        accept_encodings = compression.parse_accept_encoding(request.headers.get('accept-encoding', ''))
+        body, encoding = compression.compress_body(response.body, accept_encodings, config)
+        if encoding is not None:
+            response.body = body
+            response.headers['content-encoding'] = encoding
+            response.headers['content-length'] = str(len(body))
+
+    async def json_object(self, request):
+        """Cuerpo JSON de la petición si es un objeto, o None"""
+        if request.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+            return None
+        try:
+            data = await request.json()
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class AsyncEndpoint:
+    """
+    Endpoint ASGI que mide la petición como los de Flask y le pasa a Flask
+    las que el handler no atiende (devuelve None)
+    """
+
+    def __init__(self, api, handler, blueprint, endpoint):
+        self.api = api
+        self.handler = handler
+        self.blueprint = blueprint
+        self.endpoint = endpoint
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        response = None
+        started = time.perf_counter()
+        if not self.api.rate_limited(self.blueprint):
+            metrics.REQUESTS_IN_PROGRESS.labels(blueprint=self.blueprint).inc()
+            try:
+                response = await self.handler(self.api, request)
+            finally:
+                metrics.REQUESTS_IN_PROGRESS.labels(blueprint=self.blueprint).dec()
+
+        if response is None:
+            # Flask mide la petición por su cuenta. El cuerpo se lee entero (o se
+            # toma el que ya leyó el handler) y se le vuelve a entregar
+            receive = _replay(await request.body())
+            await self.api.wsgi(scope, receive, send)
+            return
+
+        self.api.compress(request, response)
+        metrics.REQUEST_LATENCY.labels(self.blueprint, self.endpoint, request.method).observe(
+            time.perf_counter() - started)
+        metrics.REQUESTS.labels(self.blueprint, self.endpoint, request.method, str(response.status_code)).inc()
+        await response(scope, receive, send)
+
+
+def _replay(body):
+    """receive ASGI que entrega de nuevo un cuerpo ya leído"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return receive
+
+
+async def cart_count(api, request):
+    """Cantidad de items en el carrito (cart.cart_count)"""
+    session = api.load_session(request)
+    token = session.get('_user_id')
+    if token is None:
+        if api.flask_app.config.get('REMEMBER_COOKIE_NAME', REMEMBER_COOKIE_NAME) in request.cookies:
+            return None
+        return JSONResponse({'count': session_cart.count_stored(session.get(session_cart.SESSION_KEY))})
+
+    user_id, _, version = str(token).partition(':')
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+    # El usuario y su carrito en una sola consulta
+    items = CartItem.select_count(User.id).scalar_subquery()
+    async with api.sessionmaker() as session_db:
+        row = (await session_db.execute(
+            select(User.password_hash, User.is_active, items).where(User.id == user_id)
+        )).first()
+    if row is None or not row.is_active:
+        return None
+    if version and not user_cache.version_valid(user_id, version, password_version(row.password_hash)):
+        return None
+    return JSONResponse({'count': row[2]})
+
+
+async def buscar_hardware(api, request):
+    """Búsqueda de hardware por texto o por tipo (hardware.api_buscar_hardware)"""
+    query = request.query_params.get('q', '')
+    tipo = request.query_params.get('tipo', '')
+    statement = Hardware.select_by_tipo(tipo) if tipo else Hardware.select_buscar(query)
+    async with api.sessionmaker() as session_db:
+        resultados = (await session_db.scalars(statement)).all()
+    return JSONResponse({'resultados': [resultado_busqueda(componente) for componente in resultados]})
+
+
+def _resultado_compatibilidad(rows, hardware_usuario):
+    return store.resultado_compatibilidad(Game.compatible_games(rows, hardware_usuario))
+
+
+async def consultar_compatibilidad(api, request):
+    """Juegos compatibles con el hardware del usuario (store.consultar_compatibilidad)"""
+    if not api.csrf_valid(request, api.load_session(request)):
+        return None
+    data = await api.json_object(request)
+    if data is None:
+        return None
+
+    hardware_usuario = store.especificaciones_usuario(data)
+    async with api.sessionmaker() as session_db:
+        rows = (await session_db.execute(Game.select_compatible(hardware_usuario))).all()
+    resultado = await run_in_threadpool(_resultado_compatibilidad, rows, hardware_usuario)
+    return JSONResponse(resultado)
+
+
+async def verificar_setup_completo(api, request):
+    """Compatibilidad de un setup completo con los juegos elegidos (store.verificar_setup_completo)"""
+    if not api.csrf_valid(request, api.load_session(request)):
+        return None
+    data = await api.json_object(request)
+    if data is None:
+        return None
+
+    juegos_ids = store.ids_recibidos(data.get('juegos', []))
+    componentes_ids = store.ids_recibidos(data.get('componentes', []))
+    async with api.sessionmaker() as session_db:
+        juegos = ordered_by_ids(await session_db.scalars(Game.select_by_ids(juegos_ids)), juegos_ids)
+        componentes = ordered_by_ids(await session_db.scalars(Hardware.select_by_ids(componentes_ids)),
+                                     componentes_ids)
+    return JSONResponse(store.resultado_setup(juegos, componentes))
+
+
+def create_asgi_app(config=None):
+    """
+    Crear la aplicación ASGI: endpoints asíncronos y la aplicación Flask para el resto
+
+    Args:
+        config: dict con valores que reemplazan a los leídos del entorno (se pasa a create_app)
+
+    Returns:
+        Starlette: la aplicación
+    """
+    flask_app = create_app(config)
+    api = AsyncAPI(flask_app)
+
+    def route(path, handler, blueprint, endpoint, methods):
+        return Route(path, AsyncEndpoint(api, handler, blueprint, endpoint), methods=methods)
+
+    routes = [
+        route('/api/carrito/count', cart_count, 'cart', 'cart.cart_count', ['GET']),
+        route('/api/hardware/buscar', buscar_hardware, 'hardware', 'hardware.api_buscar_hardware', ['GET']),
+        route('/consultar-compatibilidad', consultar_compatibilidad, 'store',
+              'store.consultar_compatibilidad', ['POST']),
+        route('/verificar-setup-completo', verificar_setup_completo, 'store',
+              'store.verificar_setup_completo', ['POST']),
+        Mount('/', app=api.wsgi),
+    ]
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await api.engine.dispose()
+
+    app = Starlette(routes=routes, lifespan=lifespan)
+    # Para scripts que necesitan el contexto de la aplicación Flask
+    app.state.flask_app = flask_app
+    return app
@@ -0,0 +1,7 @@
+"""
+Benchmarks de extremo a extremo de la tienda
+
+Uso:
+    python -m benchmarks.run
+    python -m benchmarks.run --compare benchmarks/results/antes.json benchmarks/results/despues.json
+"""
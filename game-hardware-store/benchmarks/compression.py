@@ -0,0 +1,165 @@
+"""
+Benchmark de la compresión de respuestas
+
+1. Códecs: para respuestas JSON de distintos tamaños (juegos serializados
+   como en /consultar-compatibilidad) y las páginas HTML reales, mide con
+   cada codificación y nivel los bytes resultantes y la CPU por respuesta.
+2. Endpoints: bytes enviados y latencia p50 de varias rutas de la
+   aplicación sin comprimir, con gzip y con brotli (COMPRESS_LEVEL y
+   COMPRESS_BR_LEVEL de la configuración).
+
+Usa un SQLite temporal con datos sintéticos.
+
+Uso:
+    python -m benchmarks.compression
+    python -m benchmarks.compression --games 2000 --repeat 50 --output compresion.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import zlib
+
+SIZES = (512, 1024, 4096, 16384, 65536, 262144, 1048576)
+CODECS = (('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 4), ('br', 11))
+PAGES = ('/', '/tienda', '/hardware', '/buscar?q=pro')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark de la compresión de respuestas')
+    parser.add_argument('--games', type=int, default=500, help='Juegos sintéticos del SQLite temporal')
+    parser.add_argument('--hardware', type=int, default=500, help='Hardware sintético del SQLite temporal')
+    parser.add_argument('--repeat', type=int, default=20, help='Repeticiones de cada medición')
+    parser.add_argument('--output', help='Guardar los resultados en este archivo JSON')
+    return parser.parse_args()
+
+
+def encode(data, encoding, level):
+    if encoding == 'br':
+        import brotli
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def cpu_ms(fn, repeat, budget_s=2.0):
+    """Mediana del tiempo de CPU de fn en milisegundos (brotli 11 con páginas grandes para antes de repeat)"""
+    samples = []
+    deadline = time.process_time() + budget_s
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        samples.append((time.process_time() - started) * 1000)
+        if time.process_time() > deadline:
+            break
+    return statistics.median(samples)
+
+
+def json_payloads(games):
+    """Cuerpos JSON de /consultar-compatibilidad recortados a cada tamaño de SIZES"""
+    payloads = {}
+    for size in SIZES:
+        juegos = []
+        for juego in games:
+            juegos.append(juego)
+            body = json.dumps({'success': True, 'juegos': juegos, 'total': len(juegos)}).encode()
+            if len(body) >= size:
+                break
+        payloads[f'json {len(body)} B'] = body
+    return payloads
+
+
+def bench_codecs(payloads, repeat):
+    results = []
+    for name, data in payloads.items():
+        for encoding, level in CODECS:
+            compressed = encode(data, encoding, level)
+            results.append({
+                'respuesta': name,
+                'bytes': len(data),
+                'codificacion': f'{encoding}-{level}',
+                'bytes_comprimidos': len(compressed),
+                'ratio': round(len(compressed) / len(data), 3),
+                'cpu_ms': round(cpu_ms(lambda: encode(data, encoding, level), repeat), 3),
+            })
+    return results
+
+
+def bench_endpoints(app, paths, repeat):
+    client = app.test_client()
+    results = []
+    for path in paths:
+        for accept in ('identity', 'gzip', 'br'):
+            sizes, latencies = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get(path, headers={'Accept-Encoding': accept})
+                latencies.append((time.perf_counter() - started) * 1000)
+                sizes.append(len(response.get_data()))
+            results.append({
+                'ruta': path,
+                'accept_encoding': accept,
+                'content_encoding': response.headers.get('Content-Encoding', 'identity'),
+                'bytes': sizes[-1],
+                'p50_ms': round(statistics.median(latencies), 2),
+            })
+    return results
+
+
+def main():
+    args = parse_args()
+    from app import create_app
+    from database import db, seed_database
+    from models.database_models import Game
+    from services import synthetic_data
+
+    workdir = tempfile.mkdtemp(prefix='compression-bench-')
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'compression.db'),
+            'SECRET_KEY': 'benchmark-' + os.urandom(16).hex(),
+            'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoices'),
+            'INVOICE_QUEUE_PATH': os.path.join(workdir, 'invoice_jobs.db'),
+            'RATE_LIMIT_ENABLED': False,
+            'TESTING': True,
+            'SLOW_REQUEST_MS': 60000,
+        })
+        with app.app_context():
+            db.create_all()
+            seed_database()
+            synthetic_data.generate(games=args.games, hardware=args.hardware)
+            games = [juego.to_dict() for juego in Game.query.all()]
+            first_game = Game.query.first().id
+
+        payloads = json_payloads(games)
+        client = app.test_client()
+        for path in PAGES:
+            payloads[f'html {path}'] = client.get(path, headers={'Accept-Encoding': 'identity'}).get_data()
+
+        results = {'codecs': bench_codecs(payloads, args.repeat),
+                   'endpoints': bench_endpoints(app, PAGES + (f'/juego/{first_game}', '/api/hardware/tipos'),
+                                                args.repeat)}
+        app.extensions['invoice_queue'].shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print('Códecs (CPU por respuesta, mediana):')
+    for entry in results['codecs']:
+        print(f"   {entry['respuesta']:<22} {entry['codificacion']:<8} {entry['bytes']:>8} -> "
+              f"{entry['bytes_comprimidos']:>7} B ({entry['ratio']:.3f})   {entry['cpu_ms']:>8.3f} ms CPU")
+    print('\nEndpoints (bytes enviados y p50):')
+    for entry in results['endpoints']:
+        print(f"   {entry['ruta']:<20} {entry['accept_encoding']:<9} {entry['content_encoding']:<9} "
+              f"{entry['bytes']:>8} B   {entry['p50_ms']:>8.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, indent=2, ensure_ascii=False)
+        print(f'\nResultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Perfil de importación del arranque de la aplicación
+
+Ejecuta en un proceso nuevo `import app` y `create_app()` con
+`python -X importtime` (lo que hace cada worker de gunicorn sin preload y
+cada script) y resume el informe: tiempo de importación y de creación de
+la aplicación, módulos y paquetes más costosos y si se cargó algún
+paquete que debería importarse solo bajo demanda (ReportLab).
+
+Con --baseline compara con un informe guardado y lista los paquetes que
+ahora se importan al arrancar y antes no. benchmarks/importtime_baseline.json
+es la línea base del repositorio.
+
+Uso:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --runs 10 --top 30 --output informe.json
+    python -m benchmarks.importtime --baseline benchmarks/importtime_baseline.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(APP_DIR, 'benchmarks', 'importtime_baseline.json')
+# Paquetes pesados que la aplicación solo debe importar cuando los usa
+LAZY_PACKAGES = ('reportlab',)
+
+STARTUP_CODE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({'import_s': imported - started, 'create_app_s': created - imported}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Perfil de importación del arranque de la aplicación')
+    parser.add_argument('--runs', type=int, default=5, help='Arranques medidos (se usa la mediana)')
+    parser.add_argument('--top', type=int, default=20, help='Módulos y paquetes a mostrar')
+    parser.add_argument('--output', help='Guardar el informe en este archivo JSON')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='Comparar con un informe anterior (por defecto, la línea base del repositorio)')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr):
+    """
+    Leer las líneas 'import time:' de -X importtime
+
+    Returns:
+        list: (módulo, self_us, cumulative_us, profundidad) en orden de importación
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def run_once(workdir):
+    """Arrancar la aplicación en un proceso nuevo con -X importtime"""
+    env = dict(os.environ,
+               PYTHONPATH=APP_DIR,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'importtime.db'),
+               SECRET_KEY='importtime-' + os.urandom(16).hex())
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    # Directorio de trabajo temporal: create_app crea logs/ y static/uploads/
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'El arranque falló:\n{result.stderr[-2000:]}')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+
+def summarize(runs, top):
+    """Informe a partir de varios arranques: medianas y módulos del arranque mediano"""
+    runs = sorted(runs, key=lambda run: run[0]['import_s'])
+    timings, modules = runs[len(runs) // 2]
+
+    packages = {}
+    for name, self_us, _, _ in modules:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    loaded = {name.split('.')[0] for name, _, _, _ in modules}
+    return {
+        'python': sys.version.split()[0],
+        'arranques': len(runs),
+        'import_ms': round(statistics.median(run[0]['import_s'] for run in runs) * 1000, 1),
+        'create_app_ms': round(statistics.median(run[0]['create_app_s'] for run in runs) * 1000, 1),
+        'modulos': len(modules),
+        'paquetes_perezosos_cargados': [package for package in LAZY_PACKAGES if package in loaded],
+        'top_acumulado': [
+            {'modulo': name, 'acumulado_ms': round(cumulative / 1000, 2)}
+            for name, _, cumulative, _ in sorted(modules, key=lambda m: -m[2])[:top]
+        ],
+        'top_paquetes': [
+            {'paquete': package, 'propio_ms': round(self_us / 1000, 2)}
+            for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:top]
+        ],
+        'paquetes': sorted(loaded),
+    }
+
+
+def print_report(report):
+    print(f"Arranque ({report['arranques']} ejecuciones, mediana): import app {report['import_ms']:.1f} ms, "
+          f"create_app() {report['create_app_ms']:.1f} ms, {report['modulos']} módulos")
+    print('\nMódulos con más tiempo acumulado:')
+    for entry in report['top_acumulado']:
+        print(f"   {entry['acumulado_ms']:>9.2f} ms  {entry['modulo']}")
+    print('\nPaquetes con más tiempo propio:')
+    for entry in report['top_paquetes']:
+        print(f"   {entry['propio_ms']:>9.2f} ms  {entry['paquete']}")
+    if report['paquetes_perezosos_cargados']:
+        print(f"\n⚠️  Paquetes cargados al arrancar que deberían importarse bajo demanda: "
+              f"{', '.join(report['paquetes_perezosos_cargados'])}")
+
+
+def compare(baseline, report):
+    """Diferencias con la línea base; devuelve True si hay regresiones"""
+    print(f"\nLínea base: import app {baseline['import_ms']:.1f} ms, create_app() {baseline['create_app_ms']:.1f} ms, "
+          f"{baseline['modulos']} módulos")
+    new_packages = sorted(set(report['paquetes']) - set(baseline['paquetes']))
+    if new_packages:
+        print(f"   Paquetes nuevos al arrancar: {', '.join(new_packages)}")
+    else:
+        print('   Sin paquetes nuevos al arrancar')
+    return bool(report['paquetes_perezosos_cargados'] or
+                set(LAZY_PACKAGES) & set(new_packages))
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='importtime-')
+    try:
+        runs = [run_once(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = summarize(runs, args.top)
+    print_report(report)
+
+    regression = bool(report['paquetes_perezosos_cargados'])
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as stream:
+            regression = compare(json.load(stream), report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(report, stream, indent=2, ensure_ascii=False)
+        print(f'\nInforme guardado en {args.output}')
+    return 1 if regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Prueba de carga: despliegue síncrono (gunicorn) contra ASGI (uvicorn)
+
+Lanza peticiones concurrentes con httpx contra los endpoints que asgi.py
+atiende de forma asíncrona y registra, por servidor, concurrencia y
+endpoint, las peticiones por segundo, la latencia p50/p95 y los errores.
+
+Sin --sync-url ni --async-url crea un SQLite temporal con datos
+sintéticos y arranca los dos servidores sobre él con el mismo número de
+workers (gunicorn -c gunicorn.conf.py y uvicorn --factory
+asgi:create_asgi_app). Con las URLs mide servidores ya desplegados, por
+ejemplo sobre PostgreSQL, que es donde se nota la espera de la red.
+
+Uso:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --concurrency 10 50 100 --seconds 10 --workers 2
+    python -m benchmarks.load_test --sync-url http://localhost:5000 --async-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('carrito_count', 'buscar_hardware', 'consultar_compatibilidad', 'verificar_setup')
+SEARCH_TERMS = ('intel', 'amd', 'rtx', 'radeon', 'ddr5', 'ssd', 'corsair', 'ryzen')
+HARDWARE_SPECS = (
+    {'cpu': 'Intel Core i7-12700K', 'ram': '16GB', 'gpu': 'RTX 3060', 'storage': ''},
+    {'cpu': 'AMD Ryzen 5 5600X', 'ram': '32GB', 'gpu': 'RX 6700 XT', 'storage': ''},
+    {'cpu': 'Intel Core i5-10400', 'ram': '8GB', 'gpu': 'GTX 1660', 'storage': ''},
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Prueba de carga del despliegue síncrono y del ASGI')
+    parser.add_argument('--sync-url', help='URL de un despliegue síncrono ya arrancado')
+    parser.add_argument('--async-url', help='URL de un despliegue ASGI ya arrancado')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100],
+                        help='Clientes concurrentes de cada medición')
+    parser.add_argument('--seconds', type=float, default=5, help='Duración de cada medición')
+    parser.add_argument('--only', nargs='+', choices=ENDPOINTS, metavar='ENDPOINT',
+                        help='Medir solo estos endpoints')
+    parser.add_argument('--workers', type=int, default=2, help='Workers de cada servidor arrancado por el script')
+    parser.add_argument('--games', type=int, default=500, help='Juegos sintéticos del SQLite temporal')
+    parser.add_argument('--hardware', type=int, default=2000, help='Hardware sintético del SQLite temporal')
+    parser.add_argument('--output', help='Guardar los resultados en este archivo JSON')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(workdir, games, hardware, traffic=0):
+    """
+    SQLite temporal con el catálogo de ejemplo y datos sintéticos
+
+    Returns:
+        tuple: (URL de la base de datos, secuencia de traffic peticiones de generate_traffic)
+    """
+    from app import create_app
+    from database import db, dispose_engines, seed_database
+    from services import synthetic_data
+
+    url = 'sqlite:///' + os.path.join(workdir, 'load_test.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SECRET_KEY': 'load-test',
+        'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoices'),
+        'INVOICE_QUEUE_PATH': os.path.join(workdir, 'invoice_jobs.db'),
+    })
+    with app.app_context():
+        db.create_all()
+        seed_database()
+        synthetic_data.generate(games=games, hardware=hardware)
+        requests = synthetic_data.generate_traffic(traffic) if traffic else []
+    app.extensions['invoice_queue'].shutdown()
+    dispose_engines(app)
+    return url, requests
+
+
+def start_server(kind, url, workdir, workers, extra_env=None):
+    """
+    Arrancar gunicorn ('sync') o uvicorn ('async') sobre la base de datos temporal
+
+    Con workers=None gunicorn calcula los workers de su perfil (gunicorn.conf.py).
+    """
+    port = free_port()
+    metrics_dir = tempfile.mkdtemp(prefix=f'metrics-{kind}-', dir=workdir)
+    env = dict(os.environ,
+               PYTHONPATH=APP_DIR,
+               DATABASE_URL=url,
+               SECRET_KEY='load-test',
+               INVOICE_CACHE_DIR=os.path.join(workdir, 'invoices'),
+               PROMETHEUS_MULTIPROC_DIR=metrics_dir,
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    env.update(extra_env or {})
+    if workers:
+        env['GUNICORN_WORKERS'] = str(workers)
+    if kind == 'sync':
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py')]
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app',
+                   '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+                   '--log-level', 'warning', '--no-access-log']
+    # Directorio de trabajo temporal: create_app crea logs/ y static/uploads/
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'El servidor {kind} terminó al arrancar (código {process.returncode})')
+        try:
+            if httpx.get(base_url + '/api/carrito/count', timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'El servidor {kind} no respondió en 60 segundos')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def browser_session(client):
+    """Sesión y token CSRF de la página de la tienda, como el navegador"""
+    page = await client.get('/tienda')
+    token = re.search(r'name="csrf-token" content="([^"]+)"', page.text).group(1)
+    client.headers['X-CSRFToken'] = token
+
+
+async def catalog_ids(client):
+    """Identificadores de juegos y hardware para /verificar-setup-completo"""
+    games, hardware = set(), set()
+    for term in SEARCH_TERMS:
+        response = await client.get('/api/hardware/buscar', params={'q': term})
+        hardware.update(item['id'] for item in response.json()['resultados'])
+    response = await client.post('/consultar-compatibilidad', json=HARDWARE_SPECS[0])
+    games.update(game['id'] for game in response.json()['juegos'])
+    return sorted(games) or [1], sorted(hardware) or [1]
+
+
+def request_factory(endpoint, games, hardware):
+    """Función que hace una petición del endpoint con parámetros aleatorios"""
+    rng = random.Random(endpoint)
+    if endpoint == 'carrito_count':
+        return lambda client: client.get('/api/carrito/count')
+    if endpoint == 'buscar_hardware':
+        return lambda client: client.get('/api/hardware/buscar', params={'q': rng.choice(SEARCH_TERMS)})
+    if endpoint == 'consultar_compatibilidad':
+        return lambda client: client.post('/consultar-compatibilidad', json=rng.choice(HARDWARE_SPECS))
+    return lambda client: client.post('/verificar-setup-completo', json={
+        'juegos': rng.sample(games, min(3, len(games))),
+        'componentes': rng.sample(hardware, min(4, len(hardware))),
+    })
+
+
+async def measure(base_url, endpoint, concurrency, seconds):
+    """Peticiones de concurrency clientes durante seconds contra un endpoint"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await browser_session(client)
+        games, hardware = await catalog_ids(client)
+        make_request = request_factory(endpoint, games, hardware)
+
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await make_request(client)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'endpoint': endpoint,
+        'concurrencia': concurrency,
+        'peticiones_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'errores': errors,
+    }
+
+
+def run_server(name, base_url, endpoints, concurrency_levels, seconds):
+    print(f'\n{name} ({base_url})')
+    results = []
+    for concurrency in concurrency_levels:
+        for endpoint in endpoints:
+            stats = asyncio.run(measure(base_url, endpoint, concurrency, seconds))
+            results.append(stats)
+            p50 = f"{stats['p50_ms']:.2f}" if stats['p50_ms'] is not None else '-'
+            p95 = f"{stats['p95_ms']:.2f}" if stats['p95_ms'] is not None else '-'
+            print(f"   c={concurrency:<4} {endpoint:<26} {stats['peticiones_s']:>9.1f} req/s   "
+                  f"p50 {p50:>9} ms   p95 {p95:>9} ms   errores {stats['errores']}")
+    return results
+
+
+def print_comparison(sync_results, async_results):
+    print('\nASGI frente a síncrono (peticiones por segundo)')
+    sync_by_key = {(r['endpoint'], r['concurrencia']): r for r in sync_results}
+    for stats in async_results:
+        base = sync_by_key.get((stats['endpoint'], stats['concurrencia']))
+        if base and base['peticiones_s']:
+            print(f"   c={stats['concurrencia']:<4} {stats['endpoint']:<26} "
+                  f"x{stats['peticiones_s'] / base['peticiones_s']:.2f}")
+
+
+def main():
+    args = parse_args()
+    endpoints = args.only or ENDPOINTS
+    results = {'workers': args.workers, 'segundos': args.seconds, 'servidores': {}}
+
+    workdir = None
+    servers = {}
+    try:
+        targets = {'sync': args.sync_url, 'async': args.async_url}
+        if not args.sync_url and not args.async_url:
+            workdir = tempfile.mkdtemp(prefix='load-test-')
+            print('Generando datos sintéticos...')
+            url, _ = prepare_database(workdir, args.games, args.hardware)
+            for kind in targets:
+                process, targets[kind] = start_server(kind, url, workdir, args.workers)
+                servers[kind] = process
+
+        names = {'sync': 'Síncrono (gunicorn)', 'async': 'ASGI (uvicorn)'}
+        for kind, base_url in targets.items():
+            if base_url:
+                results['servidores'][kind] = run_server(names[kind], base_url.rstrip('/'), endpoints,
+                                                         args.concurrency, args.seconds)
+    finally:
+        for process in servers.values():
+            stop_server(process)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if len(results['servidores']) == 2:
+        print_comparison(results['servidores']['sync'], results['servidores']['async'])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, indent=2, ensure_ascii=False)
+        print(f'\nResultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark del hash de contraseñas
+
+Mide, para cada política (PASSWORD_HASH_METHOD), cuántas verificaciones
+por segundo hace un núcleo y cuántas el proceso completo con varios hilos,
+y opcionalmente el rendimiento de POST /login con inicios de sesión
+concurrentes a través del pool acotado (respuestas 503 incluidas).
+
+Uso:
+    python -m benchmarks.password_hashing
+    python -m benchmarks.password_hashing --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --seconds 5
+    python -m benchmarks.password_hashing --login --login-threads 16
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD = 'Passw0rd!'
+DEFAULT_METHODS = ('pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark del hash de contraseñas')
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, metavar='METODO',
+                        help='Políticas a medir, en formato de Werkzeug')
+    parser.add_argument('--seconds', type=float, default=3, help='Duración de cada medición')
+    parser.add_argument('--threads', type=int, default=available_cores(),
+                        help='Hilos de la medición en paralelo (por defecto, núcleos disponibles)')
+    parser.add_argument('--login', action='store_true', help='Medir también POST /login de la aplicación')
+    parser.add_argument('--login-threads', type=int, default=8, help='Inicios de sesión concurrentes')
+    parser.add_argument('--output', help='Guardar los resultados en este archivo JSON')
+    return parser.parse_args()
+
+
+def available_cores():
+    """Núcleos que puede usar este proceso"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def throughput(fn, threads, seconds):
+    """Llamadas por segundo a fn repartidas entre varios hilos durante seconds"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(index):
+        while time.perf_counter() < deadline:
+            fn()
+            counts[index] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def bench_method(method, threads, seconds):
+    """Verificaciones por segundo de una política, con un hilo y con varios"""
+    password_hash = generate_password_hash(PASSWORD, method)
+
+    def verify():
+        check_password_hash(password_hash, PASSWORD)
+
+    verify()
+    single = throughput(verify, 1, seconds)
+    parallel = throughput(verify, threads, seconds)
+    return {
+        'metodo': method,
+        'ms_por_verificacion': round(1000 / single, 2),
+        'verificaciones_s_un_hilo': round(single, 1),
+        'verificaciones_s_paralelo': round(parallel, 1),
+        'verificaciones_s_por_nucleo': round(parallel / min(threads, available_cores()), 1),
+    }
+
+
+def bench_login(threads, seconds, workdir):
+    """Inicios de sesión por segundo contra POST /login con la configuración del entorno"""
+    from app import create_app
+    from database import db
+    from models.database_models import User
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'passwords.db'),
+        'SECRET_KEY': 'benchmark-' + os.urandom(16).hex(),
+        'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoices'),
+        'INVOICE_QUEUE_PATH': os.path.join(workdir, 'invoice_jobs.db'),
+        'USER_CACHE_DIR': os.path.join(workdir, 'user_epochs'),
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'RATE_LIMIT_ENABLED': False,
+        # Todo inicio de sesión tarda más que el umbral de petición lenta por defecto
+        'SLOW_REQUEST_MS': 60000,
+    })
+    with app.app_context():
+        db.create_all()
+        for index in range(threads):
+            user = User(username=f'login{index}', email=f'login{index}@example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+    thread_numbers = itertools.count()
+
+    def login():
+        # Cada hilo inicia sesión siempre con su propio usuario
+        if not hasattr(local, 'username'):
+            local.username = f'login{next(thread_numbers)}'
+        # Un cliente nuevo por intento: sin la cookie de la sesión anterior
+        response = app.test_client().post('/login', data={'username': local.username, 'password': PASSWORD})
+        with lock:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    rate = throughput(login, threads, seconds)
+    app.extensions['invoice_queue'].shutdown()
+    # Solo los inicios de sesión correctos (302) cuentan como rendimiento
+    logins = rate * statuses.get(302, 0) / max(1, sum(statuses.values()))
+    return {
+        'metodo': app.config['PASSWORD_HASH_METHOD'],
+        'hilos': threads,
+        'pool_de_hash': app.config['PASSWORD_HASH_WORKERS'],
+        'cola_de_hash': app.config['PASSWORD_HASH_QUEUE'],
+        'peticiones_s': round(rate, 1),
+        'logins_s': round(logins, 1),
+        # El pool de hash es lo que ocupa núcleos: un hilo por hash en curso
+        'logins_s_por_nucleo': round(logins / min(app.config['PASSWORD_HASH_WORKERS'], available_cores()), 1),
+        'codigos': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    args = parse_args()
+    results = {'nucleos': available_cores(), 'hilos': args.threads, 'metodos': []}
+
+    print(f'Hash de contraseñas ({available_cores()} núcleos, {args.threads} hilos)')
+    for method in args.methods:
+        stats = bench_method(method, args.threads, args.seconds)
+        results['metodos'].append(stats)
+        print(f"   {method:<24} {stats['ms_por_verificacion']:>8.2f} ms   "
+              f"{stats['verificaciones_s_un_hilo']:>8.1f}/s un hilo   "
+              f"{stats['verificaciones_s_paralelo']:>8.1f}/s paralelo   "
+              f"{stats['verificaciones_s_por_nucleo']:>8.1f}/s por núcleo")
+
+    if args.login:
+        workdir = tempfile.mkdtemp(prefix='password-bench-')
+        try:
+            stats = results['login'] = bench_login(args.login_threads, args.seconds, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"   POST /login ({stats['metodo']}, {stats['hilos']} hilos, pool {stats['pool_de_hash']}): "
+              f"{stats['logins_s']:.1f} logins/s, {stats['logins_s_por_nucleo']:.1f}/s por núcleo del pool, "
+              f"códigos {stats['codigos']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, indent=2, ensure_ascii=False)
+        print(f'Resultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
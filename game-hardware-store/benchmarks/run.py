@@ -0,0 +1,276 @@
+"""
+Benchmark de extremo a extremo de los endpoints más usados
+
+Lanza peticiones con el cliente de pruebas de Flask contra una base de
+datos con datos sintéticos y registra, por escenario, la latencia p50/p95,
+las consultas SQL por petición y la memoria asignada (tracemalloc). Los
+resultados se guardan en JSON para comparar dos commits.
+
+Uso:
+    python -m benchmarks.run --games 20000 --hardware 20000 --iterations 50
+    python -m benchmarks.run --database postgresql://... --traffic trafico.jsonl
+    python -m benchmarks.run --compare antes.json despues.json --threshold 0.2
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark de extremo a extremo de la tienda')
+    parser.add_argument('--database', help='URL de una base de datos desechable '
+                                           '(por defecto, un SQLite temporal con datos sintéticos)')
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios sintéticos si la base está vacía')
+    parser.add_argument('--games', type=int, default=5000, help='Juegos sintéticos si la base está vacía')
+    parser.add_argument('--hardware', type=int, default=5000, help='Hardware sintético si la base está vacía')
+    parser.add_argument('--order-items', type=int, default=50000, help='Items de orden si la base está vacía')
+    parser.add_argument('--iterations', type=int, default=30, help='Peticiones medidas por escenario')
+    parser.add_argument('--warmup', type=int, default=3, help='Peticiones de calentamiento por escenario')
+    parser.add_argument('--alloc-iterations', type=int, default=3,
+                        help='Peticiones con tracemalloc por escenario (van aparte porque lo ralentiza)')
+    parser.add_argument('--only', nargs='+', metavar='ESCENARIO', help='Ejecutar solo estos escenarios')
+    parser.add_argument('--traffic', help='Repetir también una secuencia de generate_data.py --traffic')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto en benchmarks/results/)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NUEVO'),
+                        help='Comparar dos archivos de resultados en lugar de ejecutar el benchmark')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Aumento relativo de p95 que se considera regresión al comparar')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Aumento absoluto mínimo de p95 para considerarlo regresión (ignora el ruido)')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL que ejecuta el engine en el hilo del benchmark"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        # Los hilos de la cola de facturas y del barrido de reservas no cuentan
+        self.thread_id = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread_id:
+            self.count += 1
+
+
+def measure(client, scenarios, counter, warmup, alloc_iterations):
+    """
+    Medir una lista de escenarios del mismo nombre
+
+    Se hacen primero las peticiones de calentamiento, luego las medidas
+    (una por escenario) y por último alloc_iterations con tracemalloc.
+
+    Returns:
+        dict: estadísticas del escenario
+    """
+    def run(scenario):
+        if scenario.setup:
+            scenario.setup()
+        return scenario.request(client)
+
+    for i in range(warmup):
+        run(scenarios[i % len(scenarios)])
+
+    latencies, queries = [], []
+    for scenario in scenarios:
+        if scenario.setup:
+            scenario.setup()
+        before = counter.count
+        started = time.perf_counter()
+        scenario.request(client)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+
+    peaks, retained = [], []
+    for i in range(alloc_iterations):
+        scenario = scenarios[i % len(scenarios)]
+        if scenario.setup:
+            scenario.setup()
+        tracemalloc.start()
+        try:
+            scenario.request(client)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak / 1024)
+        retained.append(current / 1024)
+
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+        'peak_kib': round(statistics.median(peaks), 1) if peaks else None,
+        'retained_kib': round(statistics.median(retained), 1) if retained else None,
+    }
+
+
+def git_commit():
+    """Commit actual del repositorio, si lo hay"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args, workdir):
+    """Preparar la base de datos, ejecutar los escenarios y devolver los resultados"""
+    from app import create_app
+    from database import db
+    from models.database_models import User, Game, Hardware, Order, OrderItem
+    from services import synthetic_data
+    from benchmarks.scenarios import build_scenarios, traffic_scenarios
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database or 'sqlite:///' + os.path.join(workdir, 'benchmark.db'),
+        'SECRET_KEY': 'benchmark-' + os.urandom(16).hex(),
+        'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoices'),
+        'INVOICE_QUEUE_PATH': os.path.join(workdir, 'invoice_jobs.db'),
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'RATE_LIMIT_ENABLED': False,
+    })
+
+    with app.app_context():
+        db.create_all()
+        if not Game.query.first():
+            print('Generando datos sintéticos...')
+            synthetic_data.generate(users=args.users, games=args.games, hardware=args.hardware,
+                                    order_items=args.order_items)
+        dataset = {model.__tablename__: model.query.count() for model in (User, Game, Hardware, Order, OrderItem)}
+        dialect = db.engine.dialect.name
+        counter = QueryCounter(db.engine)
+
+    traffic = []
+    if args.traffic:
+        with open(args.traffic, encoding='utf-8') as stream:
+            traffic = [json.loads(line) for line in stream if line.strip()]
+
+    client = app.test_client()
+    results = {}
+    # Contexto para preparar los escenarios; cada petición del cliente abre
+    # su propio contexto y su propia sesión de base de datos
+    with app.app_context():
+        groups = {scenario.name: [scenario] * args.iterations
+                  for scenario in build_scenarios(client, purchases=args.iterations + args.warmup
+                                                  + args.alloc_iterations)}
+        groups.update(traffic_scenarios(traffic))
+        db.session.remove()
+
+        for name, scenarios in groups.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(client, scenarios, counter, args.warmup, args.alloc_iterations)
+            stats = results[name]
+            print(f"   {name:<40} p50 {stats['p50_ms']:>9.2f} ms   p95 {stats['p95_ms']:>9.2f} ms   "
+                  f"{stats['queries']:>7} consultas   {stats['peak_kib']} KiB")
+
+    # Esperar a las facturas que la cola aún está renderizando
+    app.extensions['invoice_queue'].shutdown()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'base_de_datos': dialect,
+            'datos': dataset,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'traffic': args.traffic,
+        },
+        'results': results,
+    }
+
+
+def compare(base_path, new_path, threshold, min_delta_ms):
+    """
+    Comparar dos archivos de resultados
+
+    Returns:
+        int: 1 si algún escenario empeoró su p95 más del umbral o hace más consultas
+    """
+    with open(base_path, encoding='utf-8') as stream:
+        base = json.load(stream)
+    with open(new_path, encoding='utf-8') as stream:
+        new = json.load(stream)
+
+    print(f"Base: {base['meta'].get('commit')}   Nuevo: {new['meta'].get('commit')}\n")
+    if base['meta'].get('datos') != new['meta'].get('datos'):
+        print('⚠️  Los resultados se midieron con datos distintos\n')
+    print(f"{'Escenario':<40} {'p50 base':>10} {'p50 nuevo':>10} {'p95 base':>10} {'p95 nuevo':>10} "
+          f"{'Δ p95':>8} {'consultas':>13}")
+    regressions = []
+    for name in sorted(set(base['results']) | set(new['results'])):
+        old_stats, new_stats = base['results'].get(name), new['results'].get(name)
+        if not old_stats or not new_stats:
+            print(f"{name:<40} {'solo en base' if old_stats else 'solo en nuevo'}")
+            continue
+        change = (new_stats['p95_ms'] - old_stats['p95_ms']) / old_stats['p95_ms'] if old_stats['p95_ms'] else 0
+        flags = []
+        if change > threshold and new_stats['p95_ms'] - old_stats['p95_ms'] >= min_delta_ms:
+            flags.append('p95')
+        if new_stats['queries'] > old_stats['queries']:
+            flags.append('consultas')
+        if flags:
+            regressions.append(name)
+        print(f"{name:<40} {old_stats['p50_ms']:>10.2f} {new_stats['p50_ms']:>10.2f} "
+              f"{old_stats['p95_ms']:>10.2f} {new_stats['p95_ms']:>10.2f} {change:>+8.0%} "
+              f"{old_stats['queries']:>6} → {new_stats['queries']:<6}{'  ⚠ ' + ', '.join(flags) if flags else ''}")
+
+    if regressions:
+        print(f'\n❌ Regresiones en: {", ".join(regressions)}')
+        return 1
+    print('\n✅ Sin regresiones')
+    return 0
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        return compare(*args.compare, args.threshold, args.min_delta_ms)
+
+    # Base de datos por defecto, caché de facturas y cola en un directorio temporal
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        results = run_benchmark(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit'] or 'local'}.json")
+    with open(output, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, indent=2, ensure_ascii=False)
+    print(f'\n✅ Resultados guardados en {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Escenarios del benchmark
+
+Cada escenario es una petición al cliente de pruebas de Flask. La
+preparación que necesita (llenar el carrito, borrar un PDF de la caché)
+se hace en setup, fuera de la medición.
+"""
+import os
+import re
+from database import db
+from models.database_models import User, Game, Hardware, Order
+from services import invoices
+from services.synthetic_data import SYNTHETIC_PASSWORD
+
+BENCH_USERNAME = 'benchmark'
+
+
+class Scenario:
+    """Una petición medida del benchmark"""
+
+    def __init__(self, name, method, path, expected=200, setup=None, **kwargs):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.expected = expected
+        self.setup = setup
+        self.kwargs = kwargs
+
+    def request(self, client):
+        """Hacer la petición y comprobar el código de respuesta"""
+        response = client.open(self.path, method=self.method, **self.kwargs)
+        if self.expected is not None and response.status_code != self.expected:
+            raise RuntimeError(f'{self.name}: {self.method} {self.path} devolvió {response.status_code}, '
+                               f'se esperaba {self.expected}')
+        # Consumir el cuerpo para medir también los send_file en streaming
+        response.get_data()
+        response.close()
+        return response
+
+
+def _bench_user():
+    """Usuario con el que se hacen las peticiones autenticadas, creado si no existe"""
+    user = User.query.filter_by(username=BENCH_USERNAME).first()
+    if user is None:
+        user = User(username=BENCH_USERNAME, email=f'{BENCH_USERNAME}@example.com')
+        user.set_password(SYNTHETIC_PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+
+def _checkout(client, product_id):
+    """Comprar una unidad del juego indicado y devolver el id de la orden"""
+    Scenario('agregar', 'POST', '/carrito/agregar',
+             json={'product_type': 'game', 'product_id': product_id, 'quantity': 1}).request(client)
+    Scenario('checkout', 'POST', '/carrito/checkout', expected=302).request(client)
+    return db.session.query(db.func.max(Order.id)).filter(Order.user_id == _bench_user().id).scalar()
+
+
+def build_scenarios(client, purchases):
+    """
+    Preparar los datos del benchmark y construir los escenarios
+
+    Inicia sesión con el usuario del benchmark y le deja una orden propia
+    para los escenarios de PDF. Escribe en la base de datos: usar una base
+    de datos desechable.
+
+    Args:
+        client: cliente de pruebas de Flask
+        purchases: compras que hará el escenario de checkout
+
+    Returns:
+        list: escenarios en orden de ejecución
+    """
+    _bench_user()
+    Scenario('login', 'POST', '/login', expected=302,
+             data={'username': BENCH_USERNAME, 'password': SYNTHETIC_PASSWORD}).request(client)
+
+    games = Game.query.order_by(Game.id).limit(3).all()
+    components = {tipo: Hardware.query.filter_by(tipo=tipo).order_by(Hardware.id).first()
+                  for tipo in ('CPU', 'GPU', 'RAM')}
+    if len(games) < 3 or not all(components.values()):
+        raise RuntimeError('La base de datos no tiene suficientes juegos y componentes para el benchmark')
+
+    # Los juegos del carrito necesitan stock para todas las compras
+    for game in games:
+        game.stock = max(game.stock or 0, purchases + 10)
+    db.session.commit()
+    game_ids = [game.id for game in games]
+    order_id = _checkout(client, game_ids[0])
+
+    # Una palabra del nombre de un juego, para que la búsqueda tenga resultados
+    term = re.split(r'\W+', games[1].nombre)[0].lower() or 'a'
+    cpu, gpu, ram = components['CPU'], components['GPU'], components['RAM']
+    hardware_ids = [cpu.id, gpu.id, ram.id]
+
+    def fill_cart(lines=game_ids):
+        """Dejar en el carrito una unidad de cada juego indicado"""
+        Scenario('vaciar', 'POST', '/carrito/vaciar', expected=302).request(client)
+        for game_id in lines:
+            Scenario('agregar', 'POST', '/carrito/agregar',
+                     json={'product_type': 'game', 'product_id': game_id, 'quantity': 1}).request(client)
+
+    def drop_invoice():
+        """Borrar el PDF en caché para medir el renderizado"""
+        path = invoices.cache_path(order_id)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    return [
+        Scenario('index', 'GET', '/'),
+        Scenario('tienda', 'GET', '/tienda'),
+        Scenario('buscar', 'GET', f'/buscar?q={term}'),
+        Scenario('consultar_compatibilidad', 'POST', '/consultar-compatibilidad',
+                 json={'cpu': {'marca': cpu.marca, 'modelo': cpu.modelo},
+                       'gpu': {'marca': gpu.marca, 'modelo': gpu.modelo},
+                       'ram': {'marca': ram.marca, 'modelo': ram.modelo},
+                       'storage': {'capacidad': '1 TB'}}),
+        Scenario('verificar_setup_completo', 'POST', '/verificar-setup-completo',
+                 json={'juegos': game_ids, 'componentes': hardware_ids}),
+        Scenario('comparar_hardware', 'POST', '/comparar-hardware', json={'componentes': hardware_ids}),
+        Scenario('carrito', 'GET', '/carrito', setup=fill_cart),
+        Scenario('checkout', 'POST', '/carrito/checkout', expected=302, setup=lambda: fill_cart(game_ids[:1])),
+        Scenario('orden_pdf', 'GET', f'/orden/{order_id}/pdf', setup=drop_invoice),
+        Scenario('orden_pdf_cache', 'GET', f'/orden/{order_id}/pdf'),
+    ]
+
+
+def traffic_scenarios(requests):
+    """
+    Escenarios para repetir una secuencia de generate_data.py --traffic
+
+    Las peticiones se agrupan por método y ruta (con los ids como <id>), y
+    cada grupo se mide como un escenario con tantas muestras como peticiones.
+    No se comprueba el código de respuesta: la secuencia puede pedir
+    productos agotados o borrados.
+
+    Returns:
+        dict: nombre del grupo -> lista de escenarios
+    """
+    groups = {}
+    for request in requests:
+        route = re.sub(r'/\d+', '/<id>', request['path'].split('?')[0])
+        name = f"trafico {request['method']} {route}"
+        kwargs = {'json': request['json']} if 'json' in request else {}
+        groups.setdefault(name, []).append(Scenario(name, request['method'], request['path'], expected=None, **kwargs))
+    return groups
@@ -0,0 +1,184 @@
+"""
+Comparación de los perfiles de workers de gunicorn (sync, gthread, gevent)
+
+Crea un SQLite temporal con datos sintéticos y una secuencia de tráfico
+de generate_traffic (la mezcla de generate_data.py --traffic), y:
+
+1. Mide la fracción del tiempo de las peticiones que se pasa en la base de
+   datos (cabecera Server-Timing), repitiendo la secuencia con un único
+   worker sync. Es el valor de GUNICORN_IO_RATIO para este despliegue.
+2. Arranca gunicorn con cada perfil de gunicorn.conf.py (workers e hilos
+   calculados con esa fracción) y repite la secuencia con varios niveles
+   de concurrencia: peticiones por segundo, latencia p50/p95 y códigos.
+
+Con --database se usa una base de datos existente (por ejemplo un
+PostgreSQL desechable), que es donde la fracción de espera es real.
+
+Uso:
+    python -m benchmarks.worker_profiles
+    python -m benchmarks.worker_profiles --profiles sync gthread --concurrency 10 50 100 --seconds 10
+    python -m benchmarks.worker_profiles --database postgresql://... --io-ratio 0.7
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.load_test import APP_DIR, browser_session, percentile, prepare_database, start_server, stop_server
+
+PROFILES = ('sync', 'gthread', 'gevent')
+SERVER_TIMING = re.compile(r'(db|app);dur=([\d.]+)')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Comparación de los perfiles de workers de gunicorn')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES), help='Perfiles a medir')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50],
+                        help='Clientes concurrentes de cada medición')
+    parser.add_argument('--seconds', type=float, default=5, help='Duración de cada medición')
+    parser.add_argument('--requests', type=int, default=2000, help='Peticiones de la secuencia de tráfico')
+    parser.add_argument('--io-ratio', type=float, help='GUNICORN_IO_RATIO a usar (por defecto, el medido)')
+    parser.add_argument('--database', help='URL de una base de datos desechable ya poblada')
+    parser.add_argument('--games', type=int, default=500, help='Juegos sintéticos del SQLite temporal')
+    parser.add_argument('--hardware', type=int, default=2000, help='Hardware sintético del SQLite temporal')
+    parser.add_argument('--output', help='Guardar los resultados en este archivo JSON')
+    return parser.parse_args()
+
+
+def traffic_for(url, count):
+    """Secuencia de tráfico con los productos de una base de datos existente"""
+    from app import create_app
+    from database import dispose_engines
+    from services import synthetic_data
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'load-test'})
+    with app.app_context():
+        requests = synthetic_data.generate_traffic(count)
+    app.extensions['invoice_queue'].shutdown()
+    dispose_engines(app)
+    return requests
+
+
+def profile_settings(profile, io_ratio):
+    """Workers, hilos y conexiones que calcula gunicorn.conf.py para un perfil (en otro proceso)"""
+    code = ('import json, runpy; c = runpy.run_path("gunicorn.conf.py"); '
+            'print(json.dumps({k: c[k] for k in ("workers", "threads", "worker_connections", "preload_app")}))')
+    env = dict(os.environ, GUNICORN_PROFILE=profile, GUNICORN_IO_RATIO=str(io_ratio))
+    env.pop('GUNICORN_WORKERS', None)
+    output = subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def send(client, request):
+    if 'json' in request:
+        return client.request(request['method'], request['path'], json=request['json'])
+    return client.request(request['method'], request['path'])
+
+
+async def measure_io_ratio(base_url, traffic):
+    """Fracción del tiempo de las peticiones que se pasa en la base de datos (Server-Timing)"""
+    totals = {'db': 0.0, 'app': 0.0}
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        await browser_session(client)
+        for request in traffic:
+            response = await send(client, request)
+            for name, duration in SERVER_TIMING.findall(response.headers.get('server-timing', '')):
+                totals[name] += float(duration)
+    return totals['db'] / totals['app'] if totals['app'] else 0.0
+
+
+async def replay(base_url, traffic, concurrency, seconds):
+    """Repetir la secuencia con concurrency clientes durante seconds"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    requests = itertools.cycle(traffic)
+    latencies, codes, errors = [], {}, 0
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await browser_session(client)
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await send(client, next(requests))
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                if response.status_code >= 500:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'concurrencia': concurrency,
+        'peticiones_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'errores': errors,
+        'codigos': {str(code): count for code, count in sorted(codes.items())},
+    }
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='worker-profiles-')
+    results = {'perfiles': {}}
+    try:
+        if args.database:
+            url = args.database
+            traffic = traffic_for(url, args.requests)
+        else:
+            print('Generando datos sintéticos...')
+            url, traffic = prepare_database(workdir, args.games, args.hardware, traffic=args.requests)
+
+        io_ratio = args.io_ratio
+        if io_ratio is None:
+            process, base_url = start_server('sync', url, workdir, 1, {'GUNICORN_PROFILE': 'sync'})
+            try:
+                io_ratio = round(asyncio.run(measure_io_ratio(base_url, traffic[:500])), 2)
+            finally:
+                stop_server(process)
+            print(f'Fracción de espera en la base de datos medida: {io_ratio} (GUNICORN_IO_RATIO={io_ratio})')
+        results['io_ratio'] = io_ratio
+
+        for profile in args.profiles:
+            settings = profile_settings(profile, io_ratio)
+            size = settings['worker_connections'] if profile == 'gevent' else settings['threads']
+            print(f"\n{profile}: {settings['workers']} workers x {size}")
+            process, base_url = start_server('sync', url, workdir, None,
+                                             {'GUNICORN_PROFILE': profile, 'GUNICORN_IO_RATIO': str(io_ratio)})
+            try:
+                runs = []
+                for concurrency in args.concurrency:
+                    stats = asyncio.run(replay(base_url, traffic, concurrency, args.seconds))
+                    runs.append(stats)
+                    print(f"   c={concurrency:<4} {stats['peticiones_s']:>8.1f} req/s   p50 {stats['p50_ms']:>9.2f} ms   "
+                          f"p95 {stats['p95_ms']:>9.2f} ms   errores {stats['errores']}   códigos {stats['codigos']}")
+            finally:
+                stop_server(process)
+            results['perfiles'][profile] = {'configuracion': settings, 'mediciones': runs}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, indent=2, ensure_ascii=False)
+        print(f'\nResultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Script para generar los archivos estáticos de producción (static/dist/)
+
+Minifica CSS y JS, añade la huella del contenido a cada nombre y los
+precomprime con gzip y brotli. La aplicación usa static/dist/manifest.json
+al arrancar; se ejecuta al construir la imagen y tras cada cambio en static/.
+
+Uso:
+    python build_static.py
+"""
+import os
+import sys
+from services import static_assets
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def main():
+    def on_file(relative_path, target_name, original_size, size):
+        compressed = [ext for ext in ('.br', '.gz')
+                      if os.path.exists(os.path.join(STATIC_FOLDER, static_assets.DIST_DIR, target_name + ext))]
+        print(f"   {relative_path} -> {target_name} ({original_size} -> {size} bytes"
+              f"{', ' + ' '.join(compressed) if compressed else ''})")
+
+    manifest = static_assets.build(STATIC_FOLDER, on_file=on_file)
+    print(f'✅ {len(manifest)} archivos en {os.path.join(STATIC_FOLDER, static_assets.DIST_DIR)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
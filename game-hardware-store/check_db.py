@@ -1,10 +1,11 @@
 """
 Script para verificar el contenido de la base de datos
 """
-from app import app
+from app import create_app
 from models.database_models import Hardware, Game
 from database import db
 
+app = create_app()
 with app.app_context():
     # Verificar hardware
     all_hardware = Hardware.get_all_hardware()
@@ -1,14 +1,16 @@
 """
 Controlador para el panel de administración
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 from database import db
-from models.database_models import Game, Hardware, User
+from models.database_models import Game, Hardware, User, CompatibilityScore
+from services.user_cache import user_cache
 from werkzeug.utils import secure_filename
+import io
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -36,8 +38,8 @@ def dashboard():
     total_users = User.query.count()
     
     # Productos con bajo stock
-    low_stock_games = Game.query.filter(Game.stock < 10).all()
-    low_stock_hardware = Hardware.query.filter(Hardware.stock < 10).all()
+    low_stock_games = Game.get_low_stock()
+    low_stock_hardware = Hardware.get_low_stock()
     
     return render_template('admin/dashboard.html',
                          total_games=total_games,
@@ -92,6 +94,8 @@ def new_game():
             )
             
             db.session.add(game)
+            db.session.flush()
+            CompatibilityScore.refresh('game', game)
             db.session.commit()
             
             flash(f'Juego "{game.nombre}" creado exitosamente', 'success')
@@ -137,6 +141,7 @@ def edit_game(game_id):
             game.imagen = request.form.get('image_url', '')
             game.requisitos_minimos = json.dumps(req_min)
             game.requisitos_recomendados = json.dumps(req_rec)
+            CompatibilityScore.refresh('game', game)
             
             db.session.commit()
             
@@ -157,6 +162,7 @@ def delete_game(game_id):
     
     try:
         title = game.nombre
+        CompatibilityScore.remove('game', game.id)
         db.session.delete(game)
         db.session.commit()
         flash(f'Juego "{title}" eliminado exitosamente', 'success')
@@ -194,6 +200,8 @@ def new_hardware():
             )
             
             db.session.add(hardware)
+            db.session.flush()
+            CompatibilityScore.refresh('hardware', hardware)
             db.session.commit()
             
             flash(f'Hardware "{hardware.marca} {hardware.modelo}" creado exitosamente', 'success')
@@ -221,6 +229,7 @@ def edit_hardware(hardware_id):
             hardware.imagen = request.form.get('image_url', '')
             hardware.especificaciones = request.form.get('specifications', '')
             hardware.stock = int(request.form['stock'])
+            CompatibilityScore.refresh('hardware', hardware)
             
             db.session.commit()
             
@@ -241,6 +250,7 @@ def delete_hardware(hardware_id):
     
     try:
         name = f"{hardware.marca} {hardware.modelo}"
+        CompatibilityScore.remove('hardware', hardware.id)
         db.session.delete(hardware)
         db.session.commit()
         flash(f'Hardware "{name}" eliminado exitosamente', 'success')
@@ -273,6 +283,7 @@ def toggle_admin(user_id):
     try:
         user.is_admin = not user.is_admin
         db.session.commit()
+        user_cache.invalidate(user.id)
         status = "administrador" if user.is_admin else "usuario normal"
         flash(f'Usuario "{user.username}" ahora es {status}', 'success')
     except Exception as e:
@@ -295,6 +306,7 @@ def toggle_active(user_id):
     try:
         user.is_active = not user.is_active
         db.session.commit()
+        user_cache.invalidate(user.id)
         status = "activado" if user.is_active else "desactivado"
         flash(f'Usuario "{user.username}" ha sido {status}', 'success')
     except Exception as e:
@@ -302,3 +314,86 @@ def toggle_active(user_id):
         flash(f'Error al cambiar el estado: {str(e)}', 'danger')
     
     return redirect(url_for('admin.users'))
+
+# ==================== FACTURAS ====================
+@admin_bp.route('/facturas/exportar')
+@login_required
+@admin_required
+def export_invoices():
+    """Descargar en un ZIP las facturas de las órdenes de un rango de fechas"""
+    from services.invoice_export import completed_orders_between, stream_invoices_zip
+
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d')
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d')
+    except (KeyError, ValueError):
+        flash('Rango de fechas inválido', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    if hasta < desde:
+        flash('La fecha final debe ser posterior a la inicial', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    # El rango incluye el día final completo
+    query = completed_orders_between(desde, hasta + timedelta(days=1))
+    zip_stream = stream_invoices_zip(query,
+                                     current_app.config['INVOICE_CACHE_DIR'],
+                                     current_app.config['INVOICE_EXPORT_WORKERS'])
+    
+    filename = f'facturas_{desde:%Y%m%d}_{hasta:%Y%m%d}.zip'
+    return Response(stream_with_context(zip_stream),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# ==================== INVENTARIO ====================
+# Formatos de feed según el Content-Type cuando el feed viene en el cuerpo
+FEED_MIMETYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+# Diferencias incluidas en la respuesta; el resto solo se cuenta en el resumen
+MAX_API_DIFFS = 100
+
+@admin_bp.route('/api/inventario', methods=['POST'])
+@login_required
+@admin_required
+def api_inventario():
+    """
+    API para sincronizar stock y precios desde un feed CSV o JSONL
+    
+    El feed puede subirse como archivo (campo 'archivo') o enviarse en el
+    cuerpo con Content-Type text/csv o application/x-ndjson. Con
+    ?dry_run=1 solo se calculan las diferencias.
+    """
+    from services import inventory_sync
+
+    upload = request.files.get('archivo')
+    if upload:
+        fmt = request.form.get('format') or inventory_sync.detect_format(upload.filename)
+        raw = upload.stream
+    else:
+        fmt = request.args.get('format') or FEED_MIMETYPES.get(request.mimetype)
+        raw = io.BufferedReader(request.stream)
+    
+    if fmt not in inventory_sync.FORMATS:
+        return jsonify({'success': False, 'message': 'Formato de feed no soportado'}), 400
+    
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    diffs = []
+    
+    def on_diff(diff):
+        if len(diffs) < MAX_API_DIFFS:
+            diffs.append(diff)
+    
+    try:
+        summary = inventory_sync.sync_inventory(
+            inventory_sync.read_feed(io.TextIOWrapper(raw, encoding='utf-8', newline=''), fmt),
+            dry_run=dry_run,
+            on_diff=on_diff
+        )
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'El feed debe estar en UTF-8'}), 400
+    
+    return jsonify({'success': True, 'dry_run': dry_run, **summary, 'cambios': diffs})
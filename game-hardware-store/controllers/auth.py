@@ -5,6 +5,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from database import db
 from models.database_models import User
+from services import session_cart
+from services.passwords import HashingBusy
+from services.rate_limit import RateLimited, rate_limiter
+from services.user_cache import user_cache
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -83,10 +87,32 @@ def login():
             flash('Por favor ingresa usuario y contraseña', 'danger')
             return render_template('auth/login.html')
         
+        # Antes de buscar al usuario y calcular el hash
+        try:
+            rate_limiter.check_login(username)
+        except RateLimited as e:
+            flash(e.description, 'danger')
+            return render_template('auth/login.html'), 429, {'Retry-After': str(e.retry_after)}
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
-            # Login exitoso
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy as e:
+            flash(e.description, 'warning')
+            return render_template('auth/login.html'), 503
+        
+        if valid:
+            # Hash con una política anterior: recalcularlo ahora que se conoce la contraseña
+            old_version = user.password_version
+            rehashed = user.upgrade_password_hash(password)
+            # Login exitoso: pasar el carrito anónimo de la sesión a la cuenta
+            session_cart.merge_into_user(user.id)
+            db.session.commit()
+            if rehashed:
+                # Misma contraseña: las demás sesiones del usuario siguen abiertas
+                user_cache.invalidate(user.id, keep_version=old_version)
+            rate_limiter.login_succeeded(username)
             login_user(user, remember=remember)
             flash(f'¡Bienvenido {user.username}!', 'success')
             
@@ -96,8 +122,7 @@ def login():
         else:
             # Login fallido
             flash('Usuario o contraseña incorrectos', 'danger')
-            # Aquí podrías implementar un contador de intentos fallidos
-            # Para simplicidad, solo mostramos el mensaje
+            rate_limiter.login_failed(username)
     
     return render_template('auth/login.html')
 
@@ -122,30 +147,37 @@ def logout():
 @login_required
 def perfil():
     """Página de perfil del usuario"""
-    return render_template('auth/perfil.html', user=current_user)
+    # current_user es una copia en caché; la plantilla necesita fecha de alta y órdenes
+    user = db.session.get(User, current_user.id)
+    return render_template('auth/perfil.html', user=user)
 
 @auth_bp.route('/perfil/editar', methods=['GET', 'POST'])
 @login_required
 def editar_perfil():
     """Editar perfil del usuario"""
+    # current_user es una copia inmutable en caché: los cambios se hacen sobre la fila real
+    user = db.session.get(User, current_user.id)
+    
     if request.method == 'POST':
         email = request.form.get('email')
         current_password = request.form.get('current_password')
         new_password = request.form.get('new_password')
+        password_changed = False
         
         # Actualizar email
-        if email and email != current_user.email:
+        if email and email != user.email:
             if User.query.filter_by(email=email).first():
                 flash('El email ya está en uso', 'danger')
             else:
-                current_user.email = email
+                user.email = email
                 flash('Email actualizado correctamente', 'success')
         
         # Cambiar contraseña
         if current_password and new_password:
-            if current_user.check_password(current_password):
+            if user.check_password(current_password):
                 if len(new_password) >= 8 and re.search(r'[A-Z]', new_password) and re.search(r'[a-z]', new_password) and re.search(r'\d', new_password):
-                    current_user.set_password(new_password)
+                    user.set_password(new_password)
+                    password_changed = True
                     flash('Contraseña actualizada correctamente', 'success')
                 else:
                     flash('La nueva contraseña debe tener al menos 8 caracteres, con mayúscula, minúscula y número', 'danger')
@@ -153,6 +185,11 @@ def editar_perfil():
                 flash('Contraseña actual incorrecta', 'danger')
         
         db.session.commit()
+        user_cache.invalidate(user.id, password_changed=password_changed)
+        if password_changed:
+            # El identificador de sesión incluye la versión de la contraseña:
+            # renovarlo mantiene esta sesión y cierra las demás
+            login_user(user, remember='remember_token' in request.cookies)
         return redirect(url_for('auth.perfil'))
     
-    return render_template('auth/editar_perfil.html', user=current_user)
+    return render_template('auth/editar_perfil.html', user=user)
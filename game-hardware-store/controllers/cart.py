@@ -1,26 +1,63 @@
 """
 Controlador del carrito de compras
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
 from flask_login import login_required, current_user
 from database import db
 from models.database_models import CartItem, Game, Hardware, Order, OrderItem
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from services import invoices, session_cart, reservations
+from services.invoice_queue import invoice_queue
+from services.query_stats import query_budget
+from sqlalchemy.exc import IntegrityError
+import tempfile
 from datetime import datetime
 
 cart_bp = Blueprint('cart', __name__)
 
+# Operaciones aceptadas por la API de cambios en lote del carrito
+CART_OPERATIONS = ('set', 'remove', 'add')
+MAX_CART_CHANGES = 100
+
+def _product_name(product):
+    """Nombre visible de un juego o componente de hardware"""
+    return product.nombre if hasattr(product, 'nombre') else f"{product.marca} {product.modelo}"
+
+def _cart_state(items):
+    """Estado del carrito (líneas y totales) para las respuestas JSON"""
+    lines = []
+    subtotal = 0.0
+    for item in items:
+        product = item.get_product()
+        if not product:
+            continue
+        line_subtotal = product.precio * item.quantity
+        subtotal += line_subtotal
+        lines.append({
+            'id': item.id,
+            'product_type': item.product_type,
+            'product_id': item.product_id,
+            'nombre': _product_name(product),
+            'precio': product.precio,
+            'stock': product.stock,
+            'quantity': item.quantity,
+            'subtotal': line_subtotal
+        })
+    return {
+        'items': lines,
+        'cart_count': len(items),
+        'subtotal': subtotal,
+        'iva': subtotal * 0.19,
+        'total': subtotal * 1.19
+    }
+
 @cart_bp.route('/carrito')
-@login_required
+@query_budget(5)
 def ver_carrito():
     """Ver el carrito de compras"""
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    if current_user.is_authenticated:
+        cart_items = CartItem.get_cart(current_user.id)
+    else:
+        cart_items = session_cart.get_items()
     
     # Calcular total
     total = sum(item.get_subtotal() for item in cart_items)
@@ -28,7 +65,6 @@ def ver_carrito():
     return render_template('cart/carrito.html', cart_items=cart_items, total=total)
 
 @cart_bp.route('/carrito/agregar', methods=['POST'])
-@login_required
 def agregar_al_carrito():
     """Agregar producto al carrito"""
     data = request.get_json() if request.is_json else request.form
@@ -43,57 +79,66 @@ def agregar_al_carrito():
         flash('Tipo de producto inválido', 'danger')
         return redirect(request.referrer or url_for('index'))
     
-    # Verificar que el producto existe
-    if product_type == 'game':
-        product = Game.query.get(product_id)
-    else:
-        product = Hardware.query.get(product_id)
-    
-    if not product:
-        if request.is_json:
-            return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
-        flash('Producto no encontrado', 'danger')
-        return redirect(request.referrer or url_for('index'))
-    
-    # Verificar stock
-    if product.stock < quantity:
+    if quantity <= 0:
         if request.is_json:
-            return jsonify({'success': False, 'message': 'Stock insuficiente'}), 400
-        flash('Stock insuficiente', 'danger')
+            return jsonify({'success': False, 'message': 'Cantidad inválida'}), 400
+        flash('Cantidad inválida', 'danger')
         return redirect(request.referrer or url_for('index'))
     
-    # Verificar si ya existe en el carrito
-    existing_item = CartItem.query.filter_by(
-        user_id=current_user.id,
-        product_type=product_type,
-        product_id=product_id
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += quantity
-        message = 'Cantidad actualizada en el carrito'
+    if not current_user.is_authenticated:
+        # Carrito anónimo en la sesión: sin escribir en la base de datos
+        result = session_cart.add(product_type, product_id, quantity)
+        if result is False:
+            if request.is_json:
+                return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
+            flash('Producto no encontrado', 'danger')
+            return redirect(request.referrer or url_for('index'))
+        if result is None:
+            if request.is_json:
+                return jsonify({'success': False, 'message': 'Límite del carrito alcanzado'}), 400
+            flash('Límite del carrito alcanzado', 'danger')
+            return redirect(request.referrer or url_for('index'))
+        line_quantity, cart_count = result
     else:
-        cart_item = CartItem(
-            user_id=current_user.id,
-            product_type=product_type,
-            product_id=product_id,
-            quantity=quantity
-        )
-        db.session.add(cart_item)
-        message = 'Producto agregado al carrito'
+        # Reservar las unidades e insertar o sumar la cantidad en la misma transacción
+        if not reservations.reserve(current_user.id, product_type, product_id, quantity):
+            return _agregar_fallido(product_type, product_id)
+        result = CartItem.upsert(current_user.id, product_type, product_id, quantity)
+        if result is None:
+            return _agregar_fallido(product_type, product_id)
+        line_quantity, cart_count = result
+        db.session.commit()
     
-    db.session.commit()
+    # Si la cantidad de la línea es la pedida, la línea es nueva
+    if line_quantity == quantity:
+        message = 'Producto agregado al carrito'
+    else:
+        message = 'Cantidad actualizada en el carrito'
     
     if request.is_json:
         return jsonify({
             'success': True,
             'message': message,
-            'cart_count': CartItem.query.filter_by(user_id=current_user.id).count()
+            'cart_count': cart_count
         })
     
     flash(message, 'success')
     return redirect(request.referrer or url_for('index'))
 
+def _agregar_fallido(product_type, product_id):
+    """Respuesta cuando no se pudo reservar o el upsert del carrito no insertó nada"""
+    # Solo en el camino de error se consulta el producto para dar el motivo
+    db.session.rollback()
+    product_model = Game if product_type == 'game' else Hardware
+    if db.session.get(product_model, product_id) is None:
+        message, status = 'Producto no encontrado', 404
+    else:
+        message, status = 'Stock insuficiente', 400
+    if request.is_json:
+        return jsonify({'success': False, 'message': message}), status
+    flash(message, 'danger')
+    return redirect(request.referrer or url_for('index'))
+
 @cart_bp.route('/carrito/actualizar/<int:item_id>', methods=['POST'])
 @login_required
 def actualizar_cantidad(item_id):
@@ -106,18 +151,20 @@ def actualizar_cantidad(item_id):
         return redirect(url_for('cart.ver_carrito'))
     
     quantity = int(request.form.get('quantity', 1))
+    key = (cart_item.product_type, cart_item.product_id)
     
+    # Reemplazar la reserva de la línea por una de la nueva cantidad
+    reservations.release(current_user.id, [key])
     if quantity <= 0:
         db.session.delete(cart_item)
         flash('Producto eliminado del carrito', 'info')
+    elif reservations.reserve(current_user.id, *key, quantity):
+        cart_item.quantity = quantity
+        flash('Cantidad actualizada', 'success')
     else:
-        # Verificar stock
-        product = cart_item.get_product()
-        if product and product.stock >= quantity:
-            cart_item.quantity = quantity
-            flash('Cantidad actualizada', 'success')
-        else:
-            flash('Stock insuficiente', 'danger')
+        db.session.rollback()
+        flash('Stock insuficiente', 'danger')
+        return redirect(url_for('cart.ver_carrito'))
     
     db.session.commit()
     return redirect(url_for('cart.ver_carrito'))
@@ -135,6 +182,7 @@ def eliminar_del_carrito(item_id):
         flash('No tienes permiso para eliminar este item', 'danger')
         return redirect(url_for('cart.ver_carrito'))
     
+    reservations.release(current_user.id, [(cart_item.product_type, cart_item.product_id)])
     db.session.delete(cart_item)
     db.session.commit()
     
@@ -149,11 +197,14 @@ def eliminar_del_carrito(item_id):
     return redirect(url_for('cart.ver_carrito'))
 
 @cart_bp.route('/carrito/vaciar', methods=['POST'])
-@login_required
 def vaciar_carrito():
     """Vaciar todo el carrito"""
-    CartItem.query.filter_by(user_id=current_user.id).delete()
-    db.session.commit()
+    if current_user.is_authenticated:
+        reservations.release(current_user.id)
+        CartItem.query.filter_by(user_id=current_user.id).delete()
+        db.session.commit()
+    else:
+        session_cart.clear()
     
     flash('Carrito vaciado', 'info')
     return redirect(url_for('cart.ver_carrito'))
@@ -162,7 +213,7 @@ def vaciar_carrito():
 @login_required
 def checkout():
     """Proceso de checkout"""
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    cart_items = CartItem.get_cart(current_user.id)
     
     if not cart_items:
         flash('Tu carrito está vacío', 'warning')
@@ -181,34 +232,40 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # Para obtener el ID de la orden
         
-        # Crear items de la orden y actualizar stock
-        for cart_item in cart_items:
+        # Las unidades reservadas por el comprador pasan a estar disponibles
+        # para él; el stock se descuenta sin tocar lo reservado por otros
+        reservations.release(current_user.id)
+        for cart_item in sorted(cart_items, key=lambda item: (item.product_type, item.product_id)):
             product = cart_item.get_product()
             
-            if not product or product.stock < cart_item.quantity:
+            if not product or not reservations.consume(cart_item.product_type, cart_item.product_id, cart_item.quantity):
                 db.session.rollback()
-                flash(f'Stock insuficiente para {product.nombre if hasattr(product, "nombre") else product.modelo}', 'danger')
+                flash(f'Stock insuficiente para {_product_name(product) if product else "un producto eliminado"}', 'danger')
                 return redirect(url_for('cart.ver_carrito'))
+        
+        # Crear items de la orden
+        for cart_item in cart_items:
+            product = cart_item.get_product()
             
             # Crear item de orden
             order_item = OrderItem(
                 order_id=order.id,
                 product_type=cart_item.product_type,
                 product_id=cart_item.product_id,
-                product_name=product.nombre if hasattr(product, 'nombre') else f"{product.marca} {product.modelo}",
+                product_name=_product_name(product),
                 quantity=cart_item.quantity,
                 price=product.precio
             )
             db.session.add(order_item)
-            
-            # Actualizar stock
-            product.stock -= cart_item.quantity
         
         # Vaciar carrito
         CartItem.query.filter_by(user_id=current_user.id).delete()
         
         db.session.commit()
         
+        # Prerenderizar la factura en segundo plano
+        invoice_queue.enqueue(order.id)
+        
         flash(f'¡Compra realizada con éxito! Orden #{order.id}', 'success')
         return redirect(url_for('cart.orden_confirmada', order_id=order.id))
     
@@ -217,8 +274,101 @@ def checkout():
     
     return render_template('cart/checkout.html', cart_items=cart_items, total=total)
 
+@cart_bp.route('/api/carrito', methods=['PATCH'])
+@login_required
+def api_actualizar_carrito():
+    """
+    Aplicar varios cambios al carrito en una sola transacción
+    
+    Recibe {"changes": [{"op": "set"|"remove"|"add", "product_type": ...,
+    "product_id": ..., "quantity": ...}, ...]}. Los cambios se aplican en
+    orden, las reservas de todas las líneas afectadas se rehacen con la
+    cantidad final y, si alguna no alcanza, no se aplica ninguno.
+    """
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+    
+    if not isinstance(changes, list) or not changes or len(changes) > MAX_CART_CHANGES:
+        return jsonify({'success': False, 'message': 'Lista de cambios inválida'}), 400
+    
+    parsed = []
+    try:
+        for change in changes:
+            op = change['op']
+            key = (change['product_type'], int(change['product_id']))
+            quantity = int(change.get('quantity', 0 if op == 'remove' else 1))
+            if op not in CART_OPERATIONS or key[0] not in ('game', 'hardware') or quantity < 0:
+                raise ValueError
+            if op == 'add' and quantity == 0:
+                raise ValueError
+            parsed.append((op, key, quantity))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Cambio inválido'}), 400
+    
+    # Calcular la cantidad final de cada línea a partir del carrito actual
+    lines = {(item.product_type, item.product_id): item
+             for item in CartItem.query.filter_by(user_id=current_user.id)}
+    quantities = {key: item.quantity for key, item in lines.items()}
+    for op, key, quantity in parsed:
+        if op == 'set':
+            quantities[key] = quantity
+        elif op == 'remove':
+            quantities[key] = 0
+        else:
+            quantities[key] = quantities.get(key, 0) + quantity
+    touched = {key for _, key, _ in parsed}
+    
+    # Una consulta por tipo de producto para todas las líneas que quedan
+    products = CartItem.load_products(key for key, quantity in quantities.items() if quantity > 0)
+    
+    errors = ['Producto no encontrado' for key in touched
+              if quantities[key] > 0 and products.get(key) is None]
+    
+    if not errors:
+        # Reemplazar las reservas de las líneas afectadas por las de la cantidad final
+        reservations.release(current_user.id, touched)
+        shortages = reservations.reserve_many(current_user.id, {key: quantities[key] for key in touched})
+        errors.extend(f'Stock insuficiente para {_product_name(products[key])}' for key in shortages)
+    
+    if errors:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': errors[0],
+            'errors': errors,
+            **_cart_state(CartItem.get_cart(current_user.id))
+        }), 400
+    
+    for key in touched:
+        item = lines.get(key)
+        if quantities[key] <= 0:
+            if item:
+                db.session.delete(item)
+                del lines[key]
+        elif item:
+            item.quantity = quantities[key]
+        else:
+            lines[key] = CartItem(user_id=current_user.id, product_type=key[0],
+                                  product_id=key[1], quantity=quantities[key])
+            db.session.add(lines[key])
+    
+    try:
+        # Calcular el estado antes del commit para no recargar cada línea después
+        db.session.flush()
+        for key, item in lines.items():
+            item._product = products.get(key)
+        state = _cart_state(list(lines.values()))
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición agregó la misma línea a la vez
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'El carrito cambió mientras se actualizaba, intenta de nuevo'}), 409
+    
+    return jsonify({'success': True, 'message': 'Carrito actualizado', **state})
+
 @cart_bp.route('/orden/<int:order_id>')
 @login_required
+@query_budget(5)
 def orden_confirmada(order_id):
     """Página de confirmación de orden"""
     order = Order.query.get_or_404(order_id)
@@ -234,18 +384,53 @@ def orden_confirmada(order_id):
 @login_required
 def mis_ordenes():
     """Ver historial de órdenes del usuario"""
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('cart/mis_ordenes.html', orders=orders)
+    cursor = request.args.get('antes')
+    try:
+        orders, next_cursor = Order.get_history(current_user.id, cursor=cursor)
+    except ValueError:
+        return redirect(url_for('cart.mis_ordenes'))
+    return render_template('cart/mis_ordenes.html', orders=orders, cursor=cursor, next_cursor=next_cursor)
 
-@cart_bp.route('/api/carrito/count')
+@cart_bp.route('/api/mis-ordenes')
 @login_required
+def api_mis_ordenes():
+    """API paginada del historial de órdenes del usuario"""
+    cursor = request.args.get('antes')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    try:
+        orders, next_cursor = Order.get_history(current_user.id, cursor=cursor, limit=max(limit, 1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+    return jsonify({
+        'success': True,
+        'orders': [order.to_dict() for order in orders],
+        'next_cursor': next_cursor
+    })
+
+@cart_bp.route('/api/stock/<product_type>/<int:product_id>')
+def api_stock(product_type, product_id):
+    """API del stock disponible de un producto, descontando las reservas"""
+    if product_type not in ['game', 'hardware']:
+        return jsonify({'success': False, 'message': 'Tipo de producto inválido'}), 400
+    stock = reservations.available_stock(product_type, product_id)
+    if stock is None:
+        return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
+    stock, reserved, available = stock
+    return jsonify({'success': True, 'stock': stock, 'reservado': reserved, 'disponible': available})
+
+@cart_bp.route('/api/carrito/count')
+@query_budget(3)
 def cart_count():
     """API para obtener la cantidad de items en el carrito"""
-    count = CartItem.query.filter_by(user_id=current_user.id).count()
+    if current_user.is_authenticated:
+        count = db.session.scalar(CartItem.select_count(current_user.id))
+    else:
+        count = session_cart.count()
     return jsonify({'count': count})
 
 @cart_bp.route('/orden/<int:order_id>/pdf')
 @login_required
+@query_budget(5)
 def descargar_pdf(order_id):
     """Generar y descargar PDF de la orden"""
     order = Order.query.get_or_404(order_id)
@@ -255,133 +440,20 @@ def descargar_pdf(order_id):
         flash('No tienes permiso para descargar esta orden', 'danger')
         return redirect(url_for('index'))
     
-    # Crear buffer para el PDF
-    buffer = BytesIO()
-    
-    # Crear documento PDF
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#667eea'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#667eea'),
-        spaceAfter=12
-    )
-    
-    # Título
-    elements.append(Paragraph("GameTech Store", title_style))
-    elements.append(Paragraph("Factura de Compra", styles['Heading2']))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Información de la orden
-    order_info = [
-        ['Número de Orden:', f'#{order.id}'],
-        ['Fecha:', order.created_at.strftime('%d/%m/%Y %H:%M')],
-        ['Cliente:', current_user.username],
-        ['Email:', current_user.email],
-        ['Estado:', order.status.upper()]
-    ]
-    
-    order_table = Table(order_info, colWidths=[2*inch, 4*inch])
-    order_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
-    
-    elements.append(order_table)
-    elements.append(Spacer(1, 0.4*inch))
-    
-    # Productos
-    elements.append(Paragraph("Productos", heading_style))
-    
-    # Tabla de productos
-    product_data = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']]
-    
-    for item in order.items:
-        product_data.append([
-            item.product_name,
-            str(item.quantity),
-            f'${item.price:.2f}',
-            f'${item.get_subtotal():.2f}'
-        ])
-    
-    # Calcular totales
-    subtotal = order.total
-    iva = subtotal * 0.19
-    total = subtotal * 1.19
-    
-    # Agregar filas de totales
-    product_data.append(['', '', 'Subtotal:', f'${subtotal:.2f}'])
-    product_data.append(['', '', 'Envío:', 'GRATIS'])
-    product_data.append(['', '', 'IVA (19%):', f'${iva:.2f}'])
-    product_data.append(['', '', 'TOTAL:', f'${total:.2f}'])
-    
-    product_table = Table(product_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-    product_table.setStyle(TableStyle([
-        # Header
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        
-        # Body
-        ('TEXTCOLOR', (0, 1), (-1, -5), colors.black),
-        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -5), 1, colors.grey),
-        
-        # Totales
-        ('FONTNAME', (2, -4), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (2, -1), (-1, -1), colors.HexColor('#28a745')),
-        ('TEXTCOLOR', (2, -1), (-1, -1), colors.whitesmoke),
-        ('FONTSIZE', (2, -1), (-1, -1), 12),
-    ]))
-    
-    elements.append(product_table)
-    elements.append(Spacer(1, 0.5*inch))
-    
-    # Nota final
-    note_style = ParagraphStyle(
-        'Note',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    elements.append(Paragraph("Gracias por tu compra en GameTech Store", note_style))
-    elements.append(Paragraph("Este documento es una factura válida", note_style))
-    
-    # Construir PDF
-    doc.build(elements)
-    
-    # Preparar respuesta
-    buffer.seek(0)
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=orden_{order.id}.pdf'
-    
-    return response
+    # Las órdenes completadas son inmutables: se sirven desde la caché en disco,
+    # normalmente ya prerenderizadas por la cola; si el trabajo aún no terminó
+    # se renderizan aquí bajo demanda
+    if invoices.is_cacheable(order):
+        return send_file(invoices.ensure_invoice(order),
+                         mimetype='application/pdf',
+                         as_attachment=True,
+                         download_name=f'orden_{order.id}.pdf')
+
+    # El resto se renderiza directamente en un archivo temporal sin copiarlo en memoria
+    stream = tempfile.TemporaryFile()
+    invoices.render_invoice(invoices.invoice_data(order), stream)
+    stream.seek(0)
+    return send_file(stream,
+                     mimetype='application/pdf',
+                     as_attachment=True,
+                     download_name=f'orden_{order.id}.pdf')
@@ -62,22 +62,24 @@ def api_buscar_hardware():
     else:
         resultados = Hardware.buscar_hardware(query)
 
-    hardware_data = []
-    for componente in resultados:
-        hardware_data.append({
-            'id': componente.id,
-            'tipo': componente.tipo,
-            'marca': componente.marca,
-            'modelo': componente.modelo,
-            'precio': componente.precio,
-            'descripcion': componente.descripcion,
-            'imagen': componente.imagen,
-            'socket': componente.socket if hasattr(componente, 'socket') else None,
-            'especificaciones': componente.especificaciones if hasattr(componente, 'especificaciones') else {}
-        })
+    hardware_data = [resultado_busqueda(componente) for componente in resultados]
 
     return jsonify({'resultados': hardware_data})
 
+def resultado_busqueda(componente):
+    """Componente serializado para /api/hardware/buscar (compartido con la API asíncrona)"""
+    return {
+        'id': componente.id,
+        'tipo': componente.tipo,
+        'marca': componente.marca,
+        'modelo': componente.modelo,
+        'precio': componente.precio,
+        'descripcion': componente.descripcion,
+        'imagen': componente.imagen,
+        'socket': componente.socket if hasattr(componente, 'socket') else None,
+        'especificaciones': componente.especificaciones if hasattr(componente, 'especificaciones') else {}
+    }
+
 @hardware_bp.route('/comparar-hardware', methods=['POST'])
 def comparar_hardware():
     """Comparar componentes de hardware seleccionados"""
@@ -1,10 +1,13 @@
 from flask import Blueprint, render_template, request, jsonify
-from models.database_models import Game, Hardware
+from database import db
+from models.database_models import Game, Hardware, ordered_by_ids
 from models.compatibility import Compatibility
+from services.query_stats import query_budget
 
 store_bp = Blueprint('store', __name__)
 
 @store_bp.route('/tienda')
+@query_budget(5)
 def tienda():
     """Página principal de la tienda"""
     juegos = Game.get_all_games()
@@ -41,53 +44,87 @@ def consultar_compatibilidad():
     data = request.get_json()
 
     # Obtener especificaciones del hardware del usuario
-    hardware_usuario = {
+    hardware_usuario = especificaciones_usuario(data)
+
+    # Obtener juegos compatibles
+    juegos_compatibles = Game.get_games_by_hardware(hardware_usuario)
+
+    return jsonify(resultado_compatibilidad(juegos_compatibles))
+
+def especificaciones_usuario(data):
+    """Hardware del usuario enviado a /consultar-compatibilidad (compartido con la API asíncrona)"""
+    return {
         'cpu': data.get('cpu', ''),
         'ram': data.get('ram', ''),
         'gpu': data.get('gpu', ''),
         'storage': data.get('storage', '')
     }
 
-    # Obtener juegos compatibles
-    juegos_compatibles = Game.get_games_by_hardware(hardware_usuario)
-
+def resultado_compatibilidad(juegos_compatibles):
+    """Respuesta de /consultar-compatibilidad (compartida con la API asíncrona)"""
     # Crear lista de juegos para enviar al frontend
     juegos_data = [juego.to_dict() for juego in juegos_compatibles]
 
-    return jsonify({
+    return {
         'success': True,
         'juegos': juegos_data,
         'total': len(juegos_data)
-    })
+    }
 
 @store_bp.route('/verificar-setup-completo', methods=['POST'])
 def verificar_setup_completo():
     """Verificar compatibilidad de un setup completo con juegos seleccionados"""
     data = request.get_json()
 
-    juegos_seleccionados_ids = data.get('juegos', [])
-    componentes_seleccionados_ids = data.get('componentes', [])
-
-    # Obtener objetos de juegos y componentes
-    juegos = [Game.get_game_by_id(jid) for jid in juegos_seleccionados_ids if Game.get_game_by_id(jid)]
-    componentes = [Hardware.get_hardware_by_id(cid) for cid in componentes_seleccionados_ids if Hardware.get_hardware_by_id(cid)]
-
+    juegos_seleccionados_ids = ids_recibidos(data.get('juegos', []))
+    componentes_seleccionados_ids = ids_recibidos(data.get('componentes', []))
+
+    # Obtener objetos de juegos y componentes: una consulta por tabla
+    juegos = ordered_by_ids(db.session.scalars(Game.select_by_ids(juegos_seleccionados_ids)),
+                            juegos_seleccionados_ids)
+    componentes = ordered_by_ids(db.session.scalars(Hardware.select_by_ids(componentes_seleccionados_ids)),
+                                 componentes_seleccionados_ids)
+
+    return jsonify(resultado_setup(juegos, componentes))
+
+def ids_recibidos(values):
+    """
+    Identificadores enteros de una lista del cliente (compartido con la API asíncrona)
+
+    Los valores que no son un entero se ignoran, igual que los IDs que no
+    corresponden a ningún producto.
+    """
+    if not isinstance(values, list):
+        return []
+    ids = []
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+def resultado_setup(juegos, componentes):
+    """Respuesta de /verificar-setup-completo (compartida con la API asíncrona)"""
     # Verificar compatibilidad
     resultado = Compatibility.verificar_compatibility_completa(juegos, componentes)
 
     # Calcular precio total
     precio_total = sum(componente.precio for componente in componentes) + sum(juego.precio for juego in juegos)
 
-    return jsonify({
+    return {
         'success': True,
         'compatible': resultado['compatible'],
         'detalles': resultado['detalles'],
         'precio_total': precio_total,
         'componentes_count': len(componentes),
         'juegos_count': len(juegos)
-    })
+    }
 
 @store_bp.route('/buscar')
+@query_budget(5)
 def buscar():
     """Página de búsqueda de productos"""
     query = request.args.get('q', '')
@@ -1,31 +1,108 @@
 """
 Configuración de la base de datos
 """
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """Sesión que envía las lecturas del catálogo a las réplicas configuradas (services/replicas.py)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get('replica_router')
+            if router is not None:
+                engine = router.bind_for(self, clause)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_db(app):
     """Inicializar la base de datos"""
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        ensure_indexes()
         # Poblar con datos iniciales si está vacía
         from models.database_models import Game, Hardware, User
         if Game.query.count() == 0:
             seed_database()
 
+def dispose_engines(app):
+    """Descartar las conexiones heredadas de otro proceso sin cerrarlas (tras un fork)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    router = app.extensions.get('replica_router')
+    if router is not None:
+        for replica in router.replicas:
+            replica.engine.dispose(close=False)
+
+def upsert_insert(table):
+    """INSERT con soporte de ON CONFLICT ... DO UPDATE para el dialecto en uso (PostgreSQL o SQLite)"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def ensure_indexes():
+    """
+    Crear los índices declarados en los modelos que falten en la base de datos
+
+    db.create_all() no modifica tablas que ya existen, así que los índices
+    agregados después de crear una tabla deben crearse aparte.
+    """
+    from sqlalchemy import inspect
+
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == 'uq_cart_items_user_product':
+                _merge_duplicate_cart_items()
+            index.create(db.engine)
+
+def _merge_duplicate_cart_items():
+    """Fusionar líneas duplicadas del carrito antes de crear el índice único"""
+    from models.database_models import CartItem
+
+    duplicates = db.session.query(
+        CartItem.user_id, CartItem.product_type, CartItem.product_id,
+        db.func.min(CartItem.id), db.func.sum(CartItem.quantity)
+    ).group_by(
+        CartItem.user_id, CartItem.product_type, CartItem.product_id
+    ).having(db.func.count(CartItem.id) > 1).all()
+
+    for user_id, product_type, product_id, keep_id, quantity in duplicates:
+        CartItem.query.filter(
+            CartItem.user_id == user_id,
+            CartItem.product_type == product_type,
+            CartItem.product_id == product_id,
+            CartItem.id != keep_id
+        ).delete(synchronize_session=False)
+        CartItem.query.filter_by(id=keep_id).update({'quantity': quantity})
+    db.session.commit()
+
 def seed_database():
     """Poblar la base de datos con datos iniciales"""
     from models.database_models import Game, Hardware, User
-    from werkzeug.security import generate_password_hash
+    from services.passwords import password_hasher
     
     # Crear usuario admin por defecto
     admin = User(
         username='admin',
         email='admin@gametechstore.com',
-        password_hash=generate_password_hash('admin123'),
+        password_hash=password_hasher.hash('admin123'),
         is_admin=True
     )
     db.session.add(admin)
@@ -185,4 +262,8 @@ def seed_database():
         db.session.add(hardware)
     
     db.session.commit()
+    
+    # Puntuaciones de compatibilidad de los productos iniciales
+    from services.catalog_import import backfill_scores
+    backfill_scores()
     print("Base de datos poblada con éxito!")
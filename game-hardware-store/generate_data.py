@@ -0,0 +1,62 @@
+"""
+Script para poblar la base de datos con datos sintéticos para pruebas de carga
+
+Uso:
+    python generate_data.py --users 1000000 --games 50000 --hardware 50000 --carts 100000 --order-items 10000000
+    python generate_data.py --traffic trafico.jsonl --requests 10000
+"""
+import argparse
+import json
+import sys
+import time
+from app import create_app
+from database import db
+from services import synthetic_data
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generar datos sintéticos para pruebas de carga')
+    parser.add_argument('--users', type=int, default=0, help='Usuarios nuevos')
+    parser.add_argument('--games', type=int, default=0, help='Juegos nuevos')
+    parser.add_argument('--hardware', type=int, default=0, help='Componentes de hardware nuevos')
+    parser.add_argument('--carts', type=int, default=0, help='Usuarios nuevos con carrito')
+    parser.add_argument('--order-items', type=int, default=0, help='Items de orden (en órdenes de 1 a 5 items)')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de la generación')
+    parser.add_argument('--batch-size', type=int, default=synthetic_data.DEFAULT_BATCH_SIZE, help='Filas por lote')
+    parser.add_argument('--traffic', help='Escribir en este archivo JSONL una secuencia de peticiones')
+    parser.add_argument('--requests', type=int, default=10000, help='Peticiones de la secuencia de tráfico')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+
+        def on_progress(table, rows):
+            print(f'   {table}: {rows} filas ({time.perf_counter() - started:.1f} s)')
+
+        if args.users or args.games or args.hardware or args.carts or args.order_items:
+            written = synthetic_data.generate(
+                users=args.users, games=args.games, hardware=args.hardware,
+                carts=args.carts, order_items=args.order_items,
+                seed=args.seed, batch_size=args.batch_size, on_progress=on_progress
+            )
+            print(f'\n✅ Datos generados en {time.perf_counter() - started:.1f} s:')
+            for table, rows in written.items():
+                print(f'   - {table}: {rows} filas')
+            print(f'   Contraseña de los usuarios generados: {synthetic_data.SYNTHETIC_PASSWORD}')
+
+        if args.traffic:
+            requests = synthetic_data.generate_traffic(args.requests, seed=args.seed)
+            with open(args.traffic, 'w', encoding='utf-8') as stream:
+                for request in requests:
+                    stream.write(json.dumps(request) + '\n')
+            print(f'✅ {len(requests)} peticiones escritas en {args.traffic}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
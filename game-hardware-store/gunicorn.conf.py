@@ -0,0 +1,172 @@
+"""
+Configuración de gunicorn
+
+Perfiles de workers (GUNICORN_PROFILE):
+
+- sync (por defecto): un proceso por petición en curso. Aísla cada
+  petición pero cada espera a la base de datos deja un proceso entero
+  parado; con mucha espera necesita muchos procesos y memoria.
+- gthread: pocos procesos con varios hilos. Los hilos que esperan a la
+  base de datos no ocupan el núcleo; el pool de conexiones de cada worker
+  se dimensiona para que cada hilo tenga la suya.
+- gevent: pocos procesos con cientos de greenlets. Solo compensa si casi
+  todo es espera de red (PostgreSQL remoto); necesita gevent y, con
+  PostgreSQL, psycogreen. No usa preload: gevent debe parchear la
+  librería estándar antes de importar la aplicación.
+
+Workers, hilos y conexiones se calculan con los núcleos disponibles
+(afinidad y cuota de CPU del contenedor) y GUNICORN_IO_RATIO, la fracción
+del tiempo de una petición que se pasa esperando a la base de datos. Para
+tener un núcleo ocupado hacen falta 1 / (1 - GUNICORN_IO_RATIO) peticiones
+en curso. benchmarks/worker_profiles.py mide la fracción con la mezcla de
+tráfico de generate_data.py y compara los perfiles. Cada valor calculado
+se puede fijar con GUNICORN_WORKERS, GUNICORN_THREADS y
+GUNICORN_WORKER_CONNECTIONS.
+
+Los workers se reciclan tras GUNICORN_MAX_REQUESTS peticiones (con
+GUNICORN_MAX_REQUESTS_JITTER para que no se reinicien todos a la vez),
+lo que acota el crecimiento de memoria de cada proceso.
+
+Resultados de python -m benchmarks.worker_profiles --seconds 10 (1 núcleo,
+SQLite local, 500 juegos y 2000 componentes; fracción de espera medida
+0.02, así que GUNICORN_IO_RATIO=0.02):
+
+    perfil    workers x hilos   concurrencia   req/s   p50 ms   p95 ms
+    sync      3 x 1             10             28.8    300      749
+    sync      3 x 1             50             27.8    1783     2436
+    gthread   2 x 3             10             25.4    279      1420
+    gthread   2 x 3             50             25.5    1958     3081
+    gevent    2 x 100           10             30.4    260      788
+    gevent    2 x 100           50             27.6    1051     9945
+
+Con la base de datos local casi todo el tiempo es CPU (plantillas y
+compatibilidad) y los tres perfiles rinden lo mismo; sync tiene la mejor
+cola de latencia con 50 clientes y es el valor por defecto. Con
+PostgreSQL remoto conviene medir la fracción de espera del despliegue
+(--database) y, si supera 0.3, pasar a gthread con GUNICORN_IO_RATIO.
+
+Uso:
+    gunicorn -c gunicorn.conf.py
+    GUNICORN_PROFILE=gthread GUNICORN_IO_RATIO=0.6 gunicorn -c gunicorn.conf.py
+"""
+import glob
+import math
+import os
+import shutil
+
+PROFILES = ('sync', 'gthread', 'gevent')
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'si', 'sí', 'on')
+
+
+def available_cpus():
+    """Núcleos que puede usar el servidor: afinidad del proceso y cuota de CPU del cgroup"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+profile = os.environ.get('GUNICORN_PROFILE', 'sync').strip().lower()
+if profile not in PROFILES:
+    raise ValueError(f"GUNICORN_PROFILE debe ser uno de {', '.join(PROFILES)}, no '{profile}'")
+
+cpus = available_cpus()
+# Fracción del tiempo de una petición esperando a la base de datos; con 0.5 sync da los 2 x núcleos + 1 habituales
+io_ratio = min(max(float(os.environ.get('GUNICORN_IO_RATIO', 0.5)), 0.0), 0.95)
+# Peticiones en curso necesarias para que un núcleo no quede ocioso
+in_flight_per_cpu = math.ceil(1 / (1 - io_ratio))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = profile
+if profile == 'sync':
+    default_workers = cpus * in_flight_per_cpu + 1
+    threads = 1
+else:
+    # Con el GIL un proceso aprovecha un núcleo; al menos dos para que un reciclado no deje el servidor sin workers
+    default_workers = max(2, cpus)
+    threads = int(os.environ.get('GUNICORN_THREADS', in_flight_per_cpu + 1)) if profile == 'gthread' else 1
+workers = int(os.environ.get('GUNICORN_WORKERS', default_workers))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+# Una conexión por hilo; con gevent, las que admite la base de datos por worker y el resto espera en el pool
+if profile == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+elif profile == 'gevent':
+    os.environ.setdefault('DB_POOL_SIZE', str(2 * in_flight_per_cpu))
+
+# Reciclar los workers para acotar el crecimiento de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# La aplicación se crea con la factoría de app.py
+wsgi_app = 'app:create_app()'
+# Crear la aplicación una sola vez en el proceso maestro: los workers nacen
+# de un padre con todo importado en lugar de repetir el arranque cada uno
+preload_app = _env_bool('GUNICORN_PRELOAD', profile != 'gevent')
+
+# Las métricas de todos los workers se agregan a través de este directorio;
+# se define aquí para que los workers lo hereden antes de importar la app
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+
+
+def on_starting(server):
+    """Vaciar las métricas de una ejecución anterior del servidor"""
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    cfg = server.cfg
+    per_worker = cfg.worker_connections if profile == 'gevent' else cfg.threads
+    server.log.info(f'Perfil {profile}: {cfg.workers} workers x {per_worker} ({cpus} núcleos, '
+                    f'GUNICORN_IO_RATIO={io_ratio}), max_requests={cfg.max_requests}±{cfg.max_requests_jitter}, '
+                    f'preload={cfg.preload_app}')
+    if profile == 'gevent' and server.cfg.preload_app:
+        server.log.warning('gevent con preload: la aplicación se importó antes de parchear la librería estándar')
+
+
+def when_ready(server):
+    """Con preload, importar también en el maestro lo que la app carga con la primera petición"""
+    if server.cfg.preload_app:
+        import services.invoice_pdf  # noqa: F401
+
+
+def post_fork(server, worker):
+    """Descartar en el worker las conexiones a la base de datos abiertas por el maestro"""
+    if server.cfg.preload_app:
+        from database import dispose_engines
+        dispose_engines(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    """Con gevent, hacer que psycopg2 ceda el control mientras espera a PostgreSQL"""
+    if profile != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        worker.log.warning('psycogreen no está instalado: las consultas a PostgreSQL bloquearán el worker')
+        return
+    patch_psycopg()
+
+
+def child_exit(server, worker):
+    """Descartar los indicadores del worker que terminó"""
+    # Lo mismo que prometheus_client.multiprocess.mark_process_dead sin importar nada:
+    # sin preload el maestro no tiene la aplicación cargada y este hook corre en un manejador de señales
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    for live_gauge in glob.glob(os.path.join(path, f'gauge_live*_{worker.pid}.db')):
+        os.remove(live_gauge)
@@ -0,0 +1,87 @@
+"""
+Script para importar un catálogo masivo de juegos y hardware
+
+Importa un catálogo CSV o JSONL por lotes. Si se interrumpe, volver a
+ejecutarlo con el mismo archivo retoma la importación después del último
+lote guardado.
+
+Uso:
+    python import_catalog.py catalogo.jsonl [--batch-size 5000]
+    python import_catalog.py catalogo.csv --restart
+    python import_catalog.py --backfill-scores
+"""
+import argparse
+import os
+import sys
+import time
+from app import create_app
+from services import catalog_import, inventory_sync
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Importar un catálogo de juegos y hardware')
+    parser.add_argument('catalog', nargs='?', help='Archivo CSV o JSONL')
+    parser.add_argument('--format', choices=inventory_sync.FORMATS, help='Formato del catálogo (por defecto según la extensión)')
+    parser.add_argument('--batch-size', type=int, default=catalog_import.DEFAULT_BATCH_SIZE, help='Registros por lote')
+    parser.add_argument('--name', help='Identificador de la importación (por defecto la ruta y el tamaño del archivo)')
+    parser.add_argument('--restart', action='store_true', help='Ignorar el progreso guardado y empezar de nuevo')
+    parser.add_argument('--backfill-scores', action='store_true',
+                        help='Calcular las puntuaciones de compatibilidad de los productos que no las tienen')
+    return parser.parse_args()
+
+
+def import_file(args):
+    """Importar un archivo de catálogo mostrando el progreso"""
+    fmt = args.format or inventory_sync.detect_format(args.catalog)
+    if fmt is None:
+        print('❌ No se reconoce el formato del catálogo, usa --format')
+        return 2
+
+    # El tamaño distingue un archivo reemplazado por otro con la misma ruta
+    key = args.name or f'{os.path.abspath(args.catalog)}:{os.path.getsize(args.catalog)}'
+    started = time.perf_counter()
+
+    def on_batch(state):
+        elapsed = time.perf_counter() - started
+        print(f'   {state.records} registros, {state.inserted} insertados, '
+              f'{state.invalid} inválidos ({elapsed:.1f} s)')
+
+    with open(args.catalog, newline='', encoding='utf-8') as stream:
+        summary = catalog_import.import_catalog(
+            inventory_sync.read_feed(stream, fmt),
+            key=key,
+            batch_size=args.batch_size,
+            restart=args.restart,
+            on_batch=on_batch
+        )
+
+    if summary['retomado_desde']:
+        print(f"↪️  Retomado desde el registro {summary['retomado_desde']}")
+    print("\n✅ Catálogo importado:")
+    print(f"   - {summary['leidos']} registros leídos")
+    print(f"   - {summary['insertados']} productos insertados")
+    print(f"   - {summary['invalidos']} registros inválidos")
+    for error in summary['errores']:
+        print(f"     {error}")
+    print(f"   - {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+def main():
+    args = parse_args()
+    if not args.catalog and not args.backfill_scores:
+        print('❌ Indica un catálogo o --backfill-scores')
+        return 2
+    app = create_app()
+    with app.app_context():
+        from database import db
+        db.create_all()
+        if args.backfill_scores:
+            total = catalog_import.backfill_scores()
+            print(f'✅ Puntuaciones calculadas para {total} productos')
+            return 0
+        return import_file(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
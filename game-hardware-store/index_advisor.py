@@ -0,0 +1,124 @@
+"""
+Script para revisar los planes de ejecución de las consultas de la aplicación
+
+Ejecuta EXPLAIN sobre las consultas más frecuentes de la tienda (SQLite o
+PostgreSQL, según DATABASE_URL) y marca las que recorren una tabla completa
+en lugar de usar un índice. Termina con código 1 si encuentra alguna
+inesperada, para poder usarlo en CI.
+
+Uso:
+    python index_advisor.py
+"""
+import json
+import sys
+from sqlalchemy import select, text
+from app import create_app
+from database import db
+from models.database_models import User, Game, Hardware, CartItem, Order, OrderItem, low_stock_condition
+
+
+def build_queries():
+    """
+    Consultas representativas de la aplicación
+
+    Cada entrada es (nombre, consulta, recorrido_esperado). Las búsquedas con
+    ILIKE '%texto%' y los listados completos del catálogo siempre recorren
+    la tabla, así que no se marcan como problema.
+    """
+    return [
+        ('usuario por username', select(User).where(User.username == 'admin'), False),
+        ('usuario por email', select(User).where(User.email == 'admin@gametechstore.com'), False),
+        ('carrito de un usuario', select(CartItem).where(CartItem.user_id == 1), False),
+        ('línea del carrito', select(CartItem).where(
+            CartItem.user_id == 1,
+            CartItem.product_type == 'game',
+            CartItem.product_id == 1
+        ), False),
+        ('historial de órdenes', select(Order).where(Order.user_id == 1)
+            .order_by(Order.created_at.desc(), Order.id.desc()).limit(11), False),
+        ('items de órdenes', select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])), False),
+        ('juegos con stock bajo', select(Game).where(low_stock_condition(Game.stock)), False),
+        ('hardware con stock bajo', select(Hardware).where(low_stock_condition(Hardware.stock)), False),
+        ('hardware por tipo', select(Hardware).where(Hardware.tipo == 'CPU'), False),
+        ('juego por id', select(Game).where(Game.id == 1), False),
+        ('catálogo de juegos', select(Game), True),
+        ('búsqueda de juegos', select(Game).where(Game.nombre.ilike('%witcher%')), True),
+        ('búsqueda de hardware', select(Hardware).where(Hardware.modelo.ilike('%rtx%')), True),
+    ]
+
+
+def explain_sqlite(conn, sql):
+    """Plan de SQLite: devuelve (líneas del plan, tablas recorridas completas)"""
+    rows = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    lines = [row[3] for row in rows]
+    # 'SCAN tabla' sin índice es un recorrido completo; 'SCAN tabla USING INDEX' no
+    scans = [line for line in lines if line.startswith('SCAN') and 'USING' not in line]
+    return lines, scans
+
+
+def explain_postgres(conn, sql):
+    """Plan de PostgreSQL: devuelve (líneas del plan, tablas recorridas completas)"""
+    plan = conn.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    lines, scans = [], []
+
+    def walk(node, depth=0):
+        line = node['Node Type']
+        if 'Relation Name' in node:
+            line += f" on {node['Relation Name']}"
+        if 'Index Name' in node:
+            line += f" using {node['Index Name']}"
+        lines.append('  ' * depth + line)
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(line)
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'])
+    return lines, scans
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        dialect = db.engine.dialect
+        if dialect.name == 'sqlite':
+            explain = explain_sqlite
+        elif dialect.name == 'postgresql':
+            explain = explain_postgres
+        else:
+            print(f'Dialecto no soportado: {dialect.name}')
+            return 2
+
+        problems = 0
+        with db.engine.connect() as conn:
+            if dialect.name == 'postgresql':
+                # En tablas pequeñas PostgreSQL prefiere recorrerlas aunque
+                # exista un índice; desactivarlo deja solo los recorridos
+                # que no tienen ningún índice utilizable
+                conn.execute(text('SET enable_seqscan = off'))
+
+            for name, query, expected_scan in build_queries():
+                sql = query.compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+                lines, scans = explain(conn, str(sql))
+
+                if scans and not expected_scan:
+                    status = '❌ RECORRIDO COMPLETO'
+                    problems += 1
+                elif scans:
+                    status = '➖ recorrido esperado'
+                else:
+                    status = '✅ usa índice'
+
+                print(f'\n=== {name}: {status} ===')
+                for line in lines:
+                    print(f'  {line}')
+
+        print(f'\n{problems} consulta(s) sin índice adecuado')
+        return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -93,6 +93,47 @@ class Compatibility:
 
         return resultado
 
+    @classmethod
+    def puntuaciones_juego(cls, requisitos_minimos):
+        """
+        Puntuaciones que exige un juego según sus requisitos mínimos
+
+        Returns:
+            dict: cpu_score, gpu_score y ram_gb requeridos
+        """
+        return {
+            "cpu_score": cls._calcular_cpu_score_from_string(str(requisitos_minimos.get("CPU", ""))),
+            "gpu_score": cls._calcular_gpu_score_from_string(str(requisitos_minimos.get("GPU", ""))),
+            "ram_gb": cls._extraer_gb_ram(requisitos_minimos.get("RAM", "0"))
+        }
+
+    @classmethod
+    def puntuaciones_hardware(cls, tipo, marca, modelo, especificaciones):
+        """
+        Puntuaciones que ofrece un componente; solo se rellena la de su tipo
+
+        Returns:
+            dict: cpu_score, gpu_score y ram_gb (None si no aplican)
+        """
+        puntuaciones = {"cpu_score": None, "gpu_score": None, "ram_gb": None}
+        if tipo == "CPU":
+            puntuaciones["cpu_score"] = cls._calcular_cpu_score(marca, modelo)
+        elif tipo == "GPU":
+            puntuaciones["gpu_score"] = cls._calcular_gpu_score(marca, modelo)
+        elif tipo == "RAM":
+            puntuaciones["ram_gb"] = cls._extraer_gb_ram(especificaciones.get("capacidad", "0"))
+        return puntuaciones
+
+    @classmethod
+    def marca_desde_modelo(cls, tipo, modelo):
+        """Marca de una CPU o GPU deducida de su modelo ('RTX 3060' -> 'nvidia'), o '' si no se reconoce"""
+        tabla = {"CPU": cls.CPU_PERFORMANCE, "GPU": cls.GPU_PERFORMANCE}.get(tipo, {})
+        modelo_lower = modelo.lower()
+        for marca, series in tabla.items():
+            if marca in modelo_lower or any(key in modelo_lower for key in series):
+                return marca
+        return ''
+
     @classmethod
     def _verificar_juego_componente(cls, juego, componente):
         """Verificar compatibilidad entre un juego específico y un componente con puntuación"""
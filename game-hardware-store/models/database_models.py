@@ -1,12 +1,34 @@
 """
 Modelos de base de datos usando SQLAlchemy
 """
-from database import db
+from database import db, upsert_insert
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import or_, and_
+from services.passwords import HashingBusy, password_hasher
+from sqlalchemy import or_, and_, select, func, literal, true
+from sqlalchemy.orm import selectinload, aliased
+import hashlib
 import json
 
+# Umbral de stock bajo usado por las alertas del panel de administración
+LOW_STOCK_THRESHOLD = 10
+
+
+def low_stock_condition(column):
+    """Condición de stock bajo con el umbral como literal, para que coincida con el índice parcial"""
+    return column < db.literal_column(str(LOW_STOCK_THRESHOLD))
+
+
+def ordered_by_ids(objects, ids):
+    """Objetos cargados con select_by_ids en el orden y con las repeticiones de ids (los que no existen se omiten)"""
+    por_id = {obj.id: obj for obj in objects}
+    return [por_id[obj_id] for obj_id in ids if obj_id in por_id]
+
+
+def password_version(password_hash):
+    """Huella corta de un hash de contraseña; cambia cada vez que cambia la contraseña"""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:12]
+
+
 class User(db.Model):
     """Modelo de usuario"""
     __tablename__ = 'users'
@@ -25,11 +47,34 @@ class User(db.Model):
     
     def set_password(self, password):
         """Establecer contraseña hasheada"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verificar contraseña"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def upgrade_password_hash(self, password):
+        """
+        Recalcular el hash con la política actual si se guardó con otra
+
+        Solo debe llamarse con la contraseña ya verificada. Si el pool de
+        hashing está saturado se deja para el próximo inicio de sesión.
+
+        Returns:
+            bool: True si el hash cambió (hay que hacer commit)
+        """
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        try:
+            self.password_hash = password_hasher.hash(password)
+        except HashingBusy:
+            return False
+        return True
+    
+    @property
+    def password_version(self):
+        """Huella corta del hash de contraseña; cambia cada vez que cambia la contraseña"""
+        return password_version(self.password_hash)
     
     @property
     def is_authenticated(self):
@@ -40,7 +85,8 @@ class User(db.Model):
         return False
     
     def get_id(self):
-        return str(self.id)
+        # Con la versión de la contraseña, cambiarla cierra las demás sesiones
+        return f'{self.id}:{self.password_version}'
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -64,6 +110,12 @@ class Game(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Índice parcial: solo contiene los juegos con stock bajo
+        db.Index('ix_games_low_stock', 'stock',
+                 sqlite_where=low_stock_condition(stock), postgresql_where=low_stock_condition(stock)),
+    )
+    
     def get_requisitos_minimos(self):
         """Obtener requisitos mínimos como dict"""
         return json.loads(self.requisitos_minimos) if self.requisitos_minimos else {}
@@ -87,10 +139,20 @@ class Game(db.Model):
         """Obtener todos los juegos"""
         return cls.query.filter_by().all()
     
+    @classmethod
+    def get_low_stock(cls):
+        """Obtener los juegos con stock bajo"""
+        return cls.query.filter(low_stock_condition(cls.stock)).all()
+    
     @classmethod
     def get_game_by_id(cls, game_id):
         """Obtener un juego por ID"""
         return cls.query.get(game_id)
+
+    @classmethod
+    def select_by_ids(cls, ids):
+        """Consulta de varios juegos por ID (compartida con la API asíncrona)"""
+        return select(cls).where(cls.id.in_(ids))
     
     @classmethod
     def search_games(cls, query):
@@ -110,30 +172,60 @@ class Game(db.Model):
     @classmethod
     def get_games_by_hardware(cls, hardware_specs):
         """Obtener juegos compatibles con el hardware especificado usando el sistema de compatibilidad"""
+        return cls.compatible_games(db.session.execute(cls.select_compatible(hardware_specs)).all(), hardware_specs)
+
+    @classmethod
+    def select_compatible(cls, hardware_specs):
+        """
+        Consulta de los juegos compatibles con el hardware especificado (compartida con la API asíncrona)
+
+        Compara en SQL los requisitos mínimos precalculados en
+        compatibility_scores con las puntuaciones de los componentes del
+        usuario, las mismas que usa Compatibility, así que solo se cargan los
+        juegos compatibles. Los juegos sin puntuaciones (creados antes de la
+        tabla y sin --backfill-scores) se devuelven también, marcados para
+        verificarlos con compatible_games.
+
+        Returns:
+            Select: filas (juego, tiene puntuaciones)
+        """
+        condiciones = []
+        for componente in Hardware.from_specs(hardware_specs):
+            ofrece = CompatibilityScore.compute('hardware', componente)
+            if componente.tipo == 'CPU':
+                condiciones.append(CompatibilityScore.cpu_score <= ofrece['cpu_score'])
+            elif componente.tipo == 'GPU':
+                condiciones.append(CompatibilityScore.gpu_score <= ofrece['gpu_score'])
+            elif componente.tipo == 'RAM':
+                condiciones.append(CompatibilityScore.ram_gb <= ofrece['ram_gb'])
+
+        puntuado = CompatibilityScore.product_id.is_not(None)
+        return (
+            select(cls, puntuado)
+            .outerjoin(CompatibilityScore, (CompatibilityScore.product_type == 'game')
+                       & (CompatibilityScore.product_id == cls.id))
+            .where(or_(~puntuado, and_(true(), *condiciones)))
+            .order_by(cls.id)
+        )
+
+    @classmethod
+    def compatible_games(cls, rows, hardware_specs):
+        """Juegos de las filas de select_compatible, verificando con Compatibility los que no tienen puntuaciones"""
+        sin_puntuar = [juego for juego, puntuado in rows if not puntuado]
+        verificados = set(cls.filter_compatible(sin_puntuar, hardware_specs)) if sin_puntuar else set()
+        return [juego for juego, puntuado in rows if puntuado or juego in verificados]
+
+    @classmethod
+    def filter_compatible(cls, juegos, hardware_specs):
+        """Filtrar los juegos compatibles con el hardware especificado (sin consultas)"""
         from models.compatibility import Compatibility
 
-        juegos = cls.get_all_games()
-        juegos_compatibles = []
-
-        for juego in juegos:
-            # Convertir hardware_specs a objetos Hardware para compatibilidad
-            componentes = []
-            for tipo, specs in hardware_specs.items():
-                # Crear un objeto Hardware temporal para la comparación
-                componente = Hardware(
-                    tipo=tipo.upper(),
-                    marca=specs.get('marca', ''),
-                    modelo=specs.get('modelo', ''),
-                    especificaciones=json.dumps(specs)
-                )
-                componentes.append(componente)
-
-            # Verificar compatibilidad usando el sistema existente
-            resultado = Compatibility.verificar_compatibility_completa([juego], componentes)
-            if resultado['compatible']:
-                juegos_compatibles.append(juego)
-
-        return juegos_compatibles
+        # Los componentes son los mismos para todos los juegos
+        componentes = Hardware.from_specs(hardware_specs)
+        return [
+            juego for juego in juegos
+            if Compatibility.verificar_compatibility_completa([juego], componentes)['compatible']
+        ]
     
     def to_dict(self):
         """Convertir a diccionario"""
@@ -171,6 +263,12 @@ class Hardware(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Índice parcial: solo contiene el hardware con stock bajo
+        db.Index('ix_hardware_low_stock', 'stock',
+                 sqlite_where=low_stock_condition(stock), postgresql_where=low_stock_condition(stock)),
+    )
+    
     def get_especificaciones(self):
         """Obtener especificaciones como dict"""
         return json.loads(self.especificaciones) if self.especificaciones else {}
@@ -188,25 +286,76 @@ class Hardware(db.Model):
     @classmethod
     def get_hardware_by_tipo(cls, tipo):
         """Obtener hardware por tipo"""
-        return cls.query.filter_by(tipo=tipo).all()
+        return db.session.scalars(cls.select_by_tipo(tipo)).all()
+
+    @classmethod
+    def select_by_tipo(cls, tipo):
+        """Consulta del hardware de un tipo (compartida con la API asíncrona)"""
+        return select(cls).where(cls.tipo == tipo)
+    
+    @classmethod
+    def get_low_stock(cls):
+        """Obtener el hardware con stock bajo"""
+        return cls.query.filter(low_stock_condition(cls.stock)).all()
     
     @classmethod
     def get_hardware_by_id(cls, hardware_id):
         """Obtener hardware por ID"""
         return cls.query.get(hardware_id)
+
+    @classmethod
+    def select_by_ids(cls, ids):
+        """Consulta de varios componentes por ID (compartida con la API asíncrona)"""
+        return select(cls).where(cls.id.in_(ids))
     
     @classmethod
     def buscar_hardware(cls, query):
         """Buscar hardware"""
+        return db.session.scalars(cls.select_buscar(query)).all()
+
+    @classmethod
+    def select_buscar(cls, query):
+        """Consulta de búsqueda de hardware (compartida con la API asíncrona)"""
         search = f"%{query}%"
-        return cls.query.filter(
+        return select(cls).where(
             or_(
                 cls.marca.ilike(search),
                 cls.modelo.ilike(search),
                 cls.descripcion.ilike(search),
                 cls.tipo.ilike(search)
             )
-        ).all()
+        )
+
+    @classmethod
+    def from_specs(cls, hardware_specs):
+        """
+        Componentes temporales (sin guardar) a partir de las especificaciones del usuario
+
+        Cada valor puede ser un dict con marca, modelo y especificaciones, o
+        el texto que envía el formulario de la tienda: el modelo para CPU y
+        GPU ('Core i7-12700K') o la capacidad para RAM ('16GB'). Los valores
+        vacíos se ignoran.
+        """
+        from models.compatibility import Compatibility
+
+        componentes = []
+        for tipo, specs in hardware_specs.items():
+            if not specs:
+                continue
+            tipo = tipo.upper()
+            if isinstance(specs, str):
+                specs = {
+                    'marca': Compatibility.marca_desde_modelo(tipo, specs),
+                    'modelo': specs,
+                    'capacidad': specs,
+                }
+            componentes.append(cls(
+                tipo=tipo,
+                marca=specs.get('marca', ''),
+                modelo=specs.get('modelo', ''),
+                especificaciones=json.dumps(specs)
+            ))
+        return componentes
     
     def to_dict(self):
         """Convertir a diccionario"""
@@ -226,6 +375,55 @@ class Hardware(db.Model):
         return f'<Hardware {self.marca} {self.modelo}>'
 
 
+class CompatibilityScore(db.Model):
+    """Puntuaciones de compatibilidad precalculadas de un producto"""
+    __tablename__ = 'compatibility_scores'
+    
+    product_type = db.Column(db.String(20), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    # En juegos, lo que piden los requisitos mínimos; en hardware, lo que ofrece
+    cpu_score = db.Column(db.Integer)
+    gpu_score = db.Column(db.Integer)
+    ram_gb = db.Column(db.Integer)
+    
+    @staticmethod
+    def for_game(requisitos_minimos):
+        """Puntuaciones de un juego a partir de sus requisitos mínimos (dict)"""
+        from models.compatibility import Compatibility
+        return Compatibility.puntuaciones_juego(requisitos_minimos)
+    
+    @staticmethod
+    def for_hardware(tipo, marca, modelo, especificaciones):
+        """Puntuaciones de un componente a partir de su tipo, modelo y especificaciones (dict)"""
+        from models.compatibility import Compatibility
+        return Compatibility.puntuaciones_hardware(tipo, marca, modelo, especificaciones)
+    
+    @classmethod
+    def compute(cls, product_type, product):
+        """Puntuaciones de un juego o componente ya cargado"""
+        if product_type == 'game':
+            return cls.for_game(product.get_requisitos_minimos())
+        try:
+            especificaciones = product.get_especificaciones()
+        except ValueError:
+            # Las especificaciones del formulario de administración son texto libre
+            especificaciones = {}
+        return cls.for_hardware(product.tipo, product.marca, product.modelo, especificaciones)
+    
+    @classmethod
+    def refresh(cls, product_type, product):
+        """Recalcular y guardar las puntuaciones de un producto ya persistido. No hace commit."""
+        db.session.merge(cls(product_type=product_type, product_id=product.id, **cls.compute(product_type, product)))
+    
+    @classmethod
+    def remove(cls, product_type, product_id):
+        """Borrar las puntuaciones de un producto eliminado. No hace commit."""
+        cls.query.filter_by(product_type=product_type, product_id=product_id).delete()
+    
+    def __repr__(self):
+        return f'<CompatibilityScore {self.product_type}:{self.product_id}>'
+
+
 class CartItem(db.Model):
     """Modelo de item en el carrito"""
     __tablename__ = 'cart_items'
@@ -237,8 +435,102 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Una sola línea por producto y usuario; también sirve para buscar por user_id
+        db.Index('uq_cart_items_user_product', 'user_id', 'product_type', 'product_id', unique=True),
+    )
+    
+    @classmethod
+    def upsert(cls, user_id, product_type, product_id, quantity):
+        """
+        Agregar un producto al carrito en una sola sentencia
+        
+        Ejecuta un INSERT ... SELECT ... ON CONFLICT DO UPDATE ... RETURNING
+        que valida el stock contra la cantidad resultante, suma la cantidad
+        si la línea ya existe y devuelve el nuevo número de líneas del carrito,
+        todo en un único viaje a la base de datos. El índice único sobre
+        (user_id, product_type, product_id) evita líneas duplicadas aunque
+        lleguen dos peticiones a la vez.
+        
+        Returns:
+            tuple: (cantidad de la línea, líneas en el carrito), o None si el
+            producto no existe o no hay stock suficiente
+        """
+        product_model = Game if product_type == 'game' else Hardware
+        
+        # Alias para que las subconsultas no se correlacionen con la tabla del INSERT
+        existing = aliased(cls)
+        same_line = and_(existing.user_id == user_id,
+                         existing.product_type == product_type,
+                         existing.product_id == product_id)
+        current_quantity = select(existing.quantity).where(same_line).scalar_subquery()
+        
+        source = select(
+            literal(user_id), literal(product_type), product_model.id, literal(quantity), literal(datetime.utcnow())
+        ).where(
+            product_model.id == product_id,
+            product_model.stock >= func.coalesce(current_quantity, 0) + quantity
+        )
+        
+        stmt = upsert_insert(cls).from_select(
+            ['user_id', 'product_type', 'product_id', 'quantity', 'added_at'], source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_type', 'product_id'],
+            set_={'quantity': cls.quantity + stmt.excluded.quantity}
+        )
+        
+        # Las demás líneas más esta, que siempre existe tras el upsert; así el
+        # conteo no depende de si la base ve o no la fila recién insertada
+        other_lines = select(func.count(existing.id)).where(
+            existing.user_id == user_id, ~same_line
+        ).scalar_subquery()
+        stmt = stmt.returning(cls.quantity, other_lines + 1)
+        
+        row = db.session.execute(stmt).first()
+        return tuple(row) if row else None
+    
+    @classmethod
+    def load_products(cls, keys):
+        """
+        Cargar en bloque los productos de varias líneas del carrito
+        
+        Args:
+            keys: iterable de (product_type, product_id)
+        
+        Returns:
+            dict: {(product_type, product_id): producto}, con una consulta por tipo
+        """
+        ids = {'game': set(), 'hardware': set()}
+        for product_type, product_id in keys:
+            if product_type in ids:
+                ids[product_type].add(product_id)
+        
+        products = {}
+        for product_type, model in (('game', Game), ('hardware', Hardware)):
+            if ids[product_type]:
+                for product in model.query.filter(model.id.in_(ids[product_type])):
+                    products[(product_type, product.id)] = product
+        return products
+    
+    @classmethod
+    def select_count(cls, user_id):
+        """Consulta del número de líneas del carrito de un usuario (compartida con la API asíncrona)"""
+        return select(func.count()).select_from(cls).where(cls.user_id == user_id)
+    
+    @classmethod
+    def get_cart(cls, user_id):
+        """Obtener las líneas del carrito de un usuario con sus productos ya cargados"""
+        items = cls.query.filter_by(user_id=user_id).order_by(cls.added_at, cls.id).all()
+        products = cls.load_products((item.product_type, item.product_id) for item in items)
+        for item in items:
+            item._product = products.get((item.product_type, item.product_id))
+        return items
+    
     def get_product(self):
         """Obtener el producto asociado"""
+        if hasattr(self, '_product'):
+            return self._product
         if self.product_type == 'game':
             return Game.query.get(self.product_id)
         elif self.product_type == 'hardware':
@@ -256,6 +548,38 @@ class CartItem(db.Model):
         return f'<CartItem {self.product_type}:{self.product_id}>'
 
 
+class StockHold(db.Model):
+    """Modelo de reserva temporal de stock para una línea del carrito"""
+    __tablename__ = 'stock_holds'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    product_type = db.Column(db.String(20), nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        # Una reserva por producto y usuario, igual que las líneas del carrito
+        db.Index('uq_stock_holds_user_product', 'user_id', 'product_type', 'product_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<StockHold {self.product_type}:{self.product_id} x{self.quantity}>'
+
+
+class ReservedStock(db.Model):
+    """Contador de unidades reservadas por producto, mantenido junto con las reservas"""
+    __tablename__ = 'reserved_stock'
+
+    product_type = db.Column(db.String(20), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ReservedStock {self.product_type}:{self.product_id} x{self.quantity}>'
+
+
 class Order(db.Model):
     """Modelo de orden de compra"""
     __tablename__ = 'orders'
@@ -268,7 +592,59 @@ class Order(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relaciones
-    items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
+    items = db.relationship('OrderItem', backref='order', lazy='select', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Historial de órdenes de un usuario ordenado por fecha
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+    )
+    
+    @staticmethod
+    def encode_cursor(order):
+        """Cursor de paginación (created_at, id) a partir de una orden"""
+        return f'{order.created_at.isoformat()}_{order.id}'
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Convertir un cursor de paginación en (created_at, id)"""
+        created_at, order_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    
+    @classmethod
+    def get_history(cls, user_id, cursor=None, limit=10):
+        """
+        Obtener una página del historial de órdenes de un usuario
+        
+        Pagina por keyset sobre (created_at, id), de la más reciente a la más
+        antigua, y carga los items de todas las órdenes de la página en una
+        sola consulta adicional.
+        
+        Returns:
+            tuple: (lista de órdenes, cursor de la página siguiente o None)
+        """
+        query = cls.query.options(selectinload(cls.items)).filter(cls.user_id == user_id)
+        
+        if cursor:
+            created_at, order_id = cls.decode_cursor(cursor)
+            query = query.filter(or_(
+                cls.created_at < created_at,
+                and_(cls.created_at == created_at, cls.id < order_id)
+            ))
+        
+        # Pedir una orden de más para saber si hay página siguiente
+        orders = query.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit + 1).all()
+        next_cursor = cls.encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+        return orders[:limit], next_cursor
+    
+    def to_dict(self):
+        """Convertir a diccionario"""
+        return {
+            'id': self.id,
+            'total': self.total,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'items': [item.to_dict() for item in self.items]
+        }
     
     def __repr__(self):
         return f'<Order {self.id} - ${self.total}>'
@@ -279,7 +655,7 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_type = db.Column(db.String(20), nullable=False)
     product_id = db.Column(db.Integer, nullable=False)
     product_name = db.Column(db.String(200), nullable=False)
@@ -290,5 +666,32 @@ class OrderItem(db.Model):
         """Calcular subtotal"""
         return self.price * self.quantity
     
+    def to_dict(self):
+        """Convertir a diccionario"""
+        return {
+            'product_type': self.product_type,
+            'product_id': self.product_id,
+            'product_name': self.product_name,
+            'quantity': self.quantity,
+            'price': self.price,
+            'subtotal': self.get_subtotal()
+        }
+    
     def __repr__(self):
         return f'<OrderItem {self.product_name}>'
+
+
+class CatalogImport(db.Model):
+    """Progreso de una importación masiva del catálogo, para poder retomarla"""
+    __tablename__ = 'catalog_imports'
+    
+    key = db.Column(db.String(500), primary_key=True)
+    records = db.Column(db.Integer, nullable=False, default=0)  # Registros ya procesados del feed
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    invalid = db.Column(db.Integer, nullable=False, default=0)
+    finished = db.Column(db.Boolean, nullable=False, default=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CatalogImport {self.key} ({self.records})>'
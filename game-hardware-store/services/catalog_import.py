@@ -0,0 +1,265 @@
+"""
+Importación masiva del catálogo de juegos y hardware
+
+Lee un catálogo CSV o JSONL de forma perezosa (un producto por registro,
+con product_type 'game' o 'hardware'), valida y normaliza cada producto,
+incluidos los JSON de requisitos y especificaciones, y lo inserta por
+lotes con executemany junto con sus puntuaciones de compatibilidad.
+
+El progreso se guarda en la tabla catalog_imports en la misma transacción
+que cada lote, así que una importación interrumpida se retoma justo
+después del último lote confirmado sin duplicar productos.
+"""
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select
+from database import db
+from models.database_models import Game, Hardware, CompatibilityScore, CatalogImport
+from services.inventory_sync import FeedError
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+# Claves de requisitos tal como las usan el formulario de administración y Compatibility
+REQUISITOS_KEYS = {
+    'cpu': 'CPU', 'procesador': 'CPU',
+    'gpu': 'GPU', 'grafica': 'GPU', 'gráfica': 'GPU', 'tarjeta grafica': 'GPU', 'tarjeta gráfica': 'GPU',
+    'ram': 'RAM', 'memoria': 'RAM',
+    'almacenamiento': 'Almacenamiento', 'disco': 'Almacenamiento', 'storage': 'Almacenamiento',
+}
+HARDWARE_TIPOS = {'cpu': 'CPU', 'gpu': 'GPU', 'ram': 'RAM', 'motherboard': 'Motherboard'}
+
+
+def _json_object(value, field):
+    """Convertir un valor del catálogo (dict o texto JSON) en dict"""
+    if value is None or value == '':
+        return {}
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise FeedError(f'{field} no es JSON válido')
+    if not isinstance(value, dict):
+        raise FeedError(f'{field} debe ser un objeto JSON')
+    return value
+
+
+def normalize_requisitos(value, field):
+    """Normalizar requisitos: claves canónicas (CPU, GPU, RAM, Almacenamiento) y valores de texto"""
+    requisitos = {}
+    for key, item in _json_object(value, field).items():
+        key = str(key).strip()
+        canonical = REQUISITOS_KEYS.get(key.lower(), key)
+        if isinstance(item, (dict, list)):
+            raise FeedError(f'{field}.{key} debe ser un valor simple')
+        if item is None:
+            continue
+        # Una RAM numérica se expresa en GB como en el resto del catálogo
+        if canonical == 'RAM' and isinstance(item, (int, float)) and not isinstance(item, bool):
+            item = f'{item:g} GB'
+        requisitos[canonical] = str(item).strip()
+    return requisitos
+
+
+def normalize_especificaciones(value):
+    """Normalizar especificaciones: claves en minúsculas con guiones bajos y valores simples"""
+    especificaciones = {}
+    for key, item in _json_object(value, 'especificaciones').items():
+        key = str(key).strip().lower().replace(' ', '_')
+        if isinstance(item, (dict, list)):
+            raise FeedError(f'especificaciones.{key} debe ser un valor simple')
+        if isinstance(item, str):
+            item = item.strip()
+        especificaciones[key] = item
+    return especificaciones
+
+
+def _required(record, field):
+    """Texto obligatorio de un registro"""
+    value = str(record.get(field) or '').strip()
+    if not value:
+        raise FeedError(f'Falta {field}')
+    return value
+
+
+def _number(record, field, convert, default=None):
+    """Número opcional y no negativo de un registro"""
+    value = record.get(field)
+    if value is None or value == '':
+        if default is None:
+            raise FeedError(f'Falta {field}')
+        return default
+    try:
+        value = convert(value)
+    except (TypeError, ValueError):
+        raise FeedError(f'{field} inválido: {value!r}')
+    if value < 0:
+        raise FeedError(f'{field} negativo: {value}')
+    return value
+
+
+def _optional_text(record, field):
+    """Texto opcional de un registro; vacío es None"""
+    value = str(record.get(field) or '').strip()
+    return value or None
+
+
+def parse_game(record, now):
+    """Validar un juego del catálogo; devuelve (fila, puntuaciones)"""
+    fecha = _optional_text(record, 'fecha_lanzamiento')
+    if fecha:
+        try:
+            fecha = datetime.fromisoformat(fecha)
+        except ValueError:
+            raise FeedError(f'fecha_lanzamiento inválida: {fecha!r}')
+
+    requisitos_minimos = normalize_requisitos(record.get('requisitos_minimos'), 'requisitos_minimos')
+    requisitos_recomendados = normalize_requisitos(record.get('requisitos_recomendados'), 'requisitos_recomendados')
+    row = {
+        'nombre': _required(record, 'nombre'),
+        'descripcion': _required(record, 'descripcion'),
+        'precio': _number(record, 'precio', float),
+        'imagen': _optional_text(record, 'imagen'),
+        'genero': _optional_text(record, 'genero'),
+        'desarrollador': _optional_text(record, 'desarrollador'),
+        'fecha_lanzamiento': fecha,
+        'requisitos_minimos': json.dumps(requisitos_minimos),
+        'requisitos_recomendados': json.dumps(requisitos_recomendados),
+        'stock': _number(record, 'stock', int, default=0),
+        'created_at': now,
+        'updated_at': now,
+    }
+    return row, CompatibilityScore.for_game(requisitos_minimos)
+
+
+def parse_hardware(record, now):
+    """Validar un componente del catálogo; devuelve (fila, puntuaciones)"""
+    tipo = _required(record, 'tipo')
+    tipo = HARDWARE_TIPOS.get(tipo.lower(), tipo)
+    marca = _required(record, 'marca')
+    modelo = _required(record, 'modelo')
+    especificaciones = normalize_especificaciones(record.get('especificaciones'))
+    row = {
+        'tipo': tipo,
+        'marca': marca,
+        'modelo': modelo,
+        'precio': _number(record, 'precio', float),
+        'descripcion': _optional_text(record, 'descripcion'),
+        'imagen': _optional_text(record, 'imagen'),
+        'especificaciones': json.dumps(especificaciones),
+        'stock': _number(record, 'stock', int, default=0),
+        'created_at': now,
+        'updated_at': now,
+    }
+    return row, CompatibilityScore.for_hardware(tipo, marca, modelo, especificaciones)
+
+
+PARSERS = {'game': (Game, parse_game), 'hardware': (Hardware, parse_hardware)}
+
+
+def _insert_batch(product_type, rows, scores):
+    """Insertar un lote de productos de un tipo y sus puntuaciones"""
+    model = PARSERS[product_type][0]
+    # insertmanyvalues agrupa las filas en INSERT de varios VALUES y devuelve
+    # los ids en el mismo orden que los parámetros
+    ids = db.session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.session.execute(insert(CompatibilityScore), [
+        {'product_type': product_type, 'product_id': product_id, **score}
+        for product_id, score in zip(ids, scores)
+    ])
+
+
+def import_catalog(records, key, batch_size=DEFAULT_BATCH_SIZE, restart=False, on_batch=None):
+    """
+    Importar un catálogo a la base de datos
+
+    Args:
+        records: iterable de (número de línea, registro) como el de read_feed
+        key: identificador de la importación, para retomarla
+        batch_size: registros por lote (y por transacción)
+        restart: empezar desde el principio aunque haya progreso guardado
+        on_batch: función llamada con el CatalogImport tras cada lote
+
+    Returns:
+        dict: resumen con los contadores y los primeros errores
+    """
+    state = db.session.get(CatalogImport, key)
+    if state is None or restart:
+        state = db.session.merge(CatalogImport(key=key, records=0, inserted=0, invalid=0,
+                                               finished=False, started_at=datetime.utcnow()))
+        db.session.commit()
+
+    summary = {'retomado_desde': state.records, 'errores': []}
+    if not state.finished:
+        # Saltar los registros ya importados sin validarlos de nuevo
+        records = islice(iter(records), state.records, None)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+            now = datetime.utcnow()
+            pending = {product_type: ([], []) for product_type in PARSERS}
+            for line_num, record in batch:
+                try:
+                    if isinstance(record, FeedError):
+                        raise record
+                    product_type = str(record.get('product_type') or '').strip()
+                    if product_type not in PARSERS:
+                        raise FeedError(f'product_type inválido: {product_type!r}')
+                    row, scores = PARSERS[product_type][1](record, now)
+                except FeedError as e:
+                    state.invalid += 1
+                    if len(summary['errores']) < MAX_REPORTED_ERRORS:
+                        summary['errores'].append(f'Línea {line_num}: {e}')
+                    continue
+                pending[product_type][0].append(row)
+                pending[product_type][1].append(scores)
+
+            for product_type, (rows, scores) in pending.items():
+                if rows:
+                    _insert_batch(product_type, rows, scores)
+                    state.inserted += len(rows)
+
+            state.records += len(batch)
+            db.session.commit()
+            if on_batch:
+                on_batch(state)
+
+        state.finished = True
+        db.session.commit()
+
+    summary.update({'leidos': state.records, 'insertados': state.inserted,
+                    'invalidos': state.invalid, 'finalizado': state.finished})
+    return summary
+
+
+def backfill_scores(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Calcular las puntuaciones de los productos que no las tienen
+
+    Returns:
+        int: productos actualizados
+    """
+    total = 0
+    for product_type, (model, _) in PARSERS.items():
+        scored = select(CompatibilityScore.product_id).where(CompatibilityScore.product_type == product_type)
+        last_id = 0
+        while True:
+            products = (model.query.filter(model.id > last_id, model.id.not_in(scored))
+                        .order_by(model.id).limit(batch_size).all())
+            if not products:
+                break
+            db.session.execute(insert(CompatibilityScore), [
+                {'product_type': product_type, 'product_id': product.id,
+                 **CompatibilityScore.compute(product_type, product)}
+                for product in products
+            ])
+            db.session.commit()
+            total += len(products)
+            last_id = products[-1].id
+    return total
+
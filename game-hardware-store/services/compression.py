@@ -0,0 +1,168 @@
+"""
+Compresión de las respuestas HTML, JSON y texto
+
+Las páginas del catálogo y los endpoints JSON (/consultar-compatibilidad
+devuelve juegos completos con descripción y requisitos) se comprimen con
+brotli si el cliente lo acepta y el paquete está instalado, o con gzip:
+
+- solo los tipos de COMPRESS_MIMETYPES: las facturas PDF, los ZIP de la
+  exportación y las imágenes ya van comprimidos y no se tocan;
+- solo si el cuerpo ocupa al menos COMPRESS_MIN_SIZE bytes: por debajo,
+  las cabeceras y la CPU cuestan más de lo que se ahorra;
+- las respuestas en streaming se comprimen por partes según se generan,
+  sin cargarlas enteras en memoria.
+
+Los archivos estáticos no pasan por aquí: WhiteNoise sirve las versiones
+precomprimidas de static/dist/ (services/static_assets.py). La API ASGI
+(asgi.py) usa compress_body con la misma configuración.
+"""
+import zlib
+from flask import request
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+from services import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+class _BrotliStream:
+    """Compresor brotli con la misma interfaz que zlib.compressobj"""
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compressor(encoding, config):
+    """Compresor incremental para 'br' o 'gzip' con el nivel configurado"""
+    if encoding == 'br':
+        return _BrotliStream(config['COMPRESS_BR_LEVEL'])
+    return zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def choose_encoding(accept_encodings, config):
+    """Codificación preferida por el cliente entre las disponibles ('br', 'gzip'), o None"""
+    available = ['br', 'gzip'] if brotli is not None and config['COMPRESS_BROTLI'] else ['gzip']
+    return accept_encodings.best_match(available)
+
+
+def compressible(mimetype, config):
+    return mimetype in config['COMPRESS_MIMETYPES']
+
+
+def compress_body(data, accept_encodings, config):
+    """
+    Comprimir un cuerpo completo si conviene
+
+    Returns:
+        tuple: (cuerpo, codificación) con codificación None si se dejó sin comprimir
+    """
+    if not config['COMPRESS_ENABLED'] or len(data) < config['COMPRESS_MIN_SIZE']:
+        return data, None
+    encoding = choose_encoding(accept_encodings, config)
+    if encoding is None:
+        return data, None
+    stream = compressor(encoding, config)
+    compressed = stream.compress(data) + stream.flush()
+    metrics.COMPRESSION_BYTES.labels(encoding, 'original').inc(len(data))
+    metrics.COMPRESSION_BYTES.labels(encoding, 'comprimido').inc(len(compressed))
+    return compressed, encoding
+
+
+def _compress_stream(chunks, stream, encoding):
+    """Comprimir un cuerpo en streaming parte por parte"""
+    original = compressed = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            original += len(chunk)
+            data = stream.compress(chunk)
+            if data:
+                compressed += len(data)
+                yield data
+        data = stream.flush()
+        compressed += len(data)
+        yield data
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        metrics.COMPRESSION_BYTES.labels(encoding, 'original').inc(original)
+        metrics.COMPRESSION_BYTES.labels(encoding, 'comprimido').inc(compressed)
+
+
+class ResponseCompression:
+    """Compresión gzip/brotli de las respuestas de la aplicación"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar la compresión en la aplicación"""
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        # Nivel de gzip (1-9) y calidad de brotli (0-11); 6 y 4 son rápidos para contenido dinámico
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        app.config.setdefault('COMPRESS_BROTLI', True)
+        app.extensions['compression'] = self
+        self.app = app
+        app.after_request(self._compress)
+
+    def _compress(self, response):
+        config = self.app.config
+        if (not config['COMPRESS_ENABLED']
+                or request.method == 'HEAD'
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')
+                or not compressible(response.mimetype, config)):
+            return response
+
+        # La respuesta depende de Accept-Encoding aunque esta vez no se comprima
+        response.vary.add('Accept-Encoding')
+
+        if response.is_streamed:
+            encoding = choose_encoding(request.accept_encodings, config)
+            if encoding is None:
+                return response
+            response.response = _compress_stream(response.response, compressor(encoding, config), encoding)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        else:
+            data, encoding = compress_body(response.get_data(), request.accept_encodings, config)
+            if encoding is None:
+                return response
+            response.set_data(data)
+
+        response.headers['Content-Encoding'] = encoding
+        # El cuerpo ya no es el mismo byte a byte que el de la ETag original
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def parse_accept_encoding(value):
+    """Accept-Encoding de una cabecera en bruto, como request.accept_encodings (para la API ASGI)"""
+    return parse_accept_header(value, Accept)
+
+
+response_compression = ResponseCompression()
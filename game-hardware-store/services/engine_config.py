@@ -0,0 +1,182 @@
+"""
+Configuración del engine de SQLAlchemy según la base de datos
+
+Con PostgreSQL (Neon) ajusta el pool de cada worker: tamaño, desborde,
+pre-ping para descartar conexiones que el servidor cerró tras un periodo
+de inactividad, reciclado periódico, keepalives TCP y timeouts de
+sentencia y de transacción inactiva en el servidor. Con SQLite activa WAL
+y los pragmas que permiten a varios workers leer mientras otro escribe.
+
+Todos los valores se leen del entorno (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_CONNECT_TIMEOUT,
+DB_STATEMENT_TIMEOUT_MS, DB_IDLE_IN_TRANSACTION_TIMEOUT_MS y
+SQLITE_BUSY_TIMEOUT_MS). El pool mide además cuánto espera cada petición
+para obtener una conexión (métrica db_pool_checkout_wait_seconds).
+
+async_database_url y async_engine_options hacen lo mismo para el engine
+asíncrono de la API ASGI (asgi.py), con asyncpg y aiosqlite.
+"""
+import os
+import sqlite3
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import Pool, QueuePool
+from services import metrics
+
+
+def _env_int(env, name, default):
+    value = env.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(env, name, default):
+    value = env.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'si', 'sí', 'on')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que registra el tiempo de espera de cada checkout"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def engine_options(uri, env=os.environ):
+    """
+    Opciones del engine (SQLALCHEMY_ENGINE_OPTIONS) para una URL de base de datos
+
+    Returns:
+        dict: opciones para create_engine
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+
+    if backend == 'postgresql':
+        connect_args = {
+            'connect_timeout': _env_int(env, 'DB_CONNECT_TIMEOUT', 10),
+            # Detectar antes las conexiones cortadas por un balanceador o por Neon
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3,
+        }
+        # Un timeout en 0 no se envía: algunos poolers rechazan el parámetro options
+        server_options = []
+        statement_timeout = _env_int(env, 'DB_STATEMENT_TIMEOUT_MS', 30000)
+        if statement_timeout:
+            server_options.append(f'-c statement_timeout={statement_timeout}')
+        idle_timeout = _env_int(env, 'DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000)
+        if idle_timeout:
+            server_options.append(f'-c idle_in_transaction_session_timeout={idle_timeout}')
+        if server_options:
+            connect_args['options'] = ' '.join(server_options)
+
+        return {
+            'poolclass': TimedQueuePool,
+            'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+            'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 5),
+            'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 30),
+            # Neon suspende el cómputo y cierra las conexiones inactivas
+            'pool_recycle': _env_int(env, 'DB_POOL_RECYCLE', 300),
+            'pool_pre_ping': _env_bool(env, 'DB_POOL_PRE_PING', True),
+            # Reutilizar primero la última conexión deja que las sobrantes caduquen
+            'pool_use_lifo': True,
+            'connect_args': connect_args,
+        }
+
+    if backend == 'sqlite' and url.database not in (None, '', ':memory:'):
+        return {
+            'poolclass': TimedQueuePool,
+            'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+            'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 30),
+            'pool_pre_ping': _env_bool(env, 'DB_POOL_PRE_PING', False),
+        }
+
+    return {}
+
+
+def async_database_url(url):
+    """URL equivalente con el driver asíncrono (asyncpg o aiosqlite)"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        # asyncpg no entiende los parámetros de libpq de la URL (p. ej. sslmode de Neon)
+        query = dict(url.query)
+        if 'sslmode' in query:
+            query['ssl'] = query.pop('sslmode')
+        query.pop('channel_binding', None)
+        return url.set(drivername='postgresql+asyncpg', query=query)
+    if backend == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def async_engine_options(url, env=os.environ):
+    """
+    Opciones de create_async_engine para una URL de base de datos
+
+    Returns:
+        dict: opciones para create_async_engine
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+
+    if backend == 'postgresql':
+        server_settings = {}
+        statement_timeout = _env_int(env, 'DB_STATEMENT_TIMEOUT_MS', 30000)
+        if statement_timeout:
+            server_settings['statement_timeout'] = str(statement_timeout)
+        idle_timeout = _env_int(env, 'DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000)
+        if idle_timeout:
+            server_settings['idle_in_transaction_session_timeout'] = str(idle_timeout)
+        return {
+            'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+            'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 5),
+            'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int(env, 'DB_POOL_RECYCLE', 300),
+            'pool_pre_ping': _env_bool(env, 'DB_POOL_PRE_PING', True),
+            'pool_use_lifo': True,
+            'connect_args': {
+                'timeout': _env_int(env, 'DB_CONNECT_TIMEOUT', 10),
+                'server_settings': server_settings,
+            },
+        }
+
+    if backend == 'sqlite' and url.database not in (None, '', ':memory:'):
+        # El engine síncrono ya dejó el archivo en WAL; timeout es el busy_timeout de sqlite3
+        return {
+            'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+            'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 10),
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+
+    return {}
+
+
+SQLITE_BUSY_TIMEOUT_MS = _env_int(os.environ, 'SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+
+@event.listens_for(Pool, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL y pragmas en cada conexión nueva a SQLite"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL: los lectores no bloquean al escritor ni al revés
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # En WAL, NORMAL sigue siendo seguro ante caídas de la aplicación
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        # Esperar al bloqueo de escritura en lugar de fallar con 'database is locked'
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+    finally:
+        cursor.close()
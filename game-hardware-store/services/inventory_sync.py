@@ -0,0 +1,240 @@
+"""
+Sincronización masiva de stock y precios desde un feed de inventario
+
+El feed es CSV (con encabezado) o JSONL, con un registro por producto:
+product_type ('game' o 'hardware'), id, stock y precio. stock y precio son
+opcionales; si faltan, ese valor no se modifica.
+
+El feed se procesa por bloques: de cada bloque se leen los valores actuales
+con una consulta por tipo de producto, se calculan las diferencias y solo
+las filas que cambian se actualizan con una única sentencia
+WITH v(id, stock, precio) AS (VALUES ...) UPDATE ... FROM v. La memoria usada
+depende del tamaño del bloque y no del tamaño del feed.
+"""
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import text, select, update
+from database import db
+from models.database_models import Game, Hardware
+
+PRODUCT_MODELS = {'game': Game, 'hardware': Hardware}
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 1000
+
+# Errores de filas inválidas que se guardan en el resumen (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 20
+
+
+class FeedError(ValueError):
+    """Registro del feed que no se puede aplicar"""
+
+
+def detect_format(filename):
+    """Formato del feed según la extensión del archivo, o None si no se reconoce"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def read_feed(stream, fmt):
+    """
+    Leer los registros de un feed de texto de forma perezosa
+
+    Yields:
+        tuple: (número de línea, dict del registro o FeedError)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_num, FeedError('JSON inválido')
+                continue
+            yield line_num, record if isinstance(record, dict) else FeedError('Se esperaba un objeto')
+    else:
+        raise ValueError(f'Formato no soportado: {fmt}')
+
+
+def _optional(record, field, convert):
+    """Valor opcional de un registro; vacío o ausente es None"""
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise FeedError(f'{field} inválido: {value!r}')
+
+
+def parse_record(record):
+    """
+    Validar un registro del feed
+
+    Returns:
+        tuple: (product_type, id, stock o None, precio o None)
+    """
+    if isinstance(record, FeedError):
+        raise record
+
+    product_type = str(record.get('product_type') or '').strip()
+    if product_type not in PRODUCT_MODELS:
+        raise FeedError(f'product_type inválido: {product_type!r}')
+
+    product_id = _optional(record, 'id', int)
+    if product_id is None:
+        # Los productos no tienen SKU en esta base de datos
+        if record.get('sku'):
+            raise FeedError('Identificación por SKU no soportada, usa id')
+        raise FeedError('Falta id')
+
+    stock = _optional(record, 'stock', int)
+    precio = _optional(record, 'precio', float)
+    if stock is not None and stock < 0:
+        raise FeedError(f'stock negativo: {stock}')
+    if precio is not None and precio < 0:
+        raise FeedError(f'precio negativo: {precio}')
+    return product_type, product_id, stock, precio
+
+
+def _apply_changes(model, changes, now):
+    """Actualizar en una sola sentencia las filas de un tipo de producto que cambian"""
+    table = model.__tablename__
+    rows, params = [], {'now': now}
+    for i, (product_id, stock, precio) in enumerate(changes):
+        rows.append(f'(:id_{i}, :stock_{i}, :precio_{i})')
+        params.update({f'id_{i}': product_id, f'stock_{i}': stock, f'precio_{i}': precio})
+
+    # Los CAST fijan el tipo de las columnas de VALUES aunque todas sean NULL
+    db.session.execute(text(
+        f'WITH v(id, stock, precio) AS (VALUES {", ".join(rows)}) '
+        f'UPDATE {table} SET '
+        f'stock = COALESCE(CAST(v.stock AS INTEGER), {table}.stock), '
+        f'precio = COALESCE(CAST(v.precio AS FLOAT), {table}.precio), '
+        f'updated_at = :now '
+        f'FROM v WHERE {table}.id = v.id'
+    ), params)
+
+
+def _sync_chunk(chunk, summary, dry_run, on_diff):
+    """Calcular y aplicar las diferencias de un bloque de registros ya validados"""
+    # Si un producto aparece varias veces en el bloque, gana el último registro
+    latest = {}
+    for product_type, product_id, stock, precio in chunk:
+        latest[(product_type, product_id)] = (stock, precio)
+
+    now = datetime.utcnow()
+    for product_type, model in PRODUCT_MODELS.items():
+        ids = [product_id for (ptype, product_id) in latest if ptype == product_type]
+        if not ids:
+            continue
+
+        current = {row.id: (row.stock, row.precio) for row in db.session.execute(
+            select(model.id, model.stock, model.precio).where(model.id.in_(ids))
+        )}
+
+        changes = []
+        for product_id in ids:
+            if product_id not in current:
+                summary['no_encontrados'] += 1
+                continue
+            old_stock, old_precio = current[product_id]
+            stock, precio = latest[(product_type, product_id)]
+            stock = stock if stock is not None and stock != old_stock else None
+            precio = precio if precio is not None and precio != old_precio else None
+            if stock is None and precio is None:
+                summary['sin_cambios'] += 1
+                continue
+
+            changes.append((product_id, stock, precio))
+            summary['actualizados'] += 1
+            if on_diff:
+                diff = {'product_type': product_type, 'id': product_id}
+                if stock is not None:
+                    diff['stock'] = [old_stock, stock]
+                if precio is not None:
+                    diff['precio'] = [old_precio, precio]
+                on_diff(diff)
+
+        if changes and not dry_run:
+            _apply_changes(model, changes, now)
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+
+def sync_inventory(records, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, on_diff=None):
+    """
+    Aplicar un feed de inventario a la base de datos
+
+    Cada bloque se confirma por separado, así que un feed interrumpido deja
+    aplicados los bloques anteriores; volver a ejecutarlo es seguro porque
+    las filas sin cambios no se tocan.
+
+    Args:
+        records: iterable de (número de línea, registro) como el de read_feed
+        chunk_size: registros por bloque
+        dry_run: calcular las diferencias sin guardar nada
+        on_diff: función llamada con cada diferencia encontrada
+
+    Returns:
+        dict: resumen con los contadores y los primeros errores
+    """
+    summary = {'leidos': 0, 'actualizados': 0, 'sin_cambios': 0,
+               'no_encontrados': 0, 'invalidos': 0, 'errores': []}
+    records = iter(records)
+
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            break
+
+        chunk = []
+        for line_num, record in batch:
+            summary['leidos'] += 1
+            try:
+                chunk.append(parse_record(record))
+            except FeedError as e:
+                summary['invalidos'] += 1
+                if len(summary['errores']) < MAX_REPORTED_ERRORS:
+                    summary['errores'].append(f'Línea {line_num}: {e}')
+
+        if chunk:
+            _sync_chunk(chunk, summary, dry_run, on_diff)
+
+    return summary
+
+
+def fill_empty_stock(defaults):
+    """
+    Asignar un stock por defecto a los productos sin stock
+
+    Args:
+        defaults: {product_type: stock}
+
+    Returns:
+        dict: {product_type: productos actualizados}
+    """
+    now = datetime.utcnow()
+    updated = {}
+    for product_type, stock in defaults.items():
+        model = PRODUCT_MODELS[product_type]
+        result = db.session.execute(
+            update(model).where(model.stock == 0).values(stock=stock, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        updated[product_type] = result.rowcount
+    db.session.commit()
+    return updated
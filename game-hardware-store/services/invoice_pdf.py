@@ -0,0 +1,134 @@
+"""
+Composición del PDF de las facturas con ReportLab
+
+Se importa con la primera factura que se renderiza (services.invoices),
+no al arrancar la aplicación: ReportLab es el paquete más pesado de la
+tienda y ni los scripts ni la mayoría de las peticiones lo necesitan.
+"""
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.enums import TA_CENTER
+
+# Estilos construidos una sola vez al importar el módulo
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#667eea'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+SUBTITLE_STYLE = _styles['Heading2']
+
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=_styles['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#667eea'),
+    spaceAfter=12
+)
+
+NOTE_STYLE = ParagraphStyle(
+    'Note',
+    parent=_styles['Normal'],
+    fontSize=9,
+    textColor=colors.grey,
+    alignment=TA_CENTER
+)
+
+ORDER_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+])
+
+PRODUCT_TABLE_STYLE = TableStyle([
+    # Header
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+    # Body
+    ('TEXTCOLOR', (0, 1), (-1, -5), colors.black),
+    ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -5), 1, colors.grey),
+
+    # Totales
+    ('FONTNAME', (2, -4), (-1, -1), 'Helvetica-Bold'),
+    ('BACKGROUND', (2, -1), (-1, -1), colors.HexColor('#28a745')),
+    ('TEXTCOLOR', (2, -1), (-1, -1), colors.whitesmoke),
+    ('FONTSIZE', (2, -1), (-1, -1), 12),
+])
+
+
+def build_invoice(data, stream):
+    """Componer el PDF de la factura con ReportLab"""
+    doc = SimpleDocTemplate(stream, pagesize=letter)
+    elements = []
+
+    # Título
+    elements.append(Paragraph("GameTech Store", TITLE_STYLE))
+    elements.append(Paragraph("Factura de Compra", SUBTITLE_STYLE))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Información de la orden
+    order_info = [
+        ['Número de Orden:', f'#{data["id"]}'],
+        ['Fecha:', data['fecha']],
+        ['Cliente:', data['cliente']],
+        ['Email:', data['email']],
+        ['Estado:', data['estado']]
+    ]
+
+    order_table = Table(order_info, colWidths=[2*inch, 4*inch])
+    order_table.setStyle(ORDER_TABLE_STYLE)
+
+    elements.append(order_table)
+    elements.append(Spacer(1, 0.4*inch))
+
+    # Productos
+    elements.append(Paragraph("Productos", HEADING_STYLE))
+
+    product_data = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']]
+    for name, quantity, price, item_subtotal in data['items']:
+        product_data.append([name, str(quantity), f'${price:.2f}', f'${item_subtotal:.2f}'])
+
+    # Calcular totales
+    subtotal = data['total']
+    iva = subtotal * 0.19
+    total = subtotal * 1.19
+
+    product_data.append(['', '', 'Subtotal:', f'${subtotal:.2f}'])
+    product_data.append(['', '', 'Envío:', 'GRATIS'])
+    product_data.append(['', '', 'IVA (19%):', f'${iva:.2f}'])
+    product_data.append(['', '', 'TOTAL:', f'${total:.2f}'])
+
+    product_table = Table(product_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
+    product_table.setStyle(PRODUCT_TABLE_STYLE)
+
+    elements.append(product_table)
+    elements.append(Spacer(1, 0.5*inch))
+
+    # Nota final
+    elements.append(Paragraph("Gracias por tu compra en GameTech Store", NOTE_STYLE))
+    elements.append(Paragraph("Este documento es una factura válida", NOTE_STYLE))
+
+    doc.build(elements)
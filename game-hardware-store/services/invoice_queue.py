@@ -0,0 +1,217 @@
+"""
+Cola de renderizado de facturas en segundo plano
+
+Los trabajos se guardan en un archivo SQLite local para que sobrevivan a
+reinicios del servidor, y se ejecutan en un pool de hilos de cada worker.
+El pool arranca con la primera petición de cada worker, que retoma los
+trabajos pendientes y borra los terminados hace más de
+INVOICE_QUEUE_RETENTION_DAYS días.
+
+Un renderizado fallido se reintenta hasta MAX_ATTEMPTS veces con espera
+exponencial (INVOICE_QUEUE_RETRY_SECONDS, el doble, ...), para que una
+causa pasajera como una base bloqueada o un disco lleno no agote los
+intentos en unos milisegundos. El trabajo guarda cuándo puede volver a
+intentarse (next_attempt_at) y el worker lo retoma con la primera petición
+a partir de ese momento.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Un trabajo en estado 'running' más antiguo que esto se considera abandonado
+# (por ejemplo, el worker murió a mitad del renderizado) y se reintenta
+STALE_JOB_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+
+class InvoiceQueue:
+    """Cola persistente de facturas pendientes de renderizar"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pid = None
+        # Momento del próximo reintento programado en este proceso, o None
+        self._retry_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar la cola en la aplicación"""
+        app.config.setdefault('INVOICE_QUEUE_PATH', os.path.join(app.instance_path, 'invoice_jobs.db'))
+        app.config.setdefault('INVOICE_QUEUE_WORKERS', 2)
+        app.config.setdefault('INVOICE_QUEUE_RETENTION_DAYS', 7)
+        app.config.setdefault('INVOICE_QUEUE_RETRY_SECONDS', 30)
+        app.extensions['invoice_queue'] = self
+        app.before_request(self._start)
+        self.app = app
+
+    def _connect(self):
+        """Abrir una conexión al archivo de la cola"""
+        path = self.app.config['INVOICE_QUEUE_PATH']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _start(self):
+        """
+        Arrancar la cola con la primera petición del worker y retomar los
+        reintentos vencidos, sin romper la petición si falla
+        """
+        if self._pid == os.getpid() and (self._retry_at is None or time.time() < self._retry_at):
+            return
+        try:
+            self._ensure_started()
+            if self._retry_at is not None and time.time() >= self._retry_at:
+                self._submit_due()
+        except Exception as e:
+            self.app.logger.error(f'No se pudo iniciar la cola de facturas: {e}')
+
+    def _ensure_started(self):
+        """Arrancar el pool de hilos en este proceso (los hilos no sobreviven a un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS invoice_jobs ('
+                    ' order_id INTEGER PRIMARY KEY,'
+                    ' status TEXT NOT NULL,'
+                    ' attempts INTEGER NOT NULL DEFAULT 0,'
+                    ' enqueued_at REAL NOT NULL,'
+                    ' started_at REAL,'
+                    ' next_attempt_at REAL,'
+                    ' error TEXT)'
+                )
+                # Archivos creados antes de que existieran los reintentos con espera
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(invoice_jobs)')}
+                if 'next_attempt_at' not in columns:
+                    conn.execute('ALTER TABLE invoice_jobs ADD COLUMN next_attempt_at REAL')
+                # Liberar trabajos abandonados por un proceso anterior
+                conn.execute(
+                    "UPDATE invoice_jobs SET status = 'pending' WHERE status = 'running' AND started_at < ?",
+                    (time.time() - STALE_JOB_SECONDS,)
+                )
+                # Olvidar los trabajos terminados hace tiempo
+                conn.execute(
+                    "DELETE FROM invoice_jobs WHERE status IN ('done', 'failed') AND enqueued_at < ?",
+                    (time.time() - self.app.config['INVOICE_QUEUE_RETENTION_DAYS'] * 86400,)
+                )
+            finally:
+                conn.close()
+
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.app.config['INVOICE_QUEUE_WORKERS'],
+                thread_name_prefix='invoice-render'
+            )
+            self._retry_at = None
+            self._pid = os.getpid()
+
+        # Retomar los trabajos que quedaron pendientes antes del reinicio
+        self._submit_due()
+
+    def _submit_due(self):
+        """Enviar al pool los trabajos pendientes que ya pueden intentarse y programar el siguiente"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            due = [row[0] for row in conn.execute(
+                "SELECT order_id FROM invoice_jobs WHERE status = 'pending' "
+                "AND COALESCE(next_attempt_at, 0) <= ? ORDER BY enqueued_at", (now,)
+            )]
+            next_at = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM invoice_jobs WHERE status = 'pending' AND next_attempt_at > ?",
+                (now,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            self._retry_at = next_at
+        for order_id in due:
+            self._executor.submit(self._run, order_id)
+
+    def _schedule_retry(self, retry_at):
+        """Recordar en este proceso el próximo reintento"""
+        with self._lock:
+            if self._retry_at is None or retry_at < self._retry_at:
+                self._retry_at = retry_at
+
+    def enqueue(self, order_id):
+        """Encolar el renderizado de la factura de una orden"""
+        try:
+            self._ensure_started()
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO invoice_jobs (order_id, status, enqueued_at) VALUES (?, 'pending', ?)",
+                    (order_id, time.time())
+                )
+            finally:
+                conn.close()
+            self._executor.submit(self._run, order_id)
+        except Exception as e:
+            # Un fallo de la cola nunca debe romper el checkout; el PDF
+            # se generará bajo demanda al descargarlo
+            self.app.logger.error(f'No se pudo encolar la factura de la orden {order_id}: {e}')
+
+    def shutdown(self, wait=True):
+        """Detener el pool de hilos de este proceso, esperando a los trabajos en curso"""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._retry_at = None
+            self._pid = None
+
+    def _run(self, order_id):
+        """Renderizar la factura de una orden (se ejecuta en el pool de hilos)"""
+        from database import db
+        from models.database_models import Order
+        from services import invoices
+
+        conn = self._connect()
+        try:
+            # Reclamar el trabajo; si otro worker ya lo tomó o aún debe esperar, no hacer nada
+            now = time.time()
+            claimed = conn.execute(
+                "UPDATE invoice_jobs SET status = 'running', started_at = ?, attempts = attempts + 1 "
+                "WHERE order_id = ? AND status = 'pending' AND COALESCE(next_attempt_at, 0) <= ?",
+                (now, order_id, now)
+            ).rowcount
+            if not claimed:
+                return
+
+            try:
+                with self.app.app_context():
+                    order = db.session.get(Order, order_id)
+                    if order is not None and invoices.is_cacheable(order):
+                        invoices.ensure_invoice(order)
+            except Exception as e:
+                self.app.logger.error(f'Error al renderizar la factura de la orden {order_id}: {e}')
+                attempts = conn.execute(
+                    'SELECT attempts FROM invoice_jobs WHERE order_id = ?', (order_id,)
+                ).fetchone()[0]
+                retry = attempts < MAX_ATTEMPTS
+                # Espera exponencial: RETRY_SECONDS tras el primer fallo, el doble tras el segundo...
+                retry_at = time.time() + self.app.config['INVOICE_QUEUE_RETRY_SECONDS'] * 2 ** (attempts - 1)
+                conn.execute(
+                    'UPDATE invoice_jobs SET status = ?, error = ?, next_attempt_at = ? WHERE order_id = ?',
+                    ('pending' if retry else 'failed', str(e), retry_at if retry else None, order_id)
+                )
+                if retry:
+                    self._schedule_retry(retry_at)
+                return
+
+            conn.execute("UPDATE invoice_jobs SET status = 'done', error = NULL WHERE order_id = ?", (order_id,))
+        finally:
+            conn.close()
+
+
+invoice_queue = InvoiceQueue()
@@ -0,0 +1,75 @@
+"""
+Generación de facturas PDF de las órdenes
+"""
+import os
+import tempfile
+from flask import current_app
+from services import metrics
+
+# Versión del diseño de la factura. Incrementarla invalida los PDFs en caché.
+INVOICE_LAYOUT_VERSION = 1
+
+
+def invoice_data(order):
+    """Extraer de la orden los datos que necesita la factura (serializables)"""
+    user = order.user
+    return {
+        'id': order.id,
+        'fecha': order.created_at.strftime('%d/%m/%Y %H:%M'),
+        'cliente': user.username,
+        'email': user.email,
+        'estado': order.status.upper(),
+        'total': order.total,
+        'items': [
+            (item.product_name, item.quantity, item.price, item.get_subtotal())
+            for item in order.items
+        ]
+    }
+
+
+def render_invoice(data, stream):
+    """Escribir el PDF de la factura en un stream de salida"""
+    # ReportLab se carga con la primera factura, no al importar la aplicación
+    from services.invoice_pdf import build_invoice
+    with metrics.PDF_RENDER_SECONDS.time():
+        build_invoice(data, stream)
+
+
+def is_cacheable(order):
+    """Solo las órdenes completadas son inmutables y pueden guardarse en caché"""
+    return order.status == 'completed'
+
+
+def cache_path(order_id, cache_dir=None):
+    """Ruta del PDF en caché para una orden"""
+    if cache_dir is None:
+        cache_dir = current_app.config['INVOICE_CACHE_DIR']
+    return os.path.join(cache_dir, f'v{INVOICE_LAYOUT_VERSION}', f'orden_{order_id}.pdf')
+
+
+def render_to_file(data, path):
+    """Renderizar la factura en disco de forma atómica"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Escribir en un temporal del mismo directorio y renombrar, para que
+    # otro worker nunca lea un PDF a medio escribir
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as stream:
+            render_invoice(data, stream)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def ensure_invoice(order):
+    """Obtener la ruta del PDF de una orden completada, renderizándolo si no existe"""
+    path = cache_path(order.id)
+    cached = os.path.exists(path)
+    metrics.cache_result('invoices', cached)
+    if not cached:
+        render_to_file(invoice_data(order), path)
+    return path
@@ -0,0 +1,156 @@
+"""
+Métricas de la aplicación en formato Prometheus
+
+Registra la latencia de las peticiones por endpoint y blueprint, los
+códigos de estado, las peticiones en curso, el uso del pool de conexiones,
+los aciertos de la caché de facturas, el tiempo de renderizado de los PDF
+y las peticiones rechazadas por límites de frecuencia, y los expone en /metrics en el formato de texto de Prometheus.
+
+Con gunicorn cada worker es un proceso con sus propios contadores: si
+PROMETHEUS_MULTIPROC_DIR apunta a un directorio (vacío al arrancar el
+servidor), prometheus_client guarda los valores en archivos compartidos y
+/metrics los agrega entre todos los workers. La variable debe estar
+definida antes de importar este módulo; gunicorn.conf.py se encarga de ello.
+"""
+import os
+import time
+from flask import g, request, Response
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    # Los scripts que importan la app también escriben sus métricas ahí
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# Segundos; cubren desde las respuestas en caché hasta las páginas del catálogo completo
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Duración de las peticiones HTTP',
+    ['blueprint', 'endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    'http_requests_total', 'Peticiones HTTP atendidas',
+    ['blueprint', 'endpoint', 'method', 'status']
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Peticiones HTTP en curso',
+    ['blueprint'], multiprocess_mode='livesum'
+)
+DB_CONNECTIONS_OPEN = Gauge(
+    'db_pool_connections_open', 'Conexiones abiertas por los pools de SQLAlchemy',
+    multiprocess_mode='livesum'
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Conexiones prestadas por los pools de SQLAlchemy',
+    multiprocess_mode='livesum'
+)
+DB_CHECKOUTS = Counter('db_pool_checkouts_total', 'Conexiones obtenidas del pool')
+DB_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Espera para obtener una conexión del pool',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+DB_QUERIES = Counter(
+    'db_queries_total', 'Sentencias SQL ejecutadas por destino (primaria o réplica)',
+    ['target']
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Consultas a cachés de la aplicación (aciertos y fallos)',
+    ['cache', 'result']
+)
+RATE_LIMITED = Counter(
+    'rate_limited_requests_total', 'Peticiones rechazadas por un límite de frecuencia',
+    ['scope']
+)
+COMPRESSION_BYTES = Counter(
+    'http_compression_bytes_total', 'Bytes de las respuestas comprimidas antes y después de comprimir',
+    ['encoding', 'stage']
+)
+PDF_RENDER_SECONDS = Histogram(
+    'invoice_pdf_render_seconds', 'Tiempo de renderizado de una factura PDF',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+def cache_result(cache, hit):
+    """Anotar un acierto o un fallo de una caché"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+@event.listens_for(Pool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    DB_CONNECTIONS_OPEN.inc()
+
+
+@event.listens_for(Pool, 'close')
+def _on_close(dbapi_connection, connection_record):
+    DB_CONNECTIONS_OPEN.dec()
+
+
+@event.listens_for(Pool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_CHECKOUTS.inc()
+    DB_CONNECTIONS_IN_USE.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    DB_CONNECTIONS_IN_USE.dec()
+
+
+class Metrics:
+    """Medición de las peticiones y endpoint /metrics"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar las métricas en la aplicación"""
+        app.extensions['metrics'] = self
+        app.before_request(self._start)
+        app.after_request(self._record)
+        app.teardown_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        self.app = app
+
+    @staticmethod
+    def _labels():
+        # Las rutas inexistentes comparten etiqueta para no crear una serie por URL
+        return request.blueprint or 'app', request.endpoint or 'desconocido'
+
+    def _start(self):
+        if request.endpoint == 'metrics':
+            return
+        g._metrics_started = time.perf_counter()
+        REQUESTS_IN_PROGRESS.labels(blueprint=self._labels()[0]).inc()
+
+    def _record(self, response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            blueprint, endpoint = self._labels()
+            REQUEST_LATENCY.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(blueprint, endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    def _finish(self, exc):
+        # teardown se ejecuta siempre, también si la petición terminó con una excepción
+        if g.pop('_metrics_started', None) is not None:
+            REQUESTS_IN_PROGRESS.labels(blueprint=self._labels()[0]).dec()
+
+    @staticmethod
+    def expose():
+        """Métricas en el formato de texto de Prometheus"""
+        if MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, MULTIPROC_DIR)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
@@ -0,0 +1,105 @@
+"""
+Política de hash de contraseñas
+
+El algoritmo y su coste se configuran con PASSWORD_HASH_METHOD, en el
+formato de Werkzeug ('pbkdf2:sha256:600000', 'scrypt:32768:8:1', ...).
+Los hashes guardados con otra política se recalculan al iniciar sesión,
+cuando se conoce la contraseña (User.upgrade_password_hash).
+
+Calcular y verificar hashes se hace en un pool de hilos acotado por
+proceso: hashlib libera el GIL, así que el resto de hilos del worker sigue
+atendiendo peticiones, y como mucho PASSWORD_HASH_WORKERS hashes se
+calculan a la vez. Si además hay PASSWORD_HASH_QUEUE esperando, las nuevas
+peticiones reciben un 503 en lugar de acumularse y bloquear los workers
+durante una avalancha de inicios de sesión.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+# Parámetros por defecto de scrypt en Werkzeug (n, r, p)
+SCRYPT_DEFAULTS = ('32768', '8', '1')
+
+
+class HashingBusy(ServiceUnavailable):
+    """Demasiados hashes de contraseña en curso en este proceso"""
+    description = 'Hay demasiados inicios de sesión en este momento. Inténtalo de nuevo en unos segundos.'
+
+
+def normalize_method(method):
+    """Método de Werkzeug con todos sus parámetros explícitos, para comparar políticas"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else str(DEFAULT_PBKDF2_ITERATIONS)
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if parts[0] == 'scrypt':
+        return ':'.join(['scrypt'] + parts[1:] + list(SCRYPT_DEFAULTS[len(parts) - 1:]))
+    return method
+
+
+class PasswordHasher:
+    """Cálculo y verificación de hashes de contraseña en un pool de hilos acotado"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar la política de contraseñas en la aplicación"""
+        app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 8)
+        app.config.setdefault('PASSWORD_HASH_WAIT', 1.0)
+        app.extensions['password_hasher'] = self
+        self.app = app
+
+    @property
+    def method(self):
+        return self.app.config['PASSWORD_HASH_METHOD']
+
+    def _ensure_started(self):
+        """Crear el pool en este proceso (los hilos no sobreviven a un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            config = self.app.config
+            self._executor = ThreadPoolExecutor(max_workers=config['PASSWORD_HASH_WORKERS'],
+                                                thread_name_prefix='password-hash')
+            self._slots = threading.BoundedSemaphore(config['PASSWORD_HASH_WORKERS'] + config['PASSWORD_HASH_QUEUE'])
+            self._pid = os.getpid()
+
+    def _run(self, fn, *args):
+        self._ensure_started()
+        if not self._slots.acquire(timeout=self.app.config['PASSWORD_HASH_WAIT']):
+            raise HashingBusy()
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash de una contraseña con la política actual"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Comprobar una contraseña contra su hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True si el hash se calculó con otro algoritmo o coste que el configurado"""
+        stored_method = password_hash.split('$', 1)[0]
+        return normalize_method(stored_method) != normalize_method(self.method)
+
+
+password_hasher = PasswordHasher()
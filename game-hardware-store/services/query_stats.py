@@ -0,0 +1,156 @@
+"""
+Instrumentación de consultas SQL por petición
+
+Cuenta las sentencias que ejecuta cada petición y el tiempo acumulado en
+la base de datos mediante los eventos del engine de SQLAlchemy, y los
+devuelve en la cabecera Server-Timing. Las peticiones que superan su
+presupuesto de consultas o de duración se registran en el log de la
+aplicación con las sentencias agrupadas por huella (la SQL sin literales),
+que es donde se ven los patrones N+1.
+
+Cada vista puede declarar su presupuesto con @query_budget. En modo
+estricto (TESTING o QUERY_BUDGET_STRICT) superarlo lanza
+QueryBudgetExceeded, para que las pruebas fallen.
+"""
+import re
+import time
+from collections import defaultdict
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Sentencias distintas que se muestran en el log de una petición lenta
+MAX_LOGGED_FINGERPRINTS = 5
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Una petición ejecutó más consultas de las que permite su presupuesto"""
+
+
+def fingerprint(statement):
+    """Huella de una sentencia: sin literales, con las listas de parámetros colapsadas"""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def query_budget(max_queries):
+    """Declarar el número máximo de consultas que puede ejecutar una vista"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+class RequestStats:
+    """Consultas y tiempo de base de datos de una petición"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = defaultdict(lambda: [0, 0.0])
+
+    def record(self, statement, elapsed):
+        """Anotar una sentencia ejecutada"""
+        self.queries += 1
+        self.db_time += elapsed
+        entry = self.fingerprints[fingerprint(statement)]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def top_fingerprints(self, limit=MAX_LOGGED_FINGERPRINTS):
+        """Sentencias más repetidas: [(huella, veces, segundos)]"""
+        ranked = sorted(self.fingerprints.items(), key=lambda item: (-item[1][0], -item[1][1]))
+        return [(sql, count, elapsed) for sql, (count, elapsed) in ranked[:limit]]
+
+
+def current_stats():
+    """Estadísticas de la petición en curso, o None fuera de una petición"""
+    if not has_request_context():
+        return None
+    return g.get('_query_stats')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start_time'].pop()
+    # Los hilos de la cola de facturas y del barrido de reservas no tienen petición
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+class QueryInstrumentation:
+    """Medición de consultas por petición con presupuesto y log de peticiones lentas"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar la instrumentación en la aplicación"""
+        app.config.setdefault('QUERY_BUDGET', 30)
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.config.setdefault('QUERY_BUDGET_STRICT', False)
+        app.extensions['query_stats'] = self
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        self.app = app
+
+    @staticmethod
+    def _start():
+        g._query_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{stats.queries} consultas"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+
+        config = current_app.config
+        view = current_app.view_functions.get(request.endpoint)
+        declared = getattr(view, 'query_budget', None)
+        budget = declared if declared is not None else config['QUERY_BUDGET']
+        over_budget = stats.queries > budget
+        if over_budget or total_ms > config['SLOW_REQUEST_MS']:
+            self._log(stats, budget, total_ms, db_ms)
+
+        if over_budget and declared is not None and (config['TESTING'] or config['QUERY_BUDGET_STRICT']):
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ejecutó {stats.queries} consultas '
+                f'(presupuesto {budget}): ' + '; '.join(f'{count}x {sql}' for sql, count, _ in stats.top_fingerprints())
+            )
+        return response
+
+    @staticmethod
+    def _log(stats, budget, total_ms, db_ms):
+        """Registrar una petición que superó su presupuesto de consultas o de duración"""
+        lines = [f'Petición fuera de presupuesto {request.method} {request.path}: {total_ms:.1f} ms, '
+                 f'{stats.queries} consultas (presupuesto {budget}), {db_ms:.1f} ms en la base de datos']
+        for sql, count, elapsed in stats.top_fingerprints():
+            lines.append(f'    {count}x {elapsed * 1000:.1f} ms  {sql}')
+        current_app.logger.warning('\n'.join(lines))
+
+
+query_instrumentation = QueryInstrumentation()
@@ -0,0 +1,195 @@
+"""
+Límites de frecuencia por IP y por usuario con ventanas deslizantes
+
+Los contadores se guardan en un archivo SQLite local (RATE_LIMIT_PATH)
+compartido por todos los workers del servidor. Cada límite se evalúa con
+una ventana deslizante aproximada: el contador de la ventana fija actual
+más el de la anterior ponderado por la parte que aún cae dentro de la
+ventana. Cuesta una fila por clave y ventana y no guarda cada petición.
+
+- RATE_LIMITS: peticiones por IP y por blueprint, como
+  {'auth': (30, 60)} (30 peticiones cada 60 segundos). Se comprueban en
+  un before_request, antes de cualquier consulta o hash de contraseña.
+- LOGIN_FAILURE_LIMITS: inicios de sesión fallidos por nombre de usuario
+  y por IP. auth.login los consulta antes de buscar al usuario.
+
+La IP es request.remote_addr. Detrás de un proxy o balanceador hay que
+definir TRUSTED_PROXY_COUNT (create_app aplica ProxyFix); si no, todos los
+clientes comparten la IP del proxy y un mismo contador.
+
+Si el archivo de contadores falla, las peticiones se dejan pasar: un
+límite de frecuencia nunca debe tumbar la tienda.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+from services import metrics
+
+# Cada cuántos segundos borra cada proceso las ventanas caducadas
+PRUNE_INTERVAL = 60
+
+
+def parse_limits(text):
+    """
+    Leer límites por blueprint de una cadena como 'auth:30/60,hardware:120/60'
+
+    Returns:
+        dict: {blueprint: (peticiones, segundos)}
+    """
+    limits = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        blueprint, _, limit = item.partition(':')
+        max_requests, _, seconds = limit.partition('/')
+        limits[blueprint.strip()] = (int(max_requests), int(seconds))
+    return limits
+
+
+class RateLimited(TooManyRequests):
+    """Límite de frecuencia superado"""
+    description = 'Demasiadas peticiones. Inténtalo de nuevo en unos segundos.'
+
+    def __init__(self, retry_after, description=None):
+        super().__init__(description)
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None, scope=None):
+        return super().get_headers(environ, scope) + [('Retry-After', str(self.retry_after))]
+
+
+class RateLimiter:
+    """Contadores de ventana deslizante compartidos entre los workers"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._local = threading.local()
+        self._pruned_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar los límites en la aplicación"""
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'rate_limits.db'))
+        app.config.setdefault('RATE_LIMITS', {'auth': (30, 60)})
+        app.config.setdefault('LOGIN_FAILURE_LIMITS', {'username': (5, 300), 'ip': (20, 300)})
+        app.extensions['rate_limiter'] = self
+        self.app = app
+        # Las conexiones abiertas apuntan al archivo de la aplicación anterior
+        self._local = threading.local()
+        self._pruned_at = 0
+        app.before_request(self._check_blueprint)
+
+    def _connection(self):
+        """Conexión del hilo actual al archivo de contadores (una por hilo y proceso)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        path = self.app.config['RATE_LIMIT_PATH']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_hits ('
+            ' key TEXT NOT NULL,'
+            ' window INTEGER NOT NULL,'
+            ' count INTEGER NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' PRIMARY KEY (key, window))'
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, key, seconds, increment):
+        """
+        Estimación de la ventana deslizante de una clave, sumando antes increment
+
+        Returns:
+            tuple: (peticiones estimadas en los últimos seconds, segundos hasta la próxima ventana)
+        """
+        now = time.time()
+        window, elapsed = divmod(now, seconds)
+        window = int(window)
+        key = f'{key}/{seconds}'
+        conn = self._connection()
+        if increment:
+            conn.execute(
+                'INSERT INTO rate_limit_hits (key, window, count, expires_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key, window) DO UPDATE SET count = count + excluded.count',
+                (key, window, increment, (window + 2) * seconds)
+            )
+        counts = dict(conn.execute(
+            'SELECT window, count FROM rate_limit_hits WHERE key = ? AND window IN (?, ?)',
+            (key, window - 1, window)
+        ).fetchall())
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = now
+            conn.execute('DELETE FROM rate_limit_hits WHERE expires_at < ?', (now,))
+        estimate = counts.get(window - 1, 0) * (1 - elapsed / seconds) + counts.get(window, 0)
+        return estimate, math.ceil(seconds - elapsed)
+
+    def _exceeded(self, key, limit, increment):
+        """Segundos de espera si la clave superó su límite, o None"""
+        max_requests, seconds = limit
+        try:
+            estimate, retry_after = self._count(key, seconds, increment)
+        except sqlite3.Error as e:
+            self.app.logger.error(f'Límite de frecuencia no disponible: {e}')
+            return None
+        return retry_after if estimate > max_requests else None
+
+    def _check_blueprint(self):
+        """Contar la petición en el límite de su blueprint y rechazarla si lo supera"""
+        if not self.app.config['RATE_LIMIT_ENABLED']:
+            return
+        limit = self.app.config['RATE_LIMITS'].get(request.blueprint)
+        if limit is None:
+            return
+        retry_after = self._exceeded(f'bp:{request.blueprint}:{request.remote_addr}', limit, 1)
+        if retry_after is not None:
+            metrics.RATE_LIMITED.labels(scope=request.blueprint).inc()
+            raise RateLimited(retry_after)
+
+    def _login_keys(self, username):
+        limits = self.app.config['LOGIN_FAILURE_LIMITS']
+        return [(f'login:user:{username.strip().lower()}', limits['username'], 'login_username'),
+                (f'login:ip:{request.remote_addr}', limits['ip'], 'login_ip')]
+
+    def check_login(self, username):
+        """Rechazar el intento si el usuario o la IP acumulan demasiados inicios de sesión fallidos"""
+        if not self.app.config['RATE_LIMIT_ENABLED']:
+            return
+        for key, limit, scope in self._login_keys(username):
+            # El intento actual aún no cuenta: que el último permitido pueda acertar
+            retry_after = self._exceeded(key, (limit[0] - 1, limit[1]), 0)
+            if retry_after is not None:
+                metrics.RATE_LIMITED.labels(scope=scope).inc()
+                raise RateLimited(retry_after, 'Demasiados intentos fallidos de inicio de sesión. '
+                                               f'Inténtalo de nuevo en {retry_after} segundos.')
+
+    def login_failed(self, username):
+        """Anotar un inicio de sesión fallido para el usuario y la IP"""
+        if not self.app.config['RATE_LIMIT_ENABLED']:
+            return
+        for key, limit, _ in self._login_keys(username):
+            self._exceeded(key, limit, 1)
+
+    def login_succeeded(self, username):
+        """Olvidar los fallos del usuario tras un inicio de sesión correcto (los de la IP se mantienen)"""
+        if not self.app.config['RATE_LIMIT_ENABLED']:
+            return
+        key, limit, _ = self._login_keys(username)[0]
+        try:
+            self._connection().execute('DELETE FROM rate_limit_hits WHERE key = ?', (f'{key}/{limit[1]}',))
+        except sqlite3.Error as e:
+            self.app.logger.error(f'Límite de frecuencia no disponible: {e}')
+
+
+rate_limiter = RateLimiter()
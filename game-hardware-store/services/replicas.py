@@ -0,0 +1,156 @@
+"""
+Enrutado de las lecturas del catálogo a réplicas de solo lectura
+
+Las peticiones de los blueprints del catálogo (REPLICA_BLUEPRINTS y
+REPLICA_ENDPOINTS) leen de una réplica de DATABASE_REPLICA_URLS, elegida
+por turnos entre las disponibles. Todo lo demás va a la primaria: las
+escrituras, cualquier sentencia que no sea un SELECT (la petición pasa a
+la primaria desde ese momento) y las peticiones fuera de contexto web
+(scripts, cola de facturas, barrido de reservas).
+
+Lecturas de lo propio: un cliente que acaba de escribir lee de la
+primaria durante READ_YOUR_WRITES_SECONDS, marcado en su sesión firmada.
+
+Cada réplica se comprueba como mucho cada REPLICA_HEALTH_INTERVAL
+segundos; si no responde o su retraso supera REPLICA_MAX_LAG_SECONDS se
+deja de usar hasta la siguiente comprobación, y si no queda ninguna las
+lecturas van a la primaria. Las sentencias servidas por cada destino se
+cuentan en la métrica db_queries_total.
+"""
+import itertools
+import threading
+import time
+from flask import g, has_request_context, request, session
+from sqlalchemy import create_engine, event, text
+from database import db
+from services import metrics
+from services.engine_config import engine_options
+
+# Retraso de réplica en PostgreSQL; 0 si ya aplicó todo lo recibido (una
+# primaria sin escrituras no hace avanzar pg_last_xact_replay_timestamp)
+POSTGRES_LAG_SQL = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+
+def _count_queries(engine, target):
+    """Contar en db_queries_total las sentencias de un engine"""
+    counter = metrics.DB_QUERIES.labels(target=target)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.inc()
+
+
+class Replica:
+    """Una réplica de solo lectura y su último estado conocido"""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.engine = create_engine(url, **engine_options(url))
+        self.available = False
+        self.lag = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+        _count_queries(self.engine, name)
+
+    def is_available(self, max_lag, interval, logger):
+        """Estado de la réplica, comprobándola de nuevo si el último resultado caducó"""
+        if self.checked_at is not None and time.monotonic() - self.checked_at < interval:
+            return self.available
+        with self._lock:
+            if self.checked_at is None or time.monotonic() - self.checked_at >= interval:
+                self._check(max_lag, logger)
+        return self.available
+
+    def _check(self, max_lag, logger):
+        was_available = self.available
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == 'postgresql':
+                    self.lag = float(conn.execute(POSTGRES_LAG_SQL).scalar())
+                else:
+                    conn.execute(text('SELECT 1'))
+                    self.lag = 0.0
+            self.available = self.lag <= max_lag
+            if not self.available and was_available:
+                logger.warning(f'Réplica {self.name} con {self.lag:.1f} s de retraso; lecturas a la primaria')
+        except Exception as e:
+            self.available = False
+            if was_available or self.checked_at is None:
+                logger.warning(f'Réplica {self.name} no disponible; lecturas a la primaria: {e}')
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    """Elige el engine de cada sentencia de la sesión según la petición en curso"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.replicas = []
+        self._turns = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar el enrutado en la aplicación (después de db.init_app)"""
+        app.config.setdefault('DATABASE_REPLICA_URLS', [])
+        app.config.setdefault('REPLICA_BLUEPRINTS', ('store', 'hardware'))
+        app.config.setdefault('REPLICA_ENDPOINTS', ('index',))
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 5)
+        app.config.setdefault('REPLICA_HEALTH_INTERVAL', 5)
+        app.config.setdefault('READ_YOUR_WRITES_SECONDS', 10)
+        self.app = app
+
+        self.replicas = [Replica(f'replica{i}', url) for i, url in enumerate(app.config['DATABASE_REPLICA_URLS'])]
+        if not self.replicas:
+            return
+        self._turns = itertools.cycle(self.replicas)
+        with app.app_context():
+            _count_queries(db.engine, 'primary')
+        app.extensions['replica_router'] = self
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        config = self.app.config
+        eligible = request.blueprint in config['REPLICA_BLUEPRINTS'] or request.endpoint in config['REPLICA_ENDPOINTS']
+        # True: puede usar una réplica, que se elige con la primera lectura
+        g._db_replica = eligible and session.get(PRIMARY_UNTIL_KEY, 0) <= time.time()
+
+    def _finish(self, response):
+        if g.get('_db_wrote'):
+            session[PRIMARY_UNTIL_KEY] = time.time() + self.app.config['READ_YOUR_WRITES_SECONDS']
+        return response
+
+    def _pick(self):
+        """Siguiente réplica disponible por turnos, o None"""
+        config = self.app.config
+        for _ in range(len(self.replicas)):
+            replica = next(self._turns)
+            if replica.is_available(config['REPLICA_MAX_LAG_SECONDS'], config['REPLICA_HEALTH_INTERVAL'],
+                                    self.app.logger):
+                return replica
+        return None
+
+    def bind_for(self, db_session, clause):
+        """Engine de réplica para la sentencia, o None para usar la primaria"""
+        if not has_request_context():
+            return None
+        if db_session._flushing or not getattr(clause, 'is_select', False):
+            # Escritura (o SQL que no se puede clasificar): el resto de la
+            # petición usa la primaria para leer lo que acaba de escribir
+            g._db_wrote = True
+            g._db_replica = None
+            return None
+
+        replica = g.get('_db_replica')
+        if replica is True:
+            replica = g._db_replica = self._pick()
+        return replica.engine if replica else None
+
+
+replica_router = ReplicaRouter()
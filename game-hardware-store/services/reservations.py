@@ -0,0 +1,323 @@
+"""
+Reservas temporales de stock para las líneas del carrito
+
+Agregar un producto al carrito reserva las unidades durante un tiempo
+limitado (STOCK_HOLD_SECONDS) para que no se vendan a otro comprador
+mientras tanto. Las unidades reservadas de cada producto se llevan en un
+contador (tabla reserved_stock) que se actualiza en la misma transacción
+que las reservas, así el stock disponible es stock - contador y nunca hace
+falta sumar las reservas en cada petición.
+
+Todas las operaciones bloquean primero la fila de la reserva y después la
+del contador, en ese orden, para que varios workers puedan trabajar a la
+vez sin interbloquearse. Un hilo por proceso libera en bloque las reservas
+vencidas.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, bindparam, func, tuple_
+from database import db, upsert_insert
+from models.database_models import Game, Hardware, StockHold, ReservedStock
+
+PRODUCT_MODELS = {'game': Game, 'hardware': Hardware}
+
+
+def _same_product(model, product_type, product_id):
+    """Condición de producto sobre una tabla con columnas product_type y product_id"""
+    return (model.product_type == product_type) & (model.product_id == product_id)
+
+
+def _lock_counter(product_type, product_id):
+    """
+    Crear el contador del producto si no existe y bloquear su fila
+
+    El ON CONFLICT DO UPDATE que no cambia nada bloquea la fila existente,
+    de modo que las sentencias siguientes de la transacción ven el stock y
+    las reservas ya confirmados por otros workers.
+    """
+    stmt = upsert_insert(ReservedStock).values(product_type=product_type, product_id=product_id, quantity=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_type', 'product_id'],
+        set_={'quantity': ReservedStock.quantity}
+    )
+    db.session.execute(stmt)
+
+
+def _decrement_counters(rows):
+    """Restar de los contadores las unidades de reservas ya borradas"""
+    totals = defaultdict(int)
+    for product_type, product_id, quantity in rows:
+        totals[(product_type, product_id)] += quantity
+    if not totals:
+        return
+
+    table = ReservedStock.__table__
+    stmt = (update(table)
+            .where(table.c.product_type == bindparam('pt'), table.c.product_id == bindparam('pid'))
+            .values(quantity=table.c.quantity - bindparam('q')))
+    # Siempre en el mismo orden para no interbloquearse con otro worker
+    db.session.execute(stmt, [
+        {'pt': product_type, 'pid': product_id, 'q': quantity}
+        for (product_type, product_id), quantity in sorted(totals.items())
+    ])
+
+
+def reserve(user_id, product_type, product_id, quantity):
+    """
+    Reservar unidades adicionales de un producto para un usuario
+
+    Suma la cantidad a la reserva del usuario, renueva su vencimiento y la
+    descuenta del stock disponible solo si alcanza. No hace commit; si
+    devuelve False el llamador debe hacer rollback.
+
+    Returns:
+        bool: True si se reservó la cantidad
+    """
+    product_model = PRODUCT_MODELS[product_type]
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['STOCK_HOLD_SECONDS'])
+
+    stmt = upsert_insert(StockHold).values(
+        user_id=user_id, product_type=product_type, product_id=product_id,
+        quantity=quantity, expires_at=expires_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'product_type', 'product_id'],
+        set_={'quantity': StockHold.quantity + stmt.excluded.quantity,
+              'expires_at': stmt.excluded.expires_at}
+    )
+    db.session.execute(stmt)
+
+    _lock_counter(product_type, product_id)
+    stock = select(product_model.stock).where(product_model.id == product_id).scalar_subquery()
+    result = db.session.execute(
+        update(ReservedStock)
+        .where(_same_product(ReservedStock, product_type, product_id),
+               ReservedStock.quantity + quantity <= stock)
+        .values(quantity=ReservedStock.quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve_many(user_id, quantities, partial=False):
+    """
+    Reservar a la vez unidades de varios productos para un usuario
+
+    Igual que reserve para cada línea, pero con una sentencia para las
+    reservas, otra para bloquear los contadores, una comprobación de stock
+    por tipo de producto y otra para sumar a los contadores. No hace commit.
+
+    Args:
+        quantities: dict {(product_type, product_id): cantidad}
+        partial: reservar las líneas que alcanzan aunque otras no; si es
+            False y alguna no alcanza, el llamador debe hacer rollback
+
+    Returns:
+        list: (product_type, product_id) sin stock disponible suficiente
+    """
+    keys = sorted(key for key, quantity in quantities.items() if quantity > 0)
+    if not keys:
+        return []
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['STOCK_HOLD_SECONDS'])
+
+    stmt = upsert_insert(StockHold)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'product_type', 'product_id'],
+        set_={'quantity': StockHold.quantity + stmt.excluded.quantity,
+              'expires_at': stmt.excluded.expires_at}
+    )
+    db.session.execute(stmt, [
+        {'user_id': user_id, 'product_type': product_type, 'product_id': product_id,
+         'quantity': quantities[(product_type, product_id)], 'expires_at': expires_at}
+        for product_type, product_id in keys
+    ])
+
+    # Crear y bloquear los contadores en orden; la comprobación siguiente ve
+    # las reservas y compras ya confirmadas por otros workers
+    stmt = upsert_insert(ReservedStock)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_type', 'product_id'],
+        set_={'quantity': ReservedStock.quantity}
+    )
+    db.session.execute(stmt, [
+        {'product_type': product_type, 'product_id': product_id, 'quantity': 0}
+        for product_type, product_id in keys
+    ])
+
+    available = {}
+    for product_type, product_model in PRODUCT_MODELS.items():
+        ids = [product_id for key_type, product_id in keys if key_type == product_type]
+        if ids:
+            available.update(((product_type, product_id), free) for product_id, free in db.session.execute(
+                select(product_model.id, product_model.stock - ReservedStock.quantity)
+                .join(ReservedStock, _same_product(ReservedStock, product_type, product_model.id))
+                .where(product_model.id.in_(ids))
+            ))
+    shortages = [key for key in keys if quantities[key] > available.get(key, 0)]
+    if shortages and not partial:
+        return shortages
+
+    if shortages:
+        # Deshacer en las reservas lo sumado para las líneas que no alcanzan
+        table = StockHold.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.product_type == bindparam('pt'),
+                   table.c.product_id == bindparam('pid'))
+            .values(quantity=table.c.quantity - bindparam('q')),
+            [{'pt': product_type, 'pid': product_id, 'q': quantities[(product_type, product_id)]}
+             for product_type, product_id in shortages]
+        )
+        db.session.execute(
+            delete(StockHold)
+            .where(StockHold.user_id == user_id, StockHold.quantity <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+    reserved = [key for key in keys if key not in shortages]
+    if reserved:
+        table = ReservedStock.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.product_type == bindparam('pt'), table.c.product_id == bindparam('pid'))
+            .values(quantity=table.c.quantity + bindparam('q')),
+            [{'pt': product_type, 'pid': product_id, 'q': quantities[(product_type, product_id)]}
+             for product_type, product_id in reserved]
+        )
+    return shortages
+
+
+def release(user_id, keys=None):
+    """
+    Liberar las reservas de un usuario
+
+    Args:
+        keys: iterable de (product_type, product_id); None libera todas
+
+    No hace commit.
+    """
+    stmt = delete(StockHold).where(StockHold.user_id == user_id)
+    if keys is not None:
+        keys = list(keys)
+        if not keys:
+            return
+        stmt = stmt.where(tuple_(StockHold.product_type, StockHold.product_id).in_(keys))
+    rows = db.session.execute(
+        stmt.returning(StockHold.product_type, StockHold.product_id, StockHold.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _decrement_counters(rows)
+
+
+def consume(product_type, product_id, quantity):
+    """
+    Descontar del stock unidades compradas sin tocar las reservadas por otros
+
+    Se usa en el checkout después de liberar las reservas del comprador. No
+    hace commit.
+
+    Returns:
+        bool: True si había stock disponible suficiente
+    """
+    product_model = PRODUCT_MODELS[product_type]
+    _lock_counter(product_type, product_id)
+    reserved = select(ReservedStock.quantity).where(
+        _same_product(ReservedStock, product_type, product_id)
+    ).scalar_subquery()
+    result = db.session.execute(
+        update(product_model)
+        .where(product_model.id == product_id,
+               product_model.stock - quantity >= func.coalesce(reserved, 0))
+        .values(stock=product_model.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def available_stock(product_type, product_id):
+    """
+    Stock de un producto descontando las unidades reservadas
+
+    Returns:
+        tuple: (stock, reservado, disponible), o None si el producto no existe
+    """
+    product_model = PRODUCT_MODELS[product_type]
+    row = db.session.execute(
+        select(product_model.stock, func.coalesce(ReservedStock.quantity, 0))
+        .outerjoin(ReservedStock, _same_product(ReservedStock, product_type, product_model.id))
+        .where(product_model.id == product_id)
+    ).first()
+    if row is None:
+        return None
+    stock, reserved = row
+    return stock, reserved, max(stock - reserved, 0)
+
+
+def sweep_expired(now=None):
+    """
+    Liberar en bloque las reservas vencidas y confirmar
+
+    DELETE ... RETURNING garantiza que cada reserva la libera un solo
+    worker aunque varios barran a la vez.
+
+    Returns:
+        int: número de reservas liberadas
+    """
+    rows = db.session.execute(
+        delete(StockHold)
+        .where(StockHold.expires_at < (now or datetime.utcnow()))
+        .returning(StockHold.product_type, StockHold.product_id, StockHold.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _decrement_counters(rows)
+    db.session.commit()
+    return len(rows)
+
+
+class StockSweeper:
+    """Hilo en segundo plano que libera las reservas vencidas"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar el barrido de reservas en la aplicación"""
+        app.config.setdefault('STOCK_HOLD_SECONDS', 900)
+        app.config.setdefault('STOCK_SWEEP_INTERVAL', 30)
+        app.extensions['stock_sweeper'] = self
+        app.before_request(self._ensure_started)
+        self.app = app
+
+    def _ensure_started(self):
+        """Arrancar el hilo en este proceso (los hilos no sobreviven a un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            thread = threading.Thread(target=self._loop, name='stock-sweeper', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _loop(self):
+        """Barrer periódicamente las reservas vencidas"""
+        while True:
+            time.sleep(self.app.config['STOCK_SWEEP_INTERVAL'])
+            try:
+                with self.app.app_context():
+                    released = sweep_expired()
+                    if released:
+                        self.app.logger.info(f'{released} reserva(s) de stock vencida(s) liberada(s)')
+            except Exception as e:
+                self.app.logger.error(f'Error al liberar reservas de stock vencidas: {e}')
+
+
+stock_sweeper = StockSweeper()
@@ -0,0 +1,179 @@
+"""
+Carrito anónimo guardado en la cookie de sesión firmada
+
+Los visitantes sin cuenta pueden armar un carrito sin que cada operación
+escriba en la base de datos. Las líneas se guardan en la sesión con un
+formato compacto y se fusionan con las filas de CartItem en un solo
+upsert cuando el usuario inicia sesión, sin superar el stock de cada
+producto.
+
+Formato: líneas separadas por '.', cada una con el código del tipo de
+producto, su id y, si es mayor que 1, '*cantidad'. Por ejemplo, 'g1*2.h7'
+son dos unidades del juego 1 y una del hardware 7.
+"""
+from datetime import datetime
+from flask import session
+from sqlalchemy import select, literal, func, union_all
+from database import db, upsert_insert
+
+SESSION_KEY = 'carrito'
+TYPE_CODES = {'game': 'g', 'hardware': 'h'}
+CODE_TYPES = {code: product_type for product_type, code in TYPE_CODES.items()}
+
+# Límites para que la cookie no supere el tamaño máximo de los navegadores
+MAX_LINES = 50
+MAX_QUANTITY = 99
+
+
+def _decode(raw):
+    """Convertir el valor guardado en la sesión en {(product_type, product_id): cantidad}"""
+    lines = {}
+    for entry in (raw or '').split('.'):
+        try:
+            code, rest = entry[0], entry[1:]
+            product_id, _, quantity = rest.partition('*')
+            lines[(CODE_TYPES[code], int(product_id))] = int(quantity) if quantity else 1
+        except (IndexError, KeyError, ValueError):
+            # Entradas corruptas se descartan
+            continue
+    return lines
+
+
+def _encode(lines):
+    """Convertir {(product_type, product_id): cantidad} al formato compacto de la sesión"""
+    entries = []
+    for (product_type, product_id), quantity in lines.items():
+        entry = f'{TYPE_CODES[product_type]}{product_id}'
+        if quantity > 1:
+            entry += f'*{quantity}'
+        entries.append(entry)
+    return '.'.join(entries)
+
+
+def get_lines():
+    """Líneas del carrito anónimo"""
+    return _decode(session.get(SESSION_KEY))
+
+
+def count():
+    """Número de líneas del carrito anónimo"""
+    return count_stored(session.get(SESSION_KEY))
+
+
+def count_stored(value):
+    """Número de líneas de un carrito anónimo tal como se guarda en la sesión"""
+    return len(_decode(value))
+
+
+def product_exists(product_type, product_id):
+    """Comprobar con una consulta por clave primaria que el producto existe"""
+    from models.database_models import Game, Hardware
+
+    model = Game if product_type == 'game' else Hardware
+    return db.session.execute(select(model.id).where(model.id == product_id)).first() is not None
+
+
+def add(product_type, product_id, quantity):
+    """
+    Agregar un producto al carrito anónimo sin escribir en la base de datos
+
+    Solo las líneas nuevas consultan que el producto exista, para que ids
+    inventados no cuenten en el contador del carrito.
+
+    Returns:
+        tuple: (cantidad de la línea, líneas en el carrito); None si se
+        superan los límites del carrito anónimo y False si el producto no
+        existe
+    """
+    lines = get_lines()
+    key = (product_type, product_id)
+    new_quantity = lines.get(key, 0) + quantity
+
+    if new_quantity > MAX_QUANTITY or (key not in lines and len(lines) >= MAX_LINES):
+        return None
+    if key not in lines and not product_exists(product_type, product_id):
+        return False
+
+    lines[key] = new_quantity
+    session[SESSION_KEY] = _encode(lines)
+    return new_quantity, len(lines)
+
+
+def clear():
+    """Vaciar el carrito anónimo"""
+    session.pop(SESSION_KEY, None)
+
+
+def get_items():
+    """
+    Líneas del carrito anónimo como objetos CartItem no persistidos
+
+    Los productos se cargan en bloque para que las plantillas del carrito
+    puedan usarlos igual que con un usuario registrado.
+    """
+    from models.database_models import CartItem
+
+    lines = get_lines()
+    products = CartItem.load_products(lines.keys())
+    items = []
+    for (product_type, product_id), quantity in lines.items():
+        item = CartItem(product_type=product_type, product_id=product_id, quantity=quantity)
+        item._product = products.get((product_type, product_id))
+        items.append(item)
+    return items
+
+
+def merge_into_user(user_id):
+    """
+    Fusionar el carrito anónimo con el carrito guardado del usuario
+
+    Lee en una consulta el stock de los productos que existen y la cantidad
+    que el usuario ya tenía de cada uno, y escribe todas las líneas con un
+    único INSERT ... ON CONFLICT DO UPDATE que suma las cantidades. Cada
+    línea fusionada queda limitada al stock del producto; si el usuario ya
+    tenía todo el stock, la línea no cambia. Las unidades agregadas se
+    reservan en bloque; las que no tienen stock disponible (reservado por
+    otros) se fusionan sin reserva, como las de un carrito cuya reserva
+    venció: el inicio de sesión no falla por ellas y el checkout vuelve a
+    verificar el stock. No hace commit.
+    """
+    from models.database_models import CartItem, Game, Hardware
+    from services import reservations
+
+    lines = get_lines()
+    if not lines:
+        return
+
+    selects = []
+    for product_type, model in (('game', Game), ('hardware', Hardware)):
+        ids = [product_id for ptype, product_id in lines if ptype == product_type]
+        if not ids:
+            continue
+        selects.append(
+            select(literal(product_type), model.id, model.stock, func.coalesce(CartItem.quantity, 0))
+            .outerjoin(CartItem, (CartItem.user_id == user_id) & (CartItem.product_type == product_type)
+                       & (CartItem.product_id == model.id))
+            .where(model.id.in_(ids))
+        )
+    source = selects[0] if len(selects) == 1 else union_all(*selects)
+
+    added = {}
+    for product_type, product_id, stock, current in db.session.execute(source):
+        quantity = min(lines[(product_type, product_id)], stock - current)
+        if quantity > 0:
+            added[(product_type, product_id)] = quantity
+
+    if added:
+        now = datetime.utcnow()
+        stmt = upsert_insert(CartItem).values([
+            {'user_id': user_id, 'product_type': product_type, 'product_id': product_id,
+             'quantity': quantity, 'added_at': now}
+            for (product_type, product_id), quantity in sorted(added.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_type', 'product_id'],
+            set_={'quantity': CartItem.quantity + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt)
+        reservations.reserve_many(user_id, added, partial=True)
+    clear()
@@ -0,0 +1,147 @@
+"""
+Archivos estáticos minificados, con huella y precomprimidos
+
+build_static.py (al construir la imagen) copia static/ a static/dist/:
+minifica CSS y JS, añade al nombre de cada archivo una huella de su
+contenido (css/style.css -> css/style.1a2b3c4d5e6f.css), escribe junto a
+cada uno sus versiones .gz y .br y guarda la correspondencia en
+static/dist/manifest.json.
+
+Con el manifiesto presente, StaticAssets:
+
+- reescribe url_for('static', filename='css/style.css') al archivo con
+  huella;
+- sirve static/dist/ con WhiteNoise antes de llegar a Flask (sin sesión,
+  usuario ni consultas), eligiendo la versión brotli o gzip según
+  Accept-Encoding y con Cache-Control immutable de un año: un cambio en
+  el archivo cambia su nombre, así que los navegadores nunca lo vuelven a
+  pedir.
+
+Sin manifiesto (desarrollo) las URLs no cambian y Flask sirve static/ como
+siempre; fuera del modo debug se registra un aviso, porque en producción
+significa que la build no llegó a la imagen o quedó oculta por un volumen.
+Tras editar CSS o JS hay que volver a ejecutar build_static.py o
+borrar static/dist/.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+from whitenoise import WhiteNoise
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Directorios de static/ que no forman parte de la build (subidas de usuarios y la propia salida)
+EXCLUDED_DIRS = ('uploads', DIST_DIR)
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+def _minify(relative_path, data):
+    """Contenido minificado de un CSS o JS (el resto de archivos no cambia)"""
+    if relative_path.endswith('.css'):
+        import rcssmin
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8')
+    if relative_path.endswith('.js'):
+        import rjsmin
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def hashed_name(relative_path, data):
+    """Nombre con la huella del contenido: css/style.css -> css/style.<12 hex>.css"""
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def build(static_folder, on_file=None):
+    """
+    Generar static/dist/ a partir de static/
+
+    Args:
+        static_folder: directorio static de la aplicación
+        on_file: función llamada con (ruta original, ruta con huella, bytes originales, bytes minificados)
+
+    Returns:
+        dict: manifiesto {ruta original: ruta con huella}, relativas a static/dist/
+    """
+    from whitenoise.compress import Compressor
+
+    output = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(output, ignore_errors=True)
+    compressor = Compressor(quiet=True)
+    manifest = {}
+
+    for directory, subdirs, files in os.walk(static_folder):
+        if directory == static_folder:
+            subdirs[:] = [d for d in subdirs if d not in EXCLUDED_DIRS]
+        for filename in sorted(files):
+            source = os.path.join(directory, filename)
+            relative_path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                original = f.read()
+            data = _minify(relative_path, original)
+            target_name = hashed_name(relative_path, data)
+
+            target = os.path.join(output, target_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if compressor.should_compress(target):
+                # Escribe .br y .gz solo si reducen el archivo de verdad
+                list(compressor.compress(target))
+
+            manifest[relative_path] = target_name
+            if on_file is not None:
+                on_file(relative_path, target_name, len(original), len(data))
+
+    with open(os.path.join(output, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _immutable(path, url):
+    """Los archivos con huella nunca cambian de contenido"""
+    return bool(HASHED_NAME.search(url))
+
+
+class StaticAssets:
+    """URLs con huella para url_for('static') y servidor WhiteNoise de static/dist/"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Cargar el manifiesto y servir los archivos generados, si existe"""
+        dist = os.path.join(app.static_folder, DIST_DIR)
+        app.config.setdefault('STATIC_MANIFEST', os.path.join(dist, MANIFEST_NAME))
+        app.extensions['static_assets'] = self
+        self.app = app
+
+        try:
+            with open(app.config['STATIC_MANIFEST'], encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+            if not app.debug and not app.testing:
+                app.logger.warning(f"No existe {app.config['STATIC_MANIFEST']}: los archivos estáticos se sirven "
+                                   'sin minificar, sin huella ni compresión (ejecutar python build_static.py)')
+            return
+
+        app.url_defaults(self._fingerprint_url)
+        app.wsgi_app = WhiteNoise(app.wsgi_app, root=os.path.dirname(app.config['STATIC_MANIFEST']),
+                                  prefix=f'{app.static_url_path}/{DIST_DIR}/',
+                                  immutable_file_test=_immutable)
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint != 'static':
+            return
+        hashed = self.manifest.get(values.get('filename'))
+        if hashed is not None:
+            values['filename'] = f'{DIST_DIR}/{hashed}'
+
+
+static_assets = StaticAssets()
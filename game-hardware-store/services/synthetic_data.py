@@ -0,0 +1,379 @@
+"""
+Generador de datos sintéticos para pruebas de carga
+
+Produce usuarios, juegos, hardware, carritos y órdenes a escala
+configurable (millones de filas) con valores plausibles: los requisitos de
+los juegos y los modelos de hardware se construyen a partir de las tablas
+de rendimiento de Compatibility, así que las comprobaciones de
+compatibilidad recorren los mismos caminos que con datos reales.
+
+Las filas se generan por lotes y se escriben con COPY en PostgreSQL y con
+executemany en SQLite, confirmando cada lote, de modo que la memoria no
+depende del volumen generado. Todos los usuarios generados comparten la
+contraseña SYNTHETIC_PASSWORD.
+"""
+import csv
+import io
+import json
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from database import db
+from models.compatibility import Compatibility
+from models.database_models import User, Game, Hardware, CompatibilityScore, CartItem, Order, OrderItem
+from services.passwords import password_hasher
+
+SYNTHETIC_PASSWORD = 'Passw0rd!'
+DEFAULT_BATCH_SIZE = 10000
+
+GENEROS = ['RPG', 'Acción', 'FPS', 'Aventura', 'Estrategia', 'Deportes', 'Carreras', 'Simulación', 'Terror', 'Indie']
+DESARROLLADORES = ['CD Projekt Red', 'Rockstar Games', 'Valve', 'FromSoftware', 'Ubisoft', 'Capcom',
+                   'Bethesda', 'Square Enix', 'Blizzard', 'Naughty Dog', 'Remedy', 'Larian Studios']
+PALABRAS = ['Shadow', 'Legends', 'Empire', 'Crimson', 'Night', 'Storm', 'Galaxy', 'Iron', 'Lost', 'Eternal',
+            'Dragon', 'Neon', 'Frontier', 'Quantum', 'Silent', 'Rising', 'Chronicles', 'Kingdom', 'Rogue', 'Zero']
+MARCAS_RAM = ['Corsair', 'Kingston', 'G.Skill', 'Crucial', 'TeamGroup']
+MARCAS_MOTHERBOARD = ['ASUS', 'MSI', 'Gigabyte', 'ASRock']
+CHIPSETS = [('Z790', 'LGA 1700'), ('B760', 'LGA 1700'), ('B550', 'AM4'), ('X670', 'AM5'), ('B650', 'AM5')]
+MARCAS = {'intel': 'Intel', 'amd': 'AMD', 'nvidia': 'NVIDIA'}
+
+
+def _cpu_catalog():
+    """(marca, modelo, puntuación) de las series de CPU que conoce Compatibility"""
+    catalog = []
+    for marca, series in Compatibility.CPU_PERFORMANCE.items():
+        for key, score in series.items():
+            catalog.append((MARCAS[marca], key, score))
+    return catalog
+
+
+def _gpu_catalog():
+    """(marca, modelo, puntuación) de las GPU que conoce Compatibility"""
+    catalog = []
+    for marca, series in Compatibility.GPU_PERFORMANCE.items():
+        for key, score in series.items():
+            catalog.append((MARCAS[marca], key, score))
+    return catalog
+
+
+CPUS = _cpu_catalog()
+GPUS = _gpu_catalog()
+
+
+def cpu_model(rng, key):
+    """Nombre de modelo de CPU que Compatibility asocia a la serie indicada"""
+    if key.startswith('i'):
+        return f'Core {key}-{rng.randint(8, 14)}{rng.randint(100, 999)}{rng.choice(["", "K", "F", "KF"])}'
+    return f'{key.title()} {rng.randint(1, 9)}{rng.randint(100, 999)}{rng.choice(["", "X", "G"])}'
+
+
+def gpu_model(rng, key):
+    """Nombre de modelo de GPU que Compatibility asocia a la serie indicada"""
+    return f'{key.upper()}{rng.choice(["", " Ti", " SUPER", " XT"])}'
+
+
+def _requirement_pair(rng, catalog, model_name, prefix):
+    """Requisito mínimo y recomendado (de mayor o igual puntuación) de CPU o GPU"""
+    marca, key, score = rng.choice(catalog)
+    better = [entry for entry in catalog if entry[2] >= score]
+    rec_marca, rec_key, _ = rng.choice(better)
+    return (f'{marca} {prefix.get(marca, "")}{model_name(rng, key)}',
+            f'{rec_marca} {prefix.get(rec_marca, "")}{model_name(rng, rec_key)}')
+
+
+def game_row(rng, game_id, now):
+    """Fila de un juego sintético y sus puntuaciones de compatibilidad"""
+    cpu_min, cpu_rec = _requirement_pair(rng, CPUS, cpu_model, {})
+    gpu_min, gpu_rec = _requirement_pair(rng, GPUS, gpu_model, {'NVIDIA': 'GeForce ', 'AMD': 'Radeon '})
+    ram_min = rng.choice([4, 6, 8, 12, 16])
+    ram_rec = rng.choice([ram for ram in (8, 12, 16, 32) if ram >= ram_min])
+    almacenamiento = f'{rng.randrange(10, 150, 5)} GB'
+
+    requisitos_minimos = {'CPU': cpu_min, 'RAM': f'{ram_min} GB', 'GPU': gpu_min, 'Almacenamiento': almacenamiento}
+    requisitos_recomendados = {'CPU': cpu_rec, 'RAM': f'{ram_rec} GB', 'GPU': gpu_rec, 'Almacenamiento': almacenamiento}
+    nombre = f'{rng.choice(PALABRAS)} {rng.choice(PALABRAS)} {game_id}'
+    row = {
+        'id': game_id,
+        'nombre': nombre,
+        'descripcion': f'{nombre}: una aventura de {rng.choice(GENEROS).lower()} generada para pruebas de carga.',
+        'precio': round(rng.choice([0, 9.99, 19.99, 29.99, 39.99, 49.99, 59.99, 69.99]), 2),
+        'imagen': None,
+        'genero': rng.choice(GENEROS),
+        'desarrollador': rng.choice(DESARROLLADORES),
+        'fecha_lanzamiento': now - timedelta(days=rng.randint(0, 365 * 15)),
+        'requisitos_minimos': json.dumps(requisitos_minimos),
+        'requisitos_recomendados': json.dumps(requisitos_recomendados),
+        'stock': rng.randint(0, 500),
+        'created_at': now,
+        'updated_at': now,
+    }
+    return row, {'product_type': 'game', 'product_id': game_id,
+                 **Compatibility.puntuaciones_juego(requisitos_minimos)}
+
+
+def hardware_row(rng, hardware_id, now):
+    """Fila de un componente sintético y sus puntuaciones de compatibilidad"""
+    tipo = rng.choice(['CPU', 'GPU', 'RAM', 'Motherboard'])
+    if tipo == 'CPU':
+        marca, key, score = rng.choice(CPUS)
+        modelo = cpu_model(rng, key)
+        nucleos = rng.choice([4, 6, 8, 12, 16])
+        especificaciones = {'nucleos': nucleos, 'hilos': nucleos * 2,
+                            'frecuencia_boost': f'{rng.uniform(3.5, 5.8):.1f} GHz', 'tdp': f'{rng.choice([65, 105, 125])}W'}
+        precio = 40 + score * rng.uniform(3, 6)
+    elif tipo == 'GPU':
+        marca, key, score = rng.choice(GPUS)
+        modelo = gpu_model(rng, key)
+        especificaciones = {'memoria': f'{rng.choice([4, 6, 8, 12, 16, 24])} GB GDDR6',
+                            'consumo': f'{rng.randrange(75, 450, 5)}W'}
+        precio = 80 + score * rng.uniform(6, 16)
+    elif tipo == 'RAM':
+        marca = rng.choice(MARCAS_RAM)
+        capacidad = rng.choice([8, 16, 32, 64])
+        ddr = rng.choice(['DDR4', 'DDR5'])
+        modelo = f'{capacidad}GB {ddr}'
+        especificaciones = {'capacidad': f'{capacidad} GB', 'tipo': ddr,
+                            'frecuencia': f'{rng.choice([3200, 3600, 5600, 6000])} MHz'}
+        precio = capacidad * rng.uniform(2.5, 5)
+    else:
+        marca = rng.choice(MARCAS_MOTHERBOARD)
+        chipset, socket = rng.choice(CHIPSETS)
+        modelo = f'{chipset} {rng.choice(["Gaming", "Pro", "Tomahawk", "Aorus", "Prime"])} {rng.choice(["WiFi", "Plus", "Elite"])}'
+        especificaciones = {'socket': socket, 'chipset': chipset, 'formato': rng.choice(['ATX', 'Micro-ATX', 'Mini-ITX'])}
+        precio = rng.uniform(100, 450)
+
+    row = {
+        'id': hardware_id,
+        'tipo': tipo,
+        'marca': marca,
+        'modelo': modelo,
+        'precio': round(precio, 2),
+        'descripcion': f'{tipo} {marca} {modelo} generado para pruebas de carga.',
+        'imagen': None,
+        'especificaciones': json.dumps(especificaciones),
+        'stock': rng.randint(0, 200),
+        'created_at': now,
+        'updated_at': now,
+    }
+    return row, {'product_type': 'hardware', 'product_id': hardware_id,
+                 **Compatibility.puntuaciones_hardware(tipo, marca, modelo, especificaciones)}
+
+
+class BulkWriter:
+    """Escritura de filas en bloque: COPY en PostgreSQL y executemany en el resto"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.postgres = db.engine.dialect.name == 'postgresql'
+        self.written = {}
+
+    def write(self, table, rows):
+        """Escribir un lote de filas (dicts con las mismas claves) y confirmarlo"""
+        if not rows:
+            return
+        connection = db.session.connection()
+        if self.postgres:
+            self._copy(connection, table, rows)
+        else:
+            connection.execute(table.insert(), rows)
+        db.session.commit()
+        self.written[table.name] = self.written.get(table.name, 0) + len(rows)
+        if self.on_progress:
+            self.on_progress(table.name, self.written[table.name])
+
+    def write_all(self, table, rows):
+        """Escribir las filas de un iterable por lotes"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.write(table, batch)
+                batch = []
+        self.write(table, batch)
+
+    @staticmethod
+    def _copy(connection, table, rows):
+        """COPY ... FROM STDIN en formato CSV, con \\N como NULL para distinguirlo de la cadena vacía"""
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+            )
+        finally:
+            cursor.close()
+
+    def reset_sequences(self, tables):
+        """Ajustar las secuencias de PostgreSQL tras insertar ids explícitos"""
+        if not self.postgres:
+            return
+        for table in tables:
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+            ))
+        db.session.commit()
+
+
+def _next_id(model):
+    """Primer id libre de una tabla"""
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def generate(users=0, games=0, hardware=0, carts=0, order_items=0, seed=0,
+             batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+    """
+    Generar datos sintéticos
+
+    Args:
+        users, games, hardware: filas nuevas de cada tabla
+        carts: usuarios nuevos con carrito (1 a 4 líneas cada uno)
+        order_items: items de orden a generar, repartidos en órdenes de 1 a 5 items
+        seed: semilla para que dos ejecuciones generen los mismos datos
+        on_progress: función llamada con (tabla, filas escritas) tras cada lote
+
+    Returns:
+        dict: filas escritas por tabla
+    """
+    rng = random.Random(seed)
+    writer = BulkWriter(batch_size, on_progress)
+    now = datetime.utcnow()
+
+    # Usuarios: un solo hash para todos, calcular millones sería prohibitivo
+    first_user = _next_id(User)
+    password_hash = password_hasher.hash(SYNTHETIC_PASSWORD)
+    writer.write_all(User.__table__, (
+        {'id': user_id, 'username': f'sintetico{user_id}', 'email': f'sintetico{user_id}@example.com',
+         'password_hash': password_hash, 'created_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)),
+         'is_active': True, 'is_admin': False}
+        for user_id in range(first_user, first_user + users)
+    ))
+
+    # Productos y sus puntuaciones de compatibilidad
+    for model, count, make_row in ((Game, games, game_row), (Hardware, hardware, hardware_row)):
+        first_id = _next_id(model)
+        rows, scores = [], []
+        for product_id in range(first_id, first_id + count):
+            row, score = make_row(rng, product_id, now)
+            rows.append(row)
+            scores.append(score)
+            if len(rows) >= batch_size:
+                writer.write(model.__table__, rows)
+                writer.write(CompatibilityScore.__table__, scores)
+                rows, scores = [], []
+        writer.write(model.__table__, rows)
+        writer.write(CompatibilityScore.__table__, scores)
+
+    # Nombres y precios de todos los productos, para los carritos y las órdenes
+    catalog = {
+        'game': db.session.execute(select(Game.id, Game.nombre, Game.precio)).all(),
+        'hardware': [(product_id, f'{marca} {modelo}', precio) for product_id, marca, modelo, precio
+                     in db.session.execute(select(Hardware.id, Hardware.marca, Hardware.modelo, Hardware.precio))],
+    }
+    product_types = [product_type for product_type in catalog if catalog[product_type]]
+    total_products = sum(len(products) for products in catalog.values())
+
+    def pick_products(count):
+        """Productos distintos elegidos al azar: [(product_type, id, nombre, precio)]"""
+        count = min(count, total_products)
+        chosen = {}
+        while len(chosen) < count:
+            product_type = rng.choice(product_types)
+            product_id, nombre, precio = rng.choice(catalog[product_type])
+            chosen[(product_type, product_id)] = (product_type, product_id, nombre, precio)
+        return list(chosen.values())
+
+    if product_types and users and carts:
+        # Carritos solo para usuarios nuevos, que no tienen líneas previas
+        cart_users = rng.sample(range(first_user, first_user + users), min(carts, users))
+        writer.write_all(CartItem.__table__, (
+            {'user_id': user_id, 'product_type': product_type, 'product_id': product_id,
+             'quantity': rng.randint(1, 3), 'added_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 7))}
+            for user_id in cart_users
+            for product_type, product_id, _, _ in pick_products(rng.randint(1, 4))
+        ))
+
+    last_user = _next_id(User) - 1
+    if product_types and last_user and order_items:
+        order_id = _next_id(Order)
+        item_id = _next_id(OrderItem)
+        orders, items = [], []
+        generated = 0
+        while generated < order_items:
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+            total = 0.0
+            for product_type, product_id, nombre, precio in pick_products(min(rng.randint(1, 5), order_items - generated)):
+                quantity = rng.choice([1, 1, 1, 2, 3])
+                items.append({'id': item_id, 'order_id': order_id, 'product_type': product_type,
+                              'product_id': product_id, 'product_name': nombre,
+                              'quantity': quantity, 'price': precio})
+                total += precio * quantity
+                item_id += 1
+                generated += 1
+            orders.append({'id': order_id, 'user_id': rng.randint(1, last_user), 'total': round(total, 2),
+                           'status': 'completed' if rng.random() < 0.95 else 'cancelled',
+                           'created_at': created_at, 'updated_at': created_at})
+            order_id += 1
+
+            if len(items) >= batch_size:
+                writer.write(Order.__table__, orders)
+                writer.write(OrderItem.__table__, items)
+                orders, items = [], []
+        writer.write(Order.__table__, orders)
+        writer.write(OrderItem.__table__, items)
+
+    writer.reset_sequences([User.__table__, Game.__table__, Hardware.__table__, Order.__table__, OrderItem.__table__])
+    return writer.written
+
+
+# Peticiones de una sesión de compra típica y su peso relativo
+TRAFFIC_MIX = [
+    ('index', 10), ('tienda', 8), ('juego', 25), ('hardware', 15), ('buscar', 12),
+    ('api_buscar_hardware', 8), ('api_carrito_count', 10), ('agregar', 7), ('compatibilidad', 5),
+]
+
+
+def generate_traffic(count, seed=0):
+    """
+    Generar una secuencia de peticiones con la mezcla de una tienda real
+
+    Usa ids de productos existentes en la base de datos.
+
+    Returns:
+        list: dicts con method, path y, si aplica, json
+    """
+    rng = random.Random(seed)
+    game_ids = db.session.execute(select(Game.id)).scalars().all()
+    hardware_ids = db.session.execute(select(Hardware.id)).scalars().all()
+    kinds, weights = zip(*TRAFFIC_MIX)
+
+    requests = []
+    for kind in rng.choices(kinds, weights=weights, k=count):
+        if kind == 'index':
+            request = {'method': 'GET', 'path': '/'}
+        elif kind == 'tienda':
+            request = {'method': 'GET', 'path': '/tienda'}
+        elif kind == 'juego' and game_ids:
+            request = {'method': 'GET', 'path': f'/juego/{rng.choice(game_ids)}'}
+        elif kind == 'hardware' and hardware_ids:
+            request = {'method': 'GET', 'path': f'/hardware/{rng.choice(hardware_ids)}'}
+        elif kind == 'buscar':
+            request = {'method': 'GET', 'path': f'/buscar?q={rng.choice(PALABRAS).lower()}'}
+        elif kind == 'api_buscar_hardware':
+            request = {'method': 'GET', 'path': f'/api/hardware/buscar?tipo={rng.choice(["CPU", "GPU", "RAM"])}'}
+        elif kind == 'agregar' and game_ids:
+            request = {'method': 'POST', 'path': '/carrito/agregar',
+                       'json': {'product_type': 'game', 'product_id': rng.choice(game_ids), 'quantity': 1}}
+        elif kind == 'compatibilidad' and game_ids and hardware_ids:
+            request = {'method': 'POST', 'path': '/verificar-setup-completo',
+                       'json': {'juegos': rng.sample(game_ids, min(2, len(game_ids))),
+                                'componentes': rng.sample(hardware_ids, min(3, len(hardware_ids)))}}
+        else:
+            request = {'method': 'GET', 'path': '/api/carrito/count'}
+        requests.append(request)
+    return requests
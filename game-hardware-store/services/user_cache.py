@@ -0,0 +1,176 @@
+"""
+Caché de identidad de los usuarios autenticados
+
+Flask-Login reconstruye current_user en cada petición. En lugar de leer la
+fila de users cada vez, se guarda en memoria de cada proceso una copia
+inmutable y reducida del usuario (UserSnapshot) con lo que usan las
+plantillas y los decoradores: id, username, email, is_admin, is_active y
+la versión del hash de contraseña.
+
+Las vistas que modifican un usuario llaman a invalidate() después del
+commit. La invalidación se comparte entre los workers mediante un archivo
+por usuario en USER_CACHE_DIR: cada escritura lo reemplaza, y cada proceso
+compara su inodo y su fecha de modificación con los de la copia en caché,
+lo que cuesta un stat en lugar de una consulta. USER_CACHE_TTL acota
+además la antigüedad de las copias cuando los workers no comparten disco.
+
+El identificador de sesión (User.get_id) incluye la versión del hash de
+contraseña: al cambiar la contraseña, las demás sesiones del usuario y sus
+cookies de "recordarme" dejan de ser válidas. Cuando el hash se recalcula
+con la misma contraseña (cambio de política, services.passwords), la
+versión anterior se guarda en el archivo de invalidación y sus sesiones
+siguen valiendo hasta el próximo cambio de contraseña.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from database import db
+from models.database_models import User
+
+# Versiones anteriores de la contraseña aceptadas como mucho por usuario
+MAX_ALIASES = 4
+
+
+class UserSnapshot(NamedTuple):
+    """Copia inmutable de un usuario, usada como current_user"""
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+    is_active: bool
+    password_version: str
+    # Estado del archivo de invalidación y momento de la lectura
+    epoch: Optional[tuple]
+    loaded_at: float
+
+    @classmethod
+    def from_user(cls, user, epoch):
+        return cls(user.id, user.username, user.email, bool(user.is_admin), bool(user.is_active),
+                   user.password_version, epoch, time.monotonic())
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return f'{self.id}:{self.password_version}'
+
+
+class UserCache:
+    """Copias de los usuarios autenticados en memoria del proceso"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registrar la caché en la aplicación"""
+        app.config.setdefault('USER_CACHE_DIR', os.path.join(app.instance_path, 'user_epochs'))
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        app.config.setdefault('USER_CACHE_TTL', 300)
+        app.extensions['user_cache'] = self
+        self.app = app
+        # Las copias de otra aplicación pueden venir de otra base de datos
+        with self._lock:
+            self._snapshots.clear()
+
+    def _epoch_path(self, user_id):
+        return os.path.join(self.app.config['USER_CACHE_DIR'], str(user_id))
+
+    def _epoch(self, user_id):
+        """Inodo y fecha del archivo de invalidación del usuario, o None si nunca se invalidó"""
+        try:
+            stat = os.stat(self._epoch_path(user_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _aliases(self, user_id):
+        """Versiones de contraseña anteriores que siguen aceptándose"""
+        try:
+            with open(self._epoch_path(user_id)) as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def load(self, token):
+        """
+        Obtener el usuario de un identificador de sesión ('id:versión' o 'id')
+
+        Returns:
+            UserSnapshot o None si el usuario no existe, está desactivado o
+            cambió su contraseña después de iniciar esta sesión
+        """
+        user_id, _, version = str(token).partition(':')
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            return None
+
+        # El estado del archivo se lee antes que la fila: una invalidación
+        # posterior cambia el estado y fuerza otra lectura en la próxima petición
+        epoch = self._epoch(user_id)
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+        if (snapshot is None or snapshot.epoch != epoch
+                or time.monotonic() - snapshot.loaded_at > self.app.config['USER_CACHE_TTL']):
+            user = db.session.get(User, user_id)
+            if user is None:
+                self.forget(user_id)
+                return None
+            snapshot = UserSnapshot.from_user(user, epoch)
+            with self._lock:
+                self._snapshots[user_id] = snapshot
+                self._snapshots.move_to_end(user_id)
+                while len(self._snapshots) > self.app.config['USER_CACHE_SIZE']:
+                    self._snapshots.popitem(last=False)
+
+        # Las sesiones anteriores a las versiones en el identificador ('id') siguen valiendo
+        if version and not self.version_valid(user_id, version, snapshot.password_version):
+            return None
+        if not snapshot.is_active:
+            return None
+        return snapshot
+
+    def version_valid(self, user_id, version, password_version):
+        """True si una sesión con esa versión de contraseña sigue valiendo (la actual o una anterior aceptada)"""
+        return version == password_version or version in self._aliases(user_id)
+
+    def forget(self, user_id):
+        """Descartar la copia del usuario en este proceso"""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def invalidate(self, user_id, password_changed=False, keep_version=None):
+        """
+        Descartar la copia del usuario en todos los workers (llamar después del commit)
+
+        Args:
+            password_changed: la contraseña cambió; ninguna versión anterior sigue valiendo
+            keep_version: versión anterior cuyas sesiones se mantienen (hash
+                recalculado con la misma contraseña)
+        """
+        self.forget(user_id)
+        aliases = [] if password_changed else self._aliases(user_id)
+        if keep_version and keep_version not in aliases:
+            aliases = aliases[-(MAX_ALIASES - 1):] + [keep_version]
+        directory = self.app.config['USER_CACHE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        # Reemplazar el archivo cambia su inodo aunque la fecha no avance
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(aliases))
+        os.replace(tmp_path, self._epoch_path(user_id))
+
+
+user_cache = UserCache()
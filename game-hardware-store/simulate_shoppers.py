@@ -0,0 +1,206 @@
+"""
+Script para simular compradores concurrentes y verificar las reservas de stock
+
+Crea una base de datos SQLite temporal con un producto de stock limitado y
+lanza varios procesos (como los workers de gunicorn), cada uno con varios
+compradores que agregan al carrito, compran, vacían el carrito o lo
+abandonan hasta que sus reservas vencen. Al final comprueba que no se
+vendió más de lo que había y que el contador de unidades reservadas
+coincide con las reservas. Termina con código 1 si algo no cuadra.
+
+tests/test_reservations.py ejecuta la misma simulación con hilos.
+
+Uso:
+    python simulate_shoppers.py [--workers 4] [--shoppers 10] [--stock 40]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+# La crea main(); los procesos de los compradores la heredan con fork
+app = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulación de compradores concurrentes')
+    parser.add_argument('--workers', type=int, default=4, help='Procesos simulando workers')
+    parser.add_argument('--shoppers', type=int, default=10, help='Compradores por proceso')
+    parser.add_argument('--rounds', type=int, default=5, help='Acciones por comprador')
+    parser.add_argument('--stock', type=int, default=40, help='Stock inicial del producto')
+    parser.add_argument('--hold-seconds', type=int, default=2, help='Duración de las reservas')
+    return parser.parse_args()
+
+
+def create_simulation(workdir, stock, shoppers, hold_seconds, sweep_interval=1):
+    """
+    Crear la aplicación con una base SQLite en workdir, el producto y los compradores
+
+    Returns:
+        tuple: (app, id del producto, ids de los compradores)
+    """
+    from app import create_app
+    from database import db
+    from models.database_models import User, Game
+
+    simulation_app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "tienda.db")}',
+        'STOCK_HOLD_SECONDS': hold_seconds,
+        'STOCK_SWEEP_INTERVAL': sweep_interval,
+        'WTF_CSRF_ENABLED': False,
+        'INVOICE_QUEUE_PATH': os.path.join(workdir, 'invoice_jobs.db'),
+        'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoices'),
+        'USER_CACHE_DIR': os.path.join(workdir, 'user_epochs'),
+        'RATE_LIMIT_PATH': os.path.join(workdir, 'rate_limits.db'),
+    })
+
+    with simulation_app.app_context():
+        db.create_all()
+        game = Game(nombre='Lanzamiento', descripcion='Producto de la simulación', precio=59.99,
+                    genero='Acción', stock=stock)
+        db.session.add(game)
+        for i in range(shoppers):
+            db.session.add(User(username=f'comprador{i}', email=f'comprador{i}@example.com',
+                                password_hash='-'))
+        db.session.commit()
+        product_id = game.id
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+        # Cada proceso hijo debe abrir sus propias conexiones
+        db.engine.dispose()
+    return simulation_app, product_id, user_ids
+
+
+def shop(args):
+    """Ejecutar los compradores de un proceso y devolver sus estadísticas"""
+    return run_shoppers(app, *args)
+
+
+def run_shoppers(app, user_ids, product_id, rounds, seed):
+    """Ejecutar varios compradores con un cliente de pruebas cada uno y devolver sus estadísticas"""
+    rng = random.Random(seed)
+    stats = {'agregados': 0, 'rechazados': 0, 'compras': 0, 'compras_fallidas': 0, 'errores': 0}
+
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        clients.append(client)
+
+    for _ in range(rounds):
+        for client in clients:
+            response = client.post('/carrito/agregar', json={
+                'product_type': 'game', 'product_id': product_id, 'quantity': rng.randint(1, 3)
+            })
+            if response.status_code == 200:
+                stats['agregados'] += 1
+            elif response.status_code == 400:
+                stats['rechazados'] += 1
+            else:
+                stats['errores'] += 1
+
+            action = rng.random()
+            if action < 0.4:
+                response = client.post('/carrito/checkout')
+                if response.status_code != 302:
+                    stats['errores'] += 1
+                elif '/orden/' in response.headers['Location']:
+                    stats['compras'] += 1
+                else:
+                    stats['compras_fallidas'] += 1
+            elif action < 0.5:
+                if client.post('/carrito/vaciar').status_code != 302:
+                    stats['errores'] += 1
+            # El resto abandona el carrito y deja que la reserva venza
+            time.sleep(rng.random() * 0.05)
+    return stats
+
+
+def reserved_totals():
+    """Unidades en las reservas y en los contadores (dentro de un contexto de aplicación)"""
+    from database import db
+    from sqlalchemy import func
+    from models.database_models import StockHold, ReservedStock
+
+    held = db.session.query(func.coalesce(func.sum(StockHold.quantity), 0)).scalar()
+    counter = db.session.query(func.coalesce(func.sum(ReservedStock.quantity), 0)).scalar()
+    return held, counter
+
+
+def stock_and_sold(product_id):
+    """Stock restante y unidades vendidas del producto (dentro de un contexto de aplicación)"""
+    from database import db
+    from sqlalchemy import func
+    from models.database_models import Game, OrderItem
+
+    stock = db.session.get(Game, product_id).stock
+    sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(
+        OrderItem.product_id == product_id).scalar()
+    return stock, sold
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='simulacion_')
+
+    global app
+    from services.reservations import sweep_expired
+
+    total_shoppers = args.workers * args.shoppers
+    app, product_id, user_ids = create_simulation(workdir, args.stock, total_shoppers, args.hold_seconds)
+
+    jobs = [(user_ids[i::args.workers], product_id, args.rounds, i) for i in range(args.workers)]
+    started = time.perf_counter()
+    with get_context('fork').Pool(args.workers) as pool:
+        results = pool.map(shop, jobs)
+    elapsed = time.perf_counter() - started
+
+    stats = {}
+    for result in results:
+        for name, value in result.items():
+            stats[name] = stats.get(name, 0) + value
+
+    problems = []
+    with app.app_context():
+        def check_counters(moment):
+            held, counter = reserved_totals()
+            print(f'Reservado {moment}: {held} en reservas, {counter} en el contador')
+            if held != counter:
+                problems.append(f'El contador ({counter}) no coincide con las reservas ({held}) {moment}')
+            return held
+
+        check_counters('al terminar')
+
+        # Esperar a que venzan todas las reservas y liberarlas
+        time.sleep(args.hold_seconds + 1)
+        sweep_expired()
+        if check_counters('tras el barrido'):
+            problems.append('Quedaron reservas sin liberar tras el barrido')
+
+        stock, sold = stock_and_sold(product_id)
+
+    print(f'\n{total_shoppers} compradores en {args.workers} procesos, {elapsed:.1f} s')
+    for name, value in stats.items():
+        print(f'  {name}: {value}')
+    print(f'Stock inicial {args.stock}, vendido {sold}, restante {stock}')
+
+    if stock < 0:
+        problems.append(f'Stock negativo: {stock}')
+    if sold + stock != args.stock:
+        problems.append(f'Vendido ({sold}) + restante ({stock}) no es el stock inicial ({args.stock})')
+    if stats['errores']:
+        problems.append(f'{stats["errores"]} respuesta(s) inesperada(s)')
+
+    for problem in problems:
+        print(f'❌ {problem}')
+    if not problems:
+        print('✅ Sin sobreventa y contadores consistentes')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,8 @@ document.addEventListener('DOMContentLoaded', function() {
         initializeStorePage();
     } else if (currentPath.startsWith('/juego/')) {
         initializeGameDetailPage();
+    } else if (currentPath === '/carrito') {
+        initializeCartPage();
     }
 });
 
@@ -179,6 +181,125 @@ function initializeShoppingCart() {
     }
 }
 
+/**
+ * Página del carrito: agrupa los cambios de cantidad y las eliminaciones
+ * y los envía en una sola petición PATCH /api/carrito
+ */
+function initializeCartPage() {
+    // Solo los carritos guardados (usuario con sesión) tienen formularios editables
+    const rows = document.querySelectorAll('.cart-item-row[data-product-id]');
+    if (rows.length === 0 || !document.querySelector('.quantity-form')) return;
+
+    const csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
+    let pendingChanges = [];
+    const scheduleSend = GameTechUtils.debounce(sendChanges, 400);
+
+    rows.forEach(row => {
+        const line = {
+            product_type: row.getAttribute('data-product-type'),
+            product_id: parseInt(row.getAttribute('data-product-id'), 10)
+        };
+        const quantityForm = row.querySelector('.quantity-form');
+        const quantityInput = quantityForm.querySelector('input[name="quantity"]');
+        const removeForm = row.querySelector('.remove-item-form');
+
+        function queueQuantity() {
+            const quantity = parseInt(quantityInput.value, 10);
+            if (!isNaN(quantity)) {
+                queueChange({ op: 'set', ...line, quantity: quantity });
+            }
+        }
+
+        quantityForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+            queueQuantity();
+        });
+        quantityInput.addEventListener('change', queueQuantity);
+
+        removeForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+            // Ocultar la línea; se elimina del todo cuando el servidor confirma
+            row.classList.add('d-none');
+            queueChange({ op: 'remove', ...line });
+        });
+    });
+
+    function queueChange(change) {
+        pendingChanges.push(change);
+        scheduleSend();
+    }
+
+    function sendChanges() {
+        const changes = pendingChanges;
+        pendingChanges = [];
+        if (changes.length === 0) return;
+
+        fetch('/api/carrito', {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify({ changes: changes }),
+            credentials: 'same-origin'
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showCartAlert(data.message, 'danger');
+            }
+            if (data.items) {
+                renderCartState(data);
+            }
+        })
+        .catch(() => {
+            showCartAlert('No se pudo actualizar el carrito. Recarga la página.', 'danger');
+        });
+    }
+
+    function renderCartState(state) {
+        if (state.items.length === 0) {
+            // Mostrar la vista de carrito vacío
+            window.location.reload();
+            return;
+        }
+
+        document.querySelectorAll('.cart-item-row[data-product-id]').forEach(row => {
+            const item = state.items.find(i =>
+                i.product_type === row.getAttribute('data-product-type') &&
+                i.product_id === parseInt(row.getAttribute('data-product-id'), 10)
+            );
+            if (!item) {
+                row.remove();
+                return;
+            }
+            row.classList.remove('d-none');
+            row.querySelector('input[name="quantity"]').value = item.quantity;
+            row.querySelector('.cart-item-subtotal').textContent = `$${item.subtotal.toFixed(2)}`;
+        });
+
+        document.getElementById('cart-items-count').textContent = `${state.cart_count} items`;
+        document.getElementById('cart-subtotal').textContent = `$${state.subtotal.toFixed(2)}`;
+        document.getElementById('cart-iva').textContent = `$${state.iva.toFixed(2)}`;
+        document.getElementById('cart-total').textContent = `$${state.total.toFixed(2)}`;
+    }
+
+    function showCartAlert(message, type) {
+        const alert = document.createElement('div');
+        alert.className = `alert alert-${type} alert-dismissible fade show`;
+        alert.setAttribute('role', 'alert');
+        // El mensaje puede incluir nombres de productos: se inserta como texto, no como HTML
+        alert.textContent = message;
+        const close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.setAttribute('data-bs-dismiss', 'alert');
+        alert.appendChild(close);
+        const container = document.querySelector('.cart-items-card');
+        container.parentNode.insertBefore(alert, container);
+    }
+}
+
 /**
  * Funcionalidad de comparación de productos
  */
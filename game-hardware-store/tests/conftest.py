@@ -0,0 +1,62 @@
+"""
+Configuración común de las pruebas
+
+Se ejecutan desde game-hardware-store con: python -m pytest tests/
+"""
+import os
+import sys
+
+import pytest
+
+# Permitir importar los módulos de la aplicación también al lanzar pytest directamente
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db, seed_database  # noqa: E402
+from services.invoice_queue import invoice_queue  # noqa: E402
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """Configuración de la aplicación de pruebas, con todos los archivos en un directorio temporal"""
+    return {
+        'TESTING': True,
+        'SECRET_KEY': 'pruebas',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "tienda.db"}',
+        'WTF_CSRF_ENABLED': False,
+        # Hash barato: las pruebas no miden el coste de las contraseñas
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'STOCK_SWEEP_INTERVAL': 3600,
+        'INVOICE_QUEUE_PATH': str(tmp_path / 'invoice_jobs.db'),
+        'INVOICE_CACHE_DIR': str(tmp_path / 'invoices'),
+        'USER_CACHE_DIR': str(tmp_path / 'user_epochs'),
+        'RATE_LIMIT_PATH': str(tmp_path / 'rate_limits.db'),
+    }
+
+
+@pytest.fixture
+def flask_app(app_config):
+    """
+    Aplicación con una base SQLite temporal poblada con seed_database
+
+    No se llama app: pytest-flask abre un contexto de petición en cada prueba
+    que usa un fixture app, y las peticiones del cliente de pruebas
+    compartirían entonces g (el usuario de Flask-Login) y la sesión de la
+    base de datos.
+    """
+    app = create_app(app_config)
+    with app.app_context():
+        db.create_all()
+        seed_database()
+    yield app
+    invoice_queue.shutdown()
+
+
+@pytest.fixture
+def login():
+    """Abrir una sesión en un cliente de pruebas como si el usuario hubiera iniciado sesión"""
+    def login_as(client, user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return login_as
@@ -0,0 +1,209 @@
+"""
+Endpoints asíncronos de asgi.py frente a las vistas de Flask
+
+Cada endpoint asíncrono debe responder lo mismo que la vista de Flask a la
+que reemplaza, y pasarle a Flask los casos que no resuelve. Las respuestas
+de Flask llevan la cabecera Server-Timing (services/query_stats.py) y las
+asíncronas no, así se sabe quién respondió.
+"""
+import re
+
+import pytest
+from starlette.testclient import TestClient
+
+from asgi import create_asgi_app
+from database import db, seed_database
+from models.database_models import CartItem, User
+from services.invoice_queue import invoice_queue
+
+PASSWORD = 'Comprador123'
+CSRF_META = re.compile(r'<meta name="csrf-token" content="([^"]+)"')
+
+COMPATIBILITY_REQUESTS = [
+    {'cpu': 'Intel Core i9-12900K', 'ram': '32 GB', 'gpu': 'NVIDIA GeForce RTX 3080', 'storage': '1 TB'},
+    {'cpu': 'Intel Core i3-6100', 'ram': '4 GB', 'gpu': 'Intel HD Graphics', 'storage': '256 GB'},
+    {},
+]
+SETUP_REQUESTS = [
+    {'juegos': [1, 2], 'componentes': [1, 3, 5]},
+    {'juegos': [3, 'x', 999, True], 'componentes': [2]},
+    {'juegos': 'no es una lista'},
+]
+SEARCH_QUERIES = ['/api/hardware/buscar?q=nvidia', '/api/hardware/buscar?tipo=CPU', '/api/hardware/buscar?q=']
+
+
+@pytest.fixture
+def app_config(app_config):
+    return {**app_config, 'WTF_CSRF_ENABLED': True, 'RATE_LIMITS': {}}
+
+
+@pytest.fixture
+def asgi_app(app_config):
+    asgi_app = create_asgi_app(app_config)
+    with asgi_app.state.flask_app.app_context():
+        db.create_all()
+        seed_database()
+        user = User(username='comprador', email='comprador@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([CartItem(user_id=user.id, product_type='game', product_id=1, quantity=2),
+                            CartItem(user_id=user.id, product_type='hardware', product_id=4, quantity=1)])
+        db.session.commit()
+    yield asgi_app
+    invoice_queue.shutdown()
+
+
+@pytest.fixture
+def flask_app(asgi_app):
+    return asgi_app.state.flask_app
+
+
+@pytest.fixture
+def client(asgi_app):
+    with TestClient(asgi_app) as client:
+        yield client
+
+
+def asgi_csrf(client):
+    """Token CSRF de una página servida por Flask a través del ASGI (queda en la cookie de sesión)"""
+    return CSRF_META.search(client.get('/tienda').text).group(1)
+
+
+def flask_csrf(client):
+    return CSRF_META.search(client.get('/tienda').get_data(as_text=True)).group(1)
+
+
+def asgi_login(client, remember=False):
+    data = {'username': 'comprador', 'password': PASSWORD, 'csrf_token': asgi_csrf(client)}
+    if remember:
+        data['remember'] = 'on'
+    response = client.post('/login', data=data, follow_redirects=False)
+    assert response.status_code == 302
+
+
+def flask_login(client):
+    response = client.post('/login', data={'username': 'comprador', 'password': PASSWORD,
+                                           'csrf_token': flask_csrf(client)})
+    assert response.status_code == 302
+
+
+def served_async(response):
+    return 'server-timing' not in response.headers
+
+
+@pytest.mark.parametrize('path', SEARCH_QUERIES)
+def test_hardware_search_matches_flask(client, flask_app, path):
+    response = client.get(path)
+    assert served_async(response)
+    assert response.json() == flask_app.test_client().get(path).get_json()
+
+
+@pytest.mark.parametrize('payload', COMPATIBILITY_REQUESTS)
+def test_compatibility_matches_flask(client, flask_app, payload):
+    response = client.post('/consultar-compatibilidad', json=payload, headers={'X-CSRFToken': asgi_csrf(client)})
+    assert response.status_code == 200
+    assert served_async(response)
+
+    flask_client = flask_app.test_client()
+    expected = flask_client.post('/consultar-compatibilidad', json=payload,
+                                 headers={'X-CSRFToken': flask_csrf(flask_client)})
+    assert response.json() == expected.get_json()
+
+
+@pytest.mark.parametrize('payload', SETUP_REQUESTS)
+def test_setup_matches_flask(client, flask_app, payload):
+    response = client.post('/verificar-setup-completo', json=payload, headers={'X-CSRFToken': asgi_csrf(client)})
+    assert response.status_code == 200
+    assert served_async(response)
+
+    flask_client = flask_app.test_client()
+    expected = flask_client.post('/verificar-setup-completo', json=payload,
+                                 headers={'X-CSRFToken': flask_csrf(flask_client)})
+    assert response.json() == expected.get_json()
+
+
+def test_cart_count_matches_flask(client, flask_app):
+    flask_client = flask_app.test_client()
+
+    # Anónimo, con un carrito en la sesión
+    response = client.post('/carrito/agregar', json={'product_type': 'game', 'product_id': 2, 'quantity': 1},
+                           headers={'X-CSRFToken': asgi_csrf(client)})
+    assert response.status_code == 200
+    response = client.get('/api/carrito/count')
+    assert served_async(response)
+    assert response.json() == {'count': 1}
+
+    # Con sesión iniciada (el carrito anónimo se fusiona con el guardado)
+    asgi_login(client)
+    response = client.get('/api/carrito/count')
+    assert served_async(response)
+    flask_login(flask_client)
+    assert response.json() == flask_client.get('/api/carrito/count').get_json() == {'count': 3}
+
+
+def test_missing_csrf_header_falls_back_to_flask(client, flask_app):
+    asgi_csrf(client)
+    for path, payload in (('/consultar-compatibilidad', COMPATIBILITY_REQUESTS[0]),
+                          ('/verificar-setup-completo', SETUP_REQUESTS[0])):
+        response = client.post(path, json=payload)
+        expected = flask_app.test_client().post(path, json=payload)
+        assert response.status_code == expected.status_code == 400
+        assert 'CSRF' in response.text
+
+        response = client.post(path, json=payload, headers={'X-CSRFToken': 'inventado'})
+        assert response.status_code == 400
+
+
+def test_remember_cookie_only_falls_back_to_flask(client):
+    asgi_login(client, remember=True)
+    assert 'remember_token' in client.cookies
+    # Sin la cookie de sesión (el navegador se cerró), solo queda remember_token
+    session_cookie = client.cookies.get('session')
+    client.cookies.delete('session')
+    assert client.cookies.get('session') is None and session_cookie
+
+    response = client.get('/api/carrito/count')
+    assert not served_async(response)
+    assert response.json() == {'count': 2}
+
+
+def test_deactivated_user_falls_back_to_flask(client, flask_app):
+    asgi_login(client)
+    with flask_app.app_context():
+        User.query.filter_by(username='comprador').one().is_active = False
+        db.session.commit()
+
+    response = client.get('/api/carrito/count')
+    assert not served_async(response)
+    assert response.json() == {'count': 0}
+
+
+def test_rate_limited_blueprint_falls_back_to_flask(client, flask_app):
+    flask_app.config['RATE_LIMITS'] = {'cart': (2, 60), 'store': (2, 60)}
+    for _ in range(2):
+        response = client.get('/api/carrito/count')
+        assert response.status_code == 200
+        assert not served_async(response)
+    response = client.get('/api/carrito/count')
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+    # El cuerpo que el endpoint asíncrono no leyó llega entero a Flask
+    token = asgi_csrf(client)
+    response = client.post('/consultar-compatibilidad', json=COMPATIBILITY_REQUESTS[0], headers={'X-CSRFToken': token})
+    assert not served_async(response)
+    flask_app.config['RATE_LIMITS'] = {}
+    flask_client = flask_app.test_client()
+    expected = flask_client.post('/consultar-compatibilidad', json=COMPATIBILITY_REQUESTS[0],
+                                 headers={'X-CSRFToken': flask_csrf(flask_client)})
+    assert response.json() == expected.get_json()
+    assert response.json()['total'] > 0
+
+
+def test_body_read_by_handler_is_replayed_to_flask(client):
+    # JSON inválido: el handler lee el cuerpo, no puede usarlo y se lo pasa a Flask
+    response = client.post('/consultar-compatibilidad', content=b'{"cpu": ',
+                           headers={'X-CSRFToken': asgi_csrf(client), 'Content-Type': 'application/json'})
+    assert not served_async(response)
+    assert response.status_code == 400
@@ -0,0 +1,93 @@
+"""
+Carrito de los usuarios autenticados (controllers/cart.py y CartItem.upsert)
+"""
+import pytest
+
+from database import db
+from models.database_models import CartItem, Game, StockHold, User
+
+
+@pytest.fixture
+def user_id(flask_app):
+    with flask_app.app_context():
+        user = User(username='comprador', email='comprador@example.com')
+        user.set_password('Comprador123')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def user_client(flask_app, login, user_id):
+    client = flask_app.test_client()
+    login(client, user_id)
+    return client
+
+
+def add(client, product_id, quantity, product_type='game'):
+    return client.post('/carrito/agregar', json={
+        'product_type': product_type, 'product_id': product_id, 'quantity': quantity
+    })
+
+
+def cart_lines(flask_app, user_id):
+    with flask_app.app_context():
+        return [(item.product_type, item.product_id, item.quantity)
+                for item in CartItem.query.filter_by(user_id=user_id).order_by(CartItem.id)]
+
+
+def held(flask_app, user_id):
+    with flask_app.app_context():
+        return db.session.query(db.func.sum(StockHold.quantity)).filter_by(user_id=user_id).scalar()
+
+
+def test_adding_same_product_twice_sums_one_line(flask_app, user_client, user_id):
+    response = add(user_client, 1, 1)
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'message': 'Producto agregado al carrito', 'cart_count': 1}
+
+    # Doble clic: la segunda petición suma sobre la misma línea
+    response = add(user_client, 1, 2)
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'message': 'Cantidad actualizada en el carrito',
+                                   'cart_count': 1}
+    assert cart_lines(flask_app, user_id) == [('game', 1, 3)]
+    assert held(flask_app, user_id) == 3
+
+    response = add(user_client, 1, 1, 'hardware')
+    assert response.get_json()['cart_count'] == 2
+    assert user_client.get('/api/carrito/count').get_json() == {'count': 2}
+
+
+def test_adding_more_than_stock_changes_nothing(flask_app, user_client, user_id):
+    with flask_app.app_context():
+        stock = db.session.get(Game, 1).stock
+    assert add(user_client, 1, 2).status_code == 200
+
+    response = add(user_client, 1, stock - 1)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Stock insuficiente'}
+    assert cart_lines(flask_app, user_id) == [('game', 1, 2)]
+    assert held(flask_app, user_id) == 2
+    with flask_app.app_context():
+        assert db.session.get(Game, 1).stock == stock
+
+
+def test_adding_unknown_product(flask_app, user_client, user_id):
+    response = add(user_client, 999, 1)
+    assert response.status_code == 404
+    assert response.get_json() == {'success': False, 'message': 'Producto no encontrado'}
+    assert cart_lines(flask_app, user_id) == []
+    assert held(flask_app, user_id) is None
+
+
+def test_upsert_checks_stock_in_the_same_statement(flask_app, user_id):
+    with flask_app.app_context():
+        stock = db.session.get(Game, 1).stock
+        assert CartItem.upsert(user_id, 'game', 1, stock - 1) == (stock - 1, 1)
+        assert CartItem.upsert(user_id, 'game', 1, 2) is None
+        assert CartItem.upsert(user_id, 'game', 1, 1) == (stock, 1)
+        assert CartItem.upsert(user_id, 'game', 999, 1) is None
+        assert CartItem.upsert(user_id, 'hardware', 1, 1) == (1, 2)
+        db.session.commit()
+    assert cart_lines(flask_app, user_id) == [('game', 1, stock), ('hardware', 1, 1)]
@@ -0,0 +1,143 @@
+"""
+Pruebas de las opciones del engine (services/engine_config.py)
+
+Las de PostgreSQL necesitan un servidor real y se saltan si no se define
+TEST_POSTGRES_URL, por ejemplo:
+
+    TEST_POSTGRES_URL=postgresql+psycopg2://postgres@localhost/postgres python -m pytest tests/
+"""
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from services import metrics
+from services.engine_config import TimedQueuePool, engine_options
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+requires_postgres = pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL no definida')
+
+
+def checkout_wait():
+    """Número de observaciones y suma de db_pool_checkout_wait_seconds"""
+    samples = {sample.name: sample.value for sample in metrics.DB_CHECKOUT_WAIT.collect()[0].samples}
+    return samples['db_pool_checkout_wait_seconds_count'], samples['db_pool_checkout_wait_seconds_sum']
+
+
+def backend_pid(connection):
+    return connection.execute(text('SELECT pg_backend_pid()')).scalar()
+
+
+@pytest.fixture
+def postgres_engine():
+    """Crear engines de PostgreSQL con engine_options y cerrarlos al terminar"""
+    engines = []
+
+    def make(env=None):
+        engine = create_engine(POSTGRES_URL, **engine_options(POSTGRES_URL, env=env or {}))
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def test_sqlite_file_uses_wal(tmp_path):
+    url = f'sqlite:///{tmp_path / "tienda.db"}'
+    engine = create_engine(url, **engine_options(url, env={}))
+    try:
+        assert isinstance(engine.pool, TimedQueuePool)
+        with engine.connect() as connection:
+            assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert connection.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_memory_keeps_default_pool():
+    assert engine_options('sqlite://', env={}) == {}
+
+
+@requires_postgres
+def test_postgres_pool_options(postgres_engine):
+    engine = postgres_engine()
+    assert isinstance(engine.pool, TimedQueuePool)
+    assert engine.pool._pre_ping is True
+    assert engine.pool._recycle == 300
+    assert engine.pool.size() == 5
+
+
+@requires_postgres
+def test_postgres_server_timeouts(postgres_engine):
+    with postgres_engine().connect() as connection:
+        assert connection.execute(text('SHOW statement_timeout')).scalar() == '30s'
+        assert connection.execute(text('SHOW idle_in_transaction_session_timeout')).scalar() == '1min'
+
+    env = {'DB_STATEMENT_TIMEOUT_MS': '1500', 'DB_IDLE_IN_TRANSACTION_TIMEOUT_MS': '0'}
+    with postgres_engine(env).connect() as connection:
+        assert connection.execute(text('SHOW statement_timeout')).scalar() == '1500ms'
+        # 0 no se envía y queda el valor del servidor (desactivado por defecto)
+        assert connection.execute(text('SHOW idle_in_transaction_session_timeout')).scalar() == '0'
+
+
+@requires_postgres
+def test_postgres_statement_timeout_cancels_query(postgres_engine):
+    with postgres_engine({'DB_STATEMENT_TIMEOUT_MS': '200'}).connect() as connection:
+        with pytest.raises(Exception, match='statement timeout'):
+            connection.execute(text('SELECT pg_sleep(2)'))
+
+
+@requires_postgres
+def test_postgres_pre_ping_replaces_closed_connection(postgres_engine):
+    engine = postgres_engine()
+    with engine.connect() as connection:
+        pid = backend_pid(connection)
+
+    # El servidor cierra la conexión que quedó en el pool (como Neon al suspenderse)
+    with postgres_engine().connect() as other:
+        assert other.execute(text('SELECT pg_terminate_backend(:pid)'), {'pid': pid}).scalar()
+
+    with engine.connect() as connection:
+        assert backend_pid(connection) != pid
+
+
+@requires_postgres
+def test_postgres_recycle_replaces_old_connection(postgres_engine):
+    engine = postgres_engine({'DB_POOL_RECYCLE': '1'})
+    with engine.connect() as connection:
+        pid = backend_pid(connection)
+    with engine.connect() as connection:
+        assert backend_pid(connection) == pid
+
+    time.sleep(1.2)
+    with engine.connect() as connection:
+        assert backend_pid(connection) != pid
+
+
+@requires_postgres
+def test_postgres_checkout_wait_is_observed(postgres_engine):
+    engine = postgres_engine({'DB_POOL_SIZE': '1', 'DB_MAX_OVERFLOW': '0'})
+    count, total = checkout_wait()
+
+    # Con el pool lleno el segundo checkout espera a que se devuelva la conexión
+    holding = threading.Event()
+
+    def hold_connection():
+        with engine.connect():
+            holding.set()
+            time.sleep(0.3)
+
+    thread = threading.Thread(target=hold_connection)
+    thread.start()
+    holding.wait()
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    thread.join()
+
+    new_count, new_total = checkout_wait()
+    assert new_count == count + 2
+    assert new_total - total >= 0.2
@@ -0,0 +1,112 @@
+"""
+Cola de renderizado de facturas en segundo plano (services/invoice_queue.py)
+"""
+import sqlite3
+import time
+
+import pytest
+
+from database import db
+from models.database_models import Order
+from services import invoices
+from services.invoice_queue import MAX_ATTEMPTS, invoice_queue
+
+RETRY_SECONDS = 0.2
+
+
+@pytest.fixture
+def app_config(app_config):
+    return {**app_config, 'INVOICE_QUEUE_RETRY_SECONDS': RETRY_SECONDS, 'INVOICE_QUEUE_WORKERS': 1}
+
+
+@pytest.fixture
+def order_id(flask_app):
+    with flask_app.app_context():
+        order = Order(user_id=1, total=59.99, status='completed')
+        db.session.add(order)
+        db.session.commit()
+        return order.id
+
+
+@pytest.fixture
+def failing_render(monkeypatch):
+    """Hacer fallar cada renderizado y anotar cuándo se intentó"""
+    attempts = []
+
+    def ensure_invoice(order):
+        attempts.append(time.monotonic())
+        raise OSError('No queda espacio en el disco')
+
+    monkeypatch.setattr(invoices, 'ensure_invoice', ensure_invoice)
+    return attempts
+
+
+def job(flask_app, order_id):
+    conn = sqlite3.connect(flask_app.config['INVOICE_QUEUE_PATH'])
+    try:
+        return conn.execute(
+            'SELECT status, attempts, next_attempt_at, error FROM invoice_jobs WHERE order_id = ?', (order_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_failed_render_waits_before_retrying(flask_app, order_id, failing_render):
+    client = flask_app.test_client()
+    with flask_app.app_context():
+        invoice_queue.enqueue(order_id)
+    wait_for(lambda: job(flask_app, order_id)[:2] == ('pending', 1) and job(flask_app, order_id)[2])
+
+    status, attempts, next_attempt_at, error = job(flask_app, order_id)
+    assert error == 'No queda espacio en el disco'
+    assert next_attempt_at - time.time() > RETRY_SECONDS / 2
+
+    # Una petición antes de tiempo no reintenta
+    client.get('/about')
+    time.sleep(0.05)
+    assert len(failing_render) == 1
+
+    # Cada reintento espera el doble que el anterior
+    while len(failing_render) < MAX_ATTEMPTS:
+        client.get('/about')
+        time.sleep(0.02)
+        assert time.monotonic() - failing_render[0] < 5
+    wait_for(lambda: job(flask_app, order_id)[0] == 'failed')
+    first_wait = failing_render[1] - failing_render[0]
+    second_wait = failing_render[2] - failing_render[1]
+    assert first_wait >= RETRY_SECONDS
+    assert second_wait >= 2 * RETRY_SECONDS
+    assert job(flask_app, order_id)[2] is None
+
+
+def test_pending_retry_resumed_after_restart(flask_app, order_id, failing_render):
+    with flask_app.app_context():
+        invoice_queue.enqueue(order_id)
+    wait_for(lambda: job(flask_app, order_id)[:2] == ('pending', 1) and job(flask_app, order_id)[2])
+
+    # Un worker nuevo espera también a que venza el reintento
+    invoice_queue.shutdown()
+    client = flask_app.test_client()
+    client.get('/about')
+    time.sleep(0.05)
+    assert len(failing_render) == 1
+
+    time.sleep(RETRY_SECONDS)
+    client.get('/about')
+    wait_for(lambda: job(flask_app, order_id)[1] == 2)
+
+
+def test_successful_render_is_done(flask_app, order_id, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(invoices, 'ensure_invoice', lambda order: rendered.append(order.id))
+    with flask_app.app_context():
+        invoice_queue.enqueue(order_id)
+    wait_for(lambda: job(flask_app, order_id)[0] == 'done')
+    assert rendered == [order_id]
@@ -0,0 +1,65 @@
+"""
+Presupuestos de consultas por vista (services/query_stats.py)
+
+Con TESTING activo una vista que supera su @query_budget lanza
+QueryBudgetExceeded, así que basta con recorrer las rutas.
+"""
+import pytest
+from sqlalchemy import text
+
+from database import db
+from models.database_models import User
+from services.query_stats import QueryBudgetExceeded, query_budget
+
+BUDGETED_ROUTES = ['/', '/tienda', '/buscar?q=a', '/buscar?q=Cyberpunk', '/carrito', '/api/carrito/count']
+
+
+def add_to_cart(client, product_type, product_id, quantity=1):
+    response = client.post('/carrito/agregar', json={
+        'product_type': product_type, 'product_id': product_id, 'quantity': quantity
+    })
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path', BUDGETED_ROUTES)
+def test_anonymous_routes_within_budget(flask_app, path):
+    client = flask_app.test_client()
+    add_to_cart(client, 'game', 1)
+    add_to_cart(client, 'hardware', 1)
+    assert client.get(path).status_code == 200
+
+
+@pytest.mark.parametrize('path', BUDGETED_ROUTES)
+def test_authenticated_routes_within_budget(flask_app, login, path):
+    with flask_app.app_context():
+        admin_id = User.query.filter_by(username='admin').one().id
+    client = flask_app.test_client()
+    login(client, admin_id)
+    for product_id in (1, 2, 3):
+        add_to_cart(client, 'game', product_id)
+    add_to_cart(client, 'hardware', 1, 2)
+    assert client.get(path).status_code == 200
+
+
+@pytest.fixture
+def over_budget_path(flask_app):
+    """Ruta que declara una consulta y ejecuta dos"""
+    @flask_app.route('/pruebas/dos-consultas')
+    @query_budget(1)
+    def dos_consultas():
+        db.session.execute(text('SELECT 1'))
+        db.session.execute(text('SELECT 2'))
+        return 'ok'
+    return '/pruebas/dos-consultas'
+
+
+def test_route_over_budget_fails(flask_app, over_budget_path):
+    with pytest.raises(QueryBudgetExceeded, match=r'2 consultas \(presupuesto 1\)'):
+        flask_app.test_client().get(over_budget_path)
+
+
+def test_route_over_budget_only_logged_outside_tests(flask_app, over_budget_path, caplog):
+    flask_app.config['TESTING'] = False
+    response = flask_app.test_client().get(over_budget_path)
+    assert response.status_code == 200
+    assert f'Petición fuera de presupuesto GET {over_budget_path}' in caplog.text
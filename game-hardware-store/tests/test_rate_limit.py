@@ -0,0 +1,167 @@
+"""
+Límites de frecuencia por IP y de inicios de sesión fallidos (services/rate_limit.py)
+"""
+import pytest
+from sqlalchemy import event
+
+from database import db
+from services import rate_limit
+from services.passwords import password_hasher
+
+
+class FakeClock:
+    """Reemplazo del módulo time de rate_limit con un reloj controlado"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Inicio exacto de una ventana de 60 s
+    clock = FakeClock(6000.0)
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def trusted_proxies():
+    return 0
+
+
+@pytest.fixture
+def app_config(app_config, trusted_proxies):
+    return {**app_config,
+            'RATE_LIMITS': {'auth': (4, 60)},
+            'LOGIN_FAILURE_LIMITS': {'username': (3, 300), 'ip': (5, 300)},
+            'TRUSTED_PROXY_COUNT': trusted_proxies}
+
+
+@pytest.fixture
+def statements(flask_app):
+    """Sentencias SQL ejecutadas durante la prueba"""
+    executed = []
+    with flask_app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def verified(monkeypatch):
+    """Contraseñas comprobadas (con hash) durante la prueba"""
+    calls = []
+    verify = password_hasher.verify
+
+    def counting_verify(password_hash, password):
+        calls.append(password)
+        return verify(password_hash, password)
+
+    monkeypatch.setattr(password_hasher, 'verify', counting_verify)
+    return calls
+
+
+def test_blueprint_limit_uses_sliding_window(flask_app, clock):
+    client = flask_app.test_client()
+    for _ in range(4):
+        assert client.get('/login').status_code == 200
+    response = client.get('/login')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '60'
+
+    # Mitad de la ventana siguiente: la anterior (5 peticiones) pesa la mitad
+    clock.now += 90
+    assert client.get('/login').status_code == 200  # 2.5 + 1
+    response = client.get('/login')  # 2.5 + 2
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+
+    # Dos ventanas después ya no queda nada
+    clock.now += 60
+    assert client.get('/login').status_code == 200
+
+
+def test_blueprint_limit_ignores_other_blueprints(flask_app, clock):
+    client = flask_app.test_client()
+    for _ in range(10):
+        assert client.get('/tienda').status_code == 200
+
+
+def test_blueprint_limit_rejects_before_queries_and_hashing(flask_app, clock, statements, verified):
+    client = flask_app.test_client()
+    for _ in range(4):
+        client.post('/login', data={'username': 'admin', 'password': 'incorrecta'})
+    statements.clear()
+    verified.clear()
+
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+    assert statements == []
+    assert verified == []
+
+
+def test_login_failures_reject_before_user_lookup(flask_app, clock, statements, verified):
+    flask_app.config['RATE_LIMITS'] = {}
+    client = flask_app.test_client()
+    for _ in range(3):
+        response = client.post('/login', data={'username': 'admin', 'password': 'incorrecta'})
+        assert response.status_code == 200
+    assert len(verified) == 3
+    statements.clear()
+    verified.clear()
+
+    # Ni siquiera la contraseña correcta: el límite se comprueba antes de buscar al usuario
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '300'
+    assert not any('users' in statement for statement in statements)
+    assert verified == []
+    # El nombre se compara sin mayúsculas ni espacios
+    assert client.post('/login', data={'username': ' ADMIN', 'password': 'admin123'}).status_code == 429
+
+    # Otro usuario desde la misma IP todavía puede intentarlo
+    response = client.post('/login', data={'username': 'otro', 'password': 'incorrecta'})
+    assert response.status_code == 200
+
+    # Cuando vence la ventana, el usuario puede volver a entrar
+    clock.now += 600
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 302
+
+
+def test_login_failures_per_ip(flask_app, clock):
+    flask_app.config['RATE_LIMITS'] = {}
+    client = flask_app.test_client()
+    for i in range(5):
+        client.post('/login', data={'username': f'usuario{i}', 'password': 'incorrecta'})
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 429
+
+
+def test_without_trusted_proxy_forwarded_for_is_ignored(flask_app, clock):
+    client = flask_app.test_client()
+    for i in range(4):
+        assert client.get('/login', headers={'X-Forwarded-For': f'203.0.113.{i}'}).status_code == 200
+    # Cambiar la cabecera no sirve para saltarse el límite
+    assert client.get('/login', headers={'X-Forwarded-For': '203.0.113.99'}).status_code == 429
+
+
+@pytest.mark.parametrize('trusted_proxies', [1])
+def test_trusted_proxy_limits_each_client(flask_app, clock):
+    client = flask_app.test_client()
+    for _ in range(4):
+        assert client.get('/login', headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 200
+    assert client.get('/login', headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 429
+    # Otro cliente detrás del mismo proxy tiene su propio contador
+    assert client.get('/login', headers={'X-Forwarded-For': '203.0.113.2'}).status_code == 200
+    # Con un proxy de confianza solo cuenta la última dirección de la cadena
+    assert client.get('/login', headers={'X-Forwarded-For': '198.51.100.7, 203.0.113.1'}).status_code == 429
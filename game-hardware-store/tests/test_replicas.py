@@ -0,0 +1,136 @@
+"""
+Enrutado de las lecturas del catálogo a réplicas (services/replicas.py)
+
+La réplica es una copia del archivo SQLite de la primaria en la que se
+renombra un juego, para saber de qué base salió cada página.
+"""
+import sqlite3
+
+import pytest
+
+from models.database_models import User
+from services import metrics
+from services.replicas import PRIMARY_UNTIL_KEY
+
+REPLICA_NAME = 'Juego leído de la réplica'
+
+
+def queries(target):
+    """Valor actual de db_queries_total{target}"""
+    for sample in metrics.DB_QUERIES.collect()[0].samples:
+        if sample.name == 'db_queries_total' and sample.labels['target'] == target:
+            return sample.value
+    return 0
+
+
+@pytest.fixture
+def replica_path(tmp_path):
+    return tmp_path / 'replica.db'
+
+
+@pytest.fixture
+def replica_url(replica_path):
+    return f'sqlite:///{replica_path}'
+
+
+@pytest.fixture
+def app_config(app_config, replica_url):
+    return {**app_config, 'DATABASE_REPLICA_URLS': [replica_url]}
+
+
+@pytest.fixture
+def replica(flask_app, app_config, replica_path):
+    """Copiar la primaria ya poblada como réplica y marcar uno de sus juegos"""
+    primary = sqlite3.connect(app_config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+    conn = sqlite3.connect(replica_path)
+    # La copia de seguridad incluye lo que la primaria aún tiene en su WAL
+    primary.backup(conn)
+    primary.close()
+    with conn:
+        conn.execute('UPDATE games SET nombre = ? WHERE id = 1', (REPLICA_NAME,))
+    conn.close()
+    return replica_path
+
+
+def catalog_reads(client):
+    """Pedir /tienda y devolver (leída de la réplica, consultas a la primaria, consultas a la réplica)"""
+    primary, replica = queries('primary'), queries('replica0')
+    response = client.get('/tienda')
+    assert response.status_code == 200
+    return (REPLICA_NAME in response.get_data(as_text=True),
+            queries('primary') - primary, queries('replica0') - replica)
+
+
+def test_catalog_reads_from_replica(flask_app, replica):
+    from_replica, primary, replica_queries = catalog_reads(flask_app.test_client())
+    assert from_replica
+    assert primary == 0
+    assert replica_queries > 0
+
+
+def test_other_blueprints_read_from_primary(flask_app, replica, login):
+    with flask_app.app_context():
+        admin = User.query.filter_by(username='admin').one()
+    client = flask_app.test_client()
+    login(client, admin.id)
+
+    replica_before = queries('replica0')
+    assert client.get('/carrito').status_code == 200
+    assert queries('replica0') == replica_before
+
+
+def test_client_reads_own_writes_from_primary(flask_app, replica, login):
+    with flask_app.app_context():
+        admin = User.query.filter_by(username='admin').one()
+    client = flask_app.test_client()
+    login(client, admin.id)
+
+    response = client.post('/carrito/agregar', json={'product_type': 'game', 'product_id': 2, 'quantity': 1})
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        assert session[PRIMARY_UNTIL_KEY] > 0
+
+    # Tras escribir, el catálogo de este cliente sale de la primaria
+    from_replica, primary, replica_queries = catalog_reads(client)
+    assert not from_replica
+    assert primary > 0
+    assert replica_queries == 0
+
+    # Los demás clientes siguen leyendo de la réplica
+    assert catalog_reads(flask_app.test_client())[0]
+
+    # Pasado READ_YOUR_WRITES_SECONDS vuelve a la réplica
+    with client.session_transaction() as session:
+        session[PRIMARY_UNTIL_KEY] -= flask_app.config['READ_YOUR_WRITES_SECONDS'] + 1
+    assert catalog_reads(client)[0]
+
+
+# El directorio no existe: SQLite no puede abrir la réplica
+@pytest.mark.parametrize('replica_url', ['sqlite:////no-existe/replica.db'])
+def test_unreachable_replica_falls_back_to_primary(flask_app):
+    from_replica, primary, replica_queries = catalog_reads(flask_app.test_client())
+    assert not from_replica
+    assert primary > 0
+    assert replica_queries == 0
+    assert flask_app.extensions['replica_router'].replicas[0].available is False
+
+
+def test_lagging_replica_falls_back_to_primary(flask_app, replica):
+    # SQLite siempre informa 0 s de retraso: con un máximo negativo cualquier retraso es excesivo
+    flask_app.config['REPLICA_MAX_LAG_SECONDS'] = -1
+    from_replica, primary, replica_queries = catalog_reads(flask_app.test_client())
+    assert not from_replica
+    assert primary > 0
+    assert replica_queries == 1  # solo la comprobación de salud
+    assert flask_app.extensions['replica_router'].replicas[0].available is False
+
+
+def test_replica_checked_again_after_health_interval(flask_app, replica):
+    router = flask_app.extensions['replica_router']
+    flask_app.config['REPLICA_HEALTH_INTERVAL'] = 0
+    flask_app.config['REPLICA_MAX_LAG_SECONDS'] = -1
+    assert not catalog_reads(flask_app.test_client())[0]
+
+    flask_app.config['REPLICA_MAX_LAG_SECONDS'] = 5
+    assert catalog_reads(flask_app.test_client())[0]
+    assert router.replicas[0].available is True
@@ -0,0 +1,67 @@
+"""
+Compradores concurrentes sobre las reservas de stock (services/reservations.py)
+
+Ejecuta la simulación de simulate_shoppers.py con hilos en lugar de
+procesos, sobre una base SQLite temporal.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from simulate_shoppers import create_simulation, reserved_totals, run_shoppers, stock_and_sold
+from services.reservations import sweep_expired
+
+THREADS = 4
+SHOPPERS_PER_THREAD = 3
+ROUNDS = 4
+STOCK = 12
+
+
+@pytest.fixture
+def simulation(tmp_path):
+    return create_simulation(str(tmp_path), STOCK, THREADS * SHOPPERS_PER_THREAD, hold_seconds=1)
+
+
+def test_concurrent_shoppers_never_oversell(simulation):
+    app, product_id, user_ids = simulation
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(
+            lambda i: run_shoppers(app, user_ids[i::THREADS], product_id, ROUNDS, i), range(THREADS)
+        ))
+    assert sum(result['errores'] for result in results) == 0
+    assert sum(result['compras'] for result in results) > 0
+
+    with app.app_context():
+        held, counter = reserved_totals()
+        assert held == counter
+
+        stock, sold = stock_and_sold(product_id)
+        assert stock >= 0
+        assert sold + stock == STOCK
+
+        # El barrido libera todas las reservas y deja el contador a cero
+        sweep_expired(now=datetime.utcnow() + timedelta(hours=1))
+        assert reserved_totals() == (0, 0)
+
+    # Un último checkout con stock liberado mantiene el contador y el stock cuadrados
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_ids[0])
+        session['_fresh'] = True
+    client.post('/carrito/vaciar')
+    if stock:
+        response = client.post('/carrito/agregar', json={
+            'product_type': 'game', 'product_id': product_id, 'quantity': 1
+        })
+        assert response.status_code == 200
+        with app.app_context():
+            assert reserved_totals() == (1, 1)
+
+        response = client.post('/carrito/checkout')
+        assert '/orden/' in response.headers['Location']
+
+    with app.app_context():
+        assert reserved_totals() == (0, 0)
+        assert stock_and_sold(product_id) == (max(stock - 1, 0), sold + min(stock, 1))
@@ -0,0 +1,117 @@
+"""
+Carrito anónimo en la sesión y su fusión al iniciar sesión (services/session_cart.py)
+"""
+import pytest
+
+from database import db
+from models.database_models import CartItem, Game, Hardware, ReservedStock, StockHold, User
+from services import reservations, session_cart
+
+
+@pytest.fixture
+def user_id(flask_app):
+    with flask_app.app_context():
+        user = User(username='comprador', email='comprador@example.com')
+        user.set_password('Comprador123')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def reserve_many_calls(monkeypatch):
+    """Llamadas a reservations.reserve_many durante la prueba"""
+    calls = []
+    reserve_many = reservations.reserve_many
+
+    def recording_reserve_many(user_id, quantities, partial=False):
+        calls.append((user_id, dict(quantities), partial))
+        return reserve_many(user_id, quantities, partial=partial)
+
+    monkeypatch.setattr(reservations, 'reserve_many', recording_reserve_many)
+    return calls
+
+
+def add(client, product_type, product_id, quantity):
+    response = client.post('/carrito/agregar', json={
+        'product_type': product_type, 'product_id': product_id, 'quantity': quantity
+    })
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_anonymous_cart_lives_in_the_session(flask_app):
+    client = flask_app.test_client()
+    assert add(client, 'game', 1, 2)['cart_count'] == 1
+    assert add(client, 'game', 1, 1)['message'] == 'Cantidad actualizada en el carrito'
+    assert add(client, 'hardware', 7, 1)['cart_count'] == 2
+    with client.session_transaction() as session:
+        assert session[session_cart.SESSION_KEY] == 'g1*3.h7'
+    with flask_app.app_context():
+        assert CartItem.query.count() == 0
+
+    response = client.post('/carrito/agregar', json={'product_type': 'game', 'product_id': 999, 'quantity': 1})
+    assert response.status_code == 404
+    assert client.get('/api/carrito/count').get_json() == {'count': 2}
+
+
+def test_login_merges_anonymous_cart(flask_app, user_id, reserve_many_calls):
+    with flask_app.app_context():
+        db.session.get(Game, 2).stock = 4
+        db.session.get(Hardware, 1).stock = 2
+        # Líneas guardadas de una visita anterior, con la reserva ya vencida
+        db.session.add(CartItem(user_id=user_id, product_type='game', product_id=1, quantity=2))
+        db.session.add(CartItem(user_id=user_id, product_type='game', product_id=2, quantity=3))
+        db.session.commit()
+        # Otro comprador tiene reservado todo el stock del hardware 1
+        other = User.query.filter_by(username='admin').one()
+        assert reservations.reserve(other.id, 'hardware', 1, 2)
+        db.session.commit()
+
+    client = flask_app.test_client()
+    add(client, 'game', 1, 3)
+    add(client, 'game', 2, 2)
+    add(client, 'hardware', 1, 1)
+
+    response = client.post('/login', data={'username': 'comprador', 'password': 'Comprador123'})
+    assert response.status_code == 302
+
+    with client.session_transaction() as session:
+        assert session_cart.SESSION_KEY not in session
+
+    # Sumadas, con el juego 2 limitado a su stock (3 + 2 > 4)
+    added = {('game', 1): 3, ('game', 2): 1, ('hardware', 1): 1}
+    assert reserve_many_calls == [(user_id, added, True)]
+    with flask_app.app_context():
+        lines = {(item.product_type, item.product_id): item.quantity
+                 for item in CartItem.query.filter_by(user_id=user_id)}
+        assert lines == {('game', 1): 5, ('game', 2): 4, ('hardware', 1): 1}
+
+        # El hardware sin stock disponible se fusiona sin reserva
+        holds = {(hold.product_type, hold.product_id): hold.quantity
+                 for hold in StockHold.query.filter_by(user_id=user_id)}
+        assert holds == {('game', 1): 3, ('game', 2): 1}
+        counters = {(counter.product_type, counter.product_id): counter.quantity
+                    for counter in ReservedStock.query}
+        assert counters == {('game', 1): 3, ('game', 2): 1, ('hardware', 1): 2}
+
+    assert client.get('/api/carrito/count').get_json() == {'count': 3}
+
+
+def test_login_with_full_line_leaves_it_unchanged(flask_app, user_id, reserve_many_calls):
+    with flask_app.app_context():
+        db.session.get(Game, 2).stock = 3
+        db.session.add(CartItem(user_id=user_id, product_type='game', product_id=2, quantity=3))
+        db.session.commit()
+
+    client = flask_app.test_client()
+    add(client, 'game', 2, 2)
+    response = client.post('/login', data={'username': 'comprador', 'password': 'Comprador123'})
+    assert response.status_code == 302
+
+    assert reserve_many_calls == []
+    with flask_app.app_context():
+        assert [(item.product_id, item.quantity) for item in CartItem.query.filter_by(user_id=user_id)] == [(2, 3)]
+        assert StockHold.query.count() == 0
+    with client.session_transaction() as session:
+        assert session_cart.SESSION_KEY not in session
@@ -0,0 +1,151 @@
+"""
+Caché de los usuarios autenticados e invalidación de sus sesiones (services/user_cache.py)
+"""
+import pytest
+from sqlalchemy import event
+
+from database import db
+from models.database_models import User
+from services.user_cache import UserCache, user_cache
+
+PASSWORD = 'Comprador123'
+
+
+@pytest.fixture
+def user_id(flask_app):
+    with flask_app.app_context():
+        user = User(username='comprador', email='comprador@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def user_reads(flask_app):
+    """Lecturas de la tabla users durante la prueba"""
+    reads = []
+    with flask_app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM users' in statement:
+            reads.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield reads
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def login(flask_app, username, password):
+    client = flask_app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+def logged_in(client):
+    """True si la sesión del cliente sigue abierta (las vistas con login_required no redirigen)"""
+    response = client.get('/mis-ordenes')
+    assert response.status_code in (200, 302)
+    return response.status_code == 200
+
+
+def test_authenticated_requests_use_the_cache(flask_app, user_id, user_reads):
+    client = login(flask_app, 'comprador', PASSWORD)
+    assert logged_in(client)
+    user_reads.clear()
+    for _ in range(3):
+        assert client.get('/api/carrito/count').status_code == 200
+    assert user_reads == []
+
+
+def test_deactivated_user_is_logged_out_on_next_request(flask_app, user_id):
+    client = login(flask_app, 'comprador', PASSWORD)
+    assert logged_in(client)
+
+    admin = login(flask_app, 'admin', 'admin123')
+    assert admin.post(f'/admin/users/{user_id}/toggle-active').status_code == 302
+    with flask_app.app_context():
+        assert db.session.get(User, user_id).is_active is False
+
+    assert not logged_in(client)
+
+    # Reactivado, la misma sesión vuelve a valer
+    assert admin.post(f'/admin/users/{user_id}/toggle-active').status_code == 302
+    assert logged_in(client)
+
+
+def test_invalidation_from_another_worker(flask_app, user_id):
+    client = login(flask_app, 'comprador', PASSWORD)
+    assert logged_in(client)
+
+    # Otro worker desactiva al usuario: este proceso conserva su copia en memoria
+    with flask_app.app_context():
+        db.session.get(User, user_id).is_active = False
+        db.session.commit()
+    assert logged_in(client)
+
+    # ... hasta que el otro worker reemplaza el archivo de invalidación compartido
+    other_worker = UserCache()
+    other_worker.app = flask_app
+    other_worker.invalidate(user_id)
+    assert not logged_in(client)
+
+
+def test_promoted_user_gets_admin_on_next_request(flask_app, user_id):
+    client = login(flask_app, 'comprador', PASSWORD)
+    assert logged_in(client)
+    with flask_app.app_context():
+        assert user_cache.load(str(user_id)).is_admin is False
+
+    admin = login(flask_app, 'admin', 'admin123')
+    assert admin.post(f'/admin/users/{user_id}/toggle-admin').status_code == 302
+    assert client.get('/admin/').status_code == 200
+
+
+def test_password_change_closes_other_sessions(flask_app, user_id):
+    laptop = login(flask_app, 'comprador', PASSWORD)
+    phone = login(flask_app, 'comprador', PASSWORD)
+    with laptop.session_transaction() as session:
+        old_id = session['_user_id']
+    with flask_app.app_context():
+        assert old_id == db.session.get(User, user_id).get_id()
+
+    response = laptop.post('/perfil/editar', data={
+        'email': 'comprador@example.com', 'current_password': PASSWORD, 'new_password': 'Distinta456'
+    })
+    assert response.status_code == 302
+
+    # La sesión que cambió la contraseña sigue abierta con el nuevo identificador
+    with laptop.session_transaction() as session:
+        assert session['_user_id'] != old_id
+        assert session['_user_id'].startswith(f'{user_id}:')
+    assert logged_in(laptop)
+    # La otra sesión lleva la versión anterior de la contraseña
+    assert not logged_in(phone)
+    assert logged_in(login(flask_app, 'comprador', 'Distinta456'))
+
+
+def test_profile_edit_without_password_change_keeps_sessions(flask_app, user_id):
+    laptop = login(flask_app, 'comprador', PASSWORD)
+    phone = login(flask_app, 'comprador', PASSWORD)
+
+    response = laptop.post('/perfil/editar', data={'email': 'nuevo@example.com'})
+    assert response.status_code == 302
+    assert logged_in(phone)
+    with flask_app.app_context():
+        assert user_cache.load(str(user_id)).email == 'nuevo@example.com'
+
+
+def test_rehash_on_login_keeps_other_sessions(flask_app, user_id):
+    phone = login(flask_app, 'comprador', PASSWORD)
+
+    # Nueva política de hash: el próximo inicio de sesión recalcula el hash
+    flask_app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    laptop = login(flask_app, 'comprador', PASSWORD)
+    with flask_app.app_context():
+        assert db.session.get(User, user_id).password_hash.startswith('pbkdf2:sha256:2000$')
+
+    assert logged_in(laptop)
+    assert logged_in(phone)
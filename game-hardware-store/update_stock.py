@@ -1,31 +1,97 @@
 """
-Script para actualizar el stock de todos los productos en la base de datos
+Script para actualizar el stock y los precios de los productos en la base de datos
+
+Aplica un feed de inventario CSV o JSONL (product_type, id, stock, precio)
+por bloques, mostrando las diferencias, o asigna un stock por defecto a los
+productos que no tienen stock.
+
+Uso:
+    python update_stock.py inventario.csv [--dry-run] [--diff-file cambios.jsonl]
+    python update_stock.py - --format jsonl < inventario.jsonl
+    python update_stock.py --default-stock
 """
-from app import app
-from database import db
-from models.database_models import Game, Hardware
+import argparse
+import json
+import sys
+from app import create_app
+from services import inventory_sync
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sincronizar stock y precios desde un feed de inventario')
+    parser.add_argument('feed', nargs='?', help="Archivo CSV o JSONL ('-' para la entrada estándar)")
+    parser.add_argument('--format', choices=inventory_sync.FORMATS, help='Formato del feed (por defecto según la extensión)')
+    parser.add_argument('--chunk-size', type=int, default=inventory_sync.DEFAULT_CHUNK_SIZE, help='Registros por bloque')
+    parser.add_argument('--dry-run', action='store_true', help='Mostrar las diferencias sin guardar nada')
+    parser.add_argument('--diff-file', help='Escribir las diferencias en este archivo JSONL en lugar de mostrarlas')
+    parser.add_argument('--default-stock', action='store_true',
+                        help='Asignar 100 unidades a los juegos y 50 al hardware sin stock')
+    return parser.parse_args()
+
+
+def default_stock():
+    """Asignar stock por defecto a los productos sin stock"""
+    updated = inventory_sync.fill_empty_stock({'game': 100, 'hardware': 50})
+    print("✅ Stock actualizado:")
+    print(f"   - {updated['game']} juegos sin stock ahora tienen 100 unidades")
+    print(f"   - {updated['hardware']} componentes de hardware sin stock ahora tienen 50 unidades")
+    return 0
+
 
-def update_stock():
-    """Actualizar el stock de todos los juegos y hardware"""
+def print_diff(diff):
+    """Mostrar una diferencia del inventario"""
+    changes = [f'{field} {diff[field][0]} → {diff[field][1]}' for field in ('stock', 'precio') if field in diff]
+    print(f"   {diff['product_type']} {diff['id']}: {', '.join(changes)}")
+
+
+def sync_feed(args):
+    """Aplicar un feed de inventario"""
+    fmt = args.format or inventory_sync.detect_format(args.feed)
+    if fmt is None:
+        print('❌ No se reconoce el formato del feed, usa --format')
+        return 2
+
+    stream = sys.stdin if args.feed == '-' else open(args.feed, newline='', encoding='utf-8')
+    diff_file = open(args.diff_file, 'w', encoding='utf-8') if args.diff_file else None
+    try:
+        if diff_file:
+            on_diff = lambda diff: diff_file.write(json.dumps(diff) + '\n')
+        else:
+            on_diff = print_diff
+        summary = inventory_sync.sync_inventory(
+            inventory_sync.read_feed(stream, fmt),
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+            on_diff=on_diff
+        )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if diff_file:
+            diff_file.close()
+
+    print(f"\n{'🔎 Simulación' if args.dry_run else '✅ Inventario sincronizado'}:")
+    print(f"   - {summary['leidos']} registros leídos")
+    print(f"   - {summary['actualizados']} productos {'a actualizar' if args.dry_run else 'actualizados'}")
+    print(f"   - {summary['sin_cambios']} sin cambios")
+    print(f"   - {summary['no_encontrados']} no encontrados")
+    print(f"   - {summary['invalidos']} registros inválidos")
+    for error in summary['errores']:
+        print(f"     {error}")
+    return 1 if summary['invalidos'] else 0
+
+
+def main():
+    args = parse_args()
+    if not args.default_stock and not args.feed:
+        print('❌ Indica un feed de inventario o --default-stock')
+        return 2
+    app = create_app()
     with app.app_context():
-        # Actualizar stock de juegos
-        games = Game.query.all()
-        for game in games:
-            if game.stock == 0:
-                game.stock = 100  # Asignar stock de 100 unidades
-        
-        # Actualizar stock de hardware
-        hardware_items = Hardware.query.all()
-        for hardware in hardware_items:
-            if hardware.stock == 0:
-                hardware.stock = 50  # Asignar stock de 50 unidades
-        
-        # Guardar cambios
-        db.session.commit()
-        
-        print(f"✅ Stock actualizado:")
-        print(f"   - {len(games)} juegos ahora tienen stock de 100 unidades")
-        print(f"   - {len(hardware_items)} componentes de hardware ahora tienen stock de 50 unidades")
+        if args.default_stock:
+            return default_stock()
+        return sync_feed(args)
+
 
 if __name__ == '__main__':
-    update_stock()
+    sys.exit(main())